@@ -1,72 +1,538 @@
-from flask import Flask, jsonify, request
+import time
+STARTUP_CLOCK = time.perf_counter()  # Cold-start timings are measured from here
+
+from flask import Flask, Response, g, jsonify, request
 from flask_cors import CORS
 import json
+import logging
 import os
+import shlex
+import sys
 from datetime import datetime
 import threading
-import time
+from urllib.error import HTTPError, URLError
+from urllib.parse import unquote_plus
+from urllib.request import Request, urlopen
 
-# Import your scraper class (make sure it's in the same directory)
-from paste import BEIDataScraper
+# The scraper (paste.py) and its pandas/yfinance stack are imported on the first refresh; see refresh_backend()
+from metrics import CONTENT_TYPE, REGISTRY, refresh_phase
+from ratio_series import SERIES, build_trends
+from refresh_jobs import RefreshJobManager
+from ratio_store import parse_filter
+from refresh_scheduler import ShardedRefreshScheduler
+from response_cache import ResponseCache, negotiate_encoding
+from snapshot import Snapshot
+from snapshot_events import SnapshotEvents, format_event
+from snapshot_format import LazyCompanies, encode_snapshot, load_snapshot, save_snapshot, write_snapshot
+from snapshot_history import SnapshotHistory, parse_as_of
+from universe import DEFAULT_COMPANIES, UniverseRegistry, normalize_ticker
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def _server_option(names):
+    """
+    Value of a command-line option of the hosting server (gunicorn's argv or GUNICORN_CMD_ARGS), if given
+    """
+    args = sys.argv[1:] + shlex.split(os.environ.get('GUNICORN_CMD_ARGS', ''))
+    for i, arg in enumerate(args):
+        for name in names:
+            if arg == name and i + 1 < len(args):
+                return args[i + 1]
+            if arg.startswith(name + '=') and name.startswith('--'):
+                return arg[len(name) + 1:]
+    return None
+
+def default_stream_subscribers():
+    """
+    Default cap on open /api/stream connections per process. Each stream holds a request
+    thread for as long as the client stays connected, so on a thread pool (gunicorn gthread
+    or sync workers) streams may take at most a quarter of the threads, leaving the rest for
+    every other endpoint; one sync thread allows none. Greenlet workers (gevent, eventlet)
+    hold streams cheaply and get a large cap; werkzeug starts a thread per connection.
+    """
+    worker_class = (_server_option(('-k', '--worker-class')) or '').lower()
+    if 'gevent' in worker_class or 'eventlet' in worker_class:
+        return 1000
+    threads = os.environ.get('BEI_WORKER_THREADS') or _server_option(('--threads',))
+    if threads:
+        return int(threads) // 4
+    if 'gunicorn' in os.path.basename(sys.argv[0]):
+        return 0  # Sync worker: a single request thread
+    return 32
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for React frontend
 
 # Global variables for caching
-financial_data_cache = {}
-last_update_time = None
+snapshot = Snapshot({})  # Live data; replaced as a whole, never mutated in place
+snapshot_lock = threading.Lock()
+startup = {'import_seconds': None, 'ready_seconds': None}  # Cold-start timings since STARTUP_CLOCK
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('BEI_RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))  # All encodings together
+response_cache = ResponseCache(max_bytes=RESPONSE_CACHE_MAX_BYTES)
+DATA_FILE = "bei_financial_data.json"  # Legacy JSON export
+SNAPSHOT_FILE = os.environ.get('BEI_SNAPSHOT_FILE', 'bei_financial_data.snap')  # Compact binary snapshot
+EXPORT_JSON = os.environ.get('BEI_EXPORT_JSON', '1') == '1'  # Keep writing the JSON file alongside
+MAX_BATCH_TICKERS = 200  # Upper bound on tickers per /api/ratios request
+MAX_PEERS = 50  # Upper bound on k for /api/peers
+SCREEN_PARAMS = {'sector', 'period', 'sort', 'limit', 'where'}  # Query keys of /api/screen that are not filters
 UPDATE_INTERVAL = 3600  # Update every hour (3600 seconds)
+FETCH_WORKERS = int(os.environ.get('BEI_FETCH_WORKERS', 8))  # Tickers fetched concurrently
+FETCH_RPS = float(os.environ.get('BEI_FETCH_RPS', 4.0))  # Combined yfinance requests per second
+STATEMENT_CACHE_DIR = os.environ.get('BEI_STATEMENT_CACHE_DIR', 'statement_cache')
+STATEMENT_CACHE_TTL = float(os.environ.get('BEI_STATEMENT_CACHE_TTL', UPDATE_INTERVAL))
+STATEMENT_CACHE_MAX_BYTES = int(os.environ.get('BEI_STATEMENT_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+REFRESH_STATE_FILE = os.environ.get('BEI_REFRESH_STATE_FILE', 'refresh_state.json')
+REFRESH_MAX_AGE = float(os.environ.get('BEI_REFRESH_MAX_AGE', 7 * 86400))  # Refetch everything at least weekly
+UNIVERSE_FILE = os.environ.get('BEI_UNIVERSE_FILE', 'idx_universe.csv')  # Listing file; built-in list if absent
+REFRESH_SHARDS = int(os.environ.get('BEI_REFRESH_SHARDS', 12))  # Shards refreshed one by one across UPDATE_INTERVAL
+COMPUTE_PROCESSES = int(os.environ.get('BEI_COMPUTE_PROCESSES', 0))  # Ratio processes; <2 (the default) computes in-process
+HISTORY_DIR = os.environ.get('BEI_HISTORY_DIR', 'snapshot_history')  # Versioned history for as_of queries
+HISTORY_RETENTION_DAYS = float(os.environ.get('BEI_HISTORY_RETENTION_DAYS', 730))
+HISTORY_MAX_BYTES = int(os.environ.get('BEI_HISTORY_MAX_BYTES', 1024 * 1024 * 1024))
+ACTIVE_RATIOS = [r.strip() for r in os.environ.get('BEI_RATIOS', '').split(',') if r.strip()]  # Empty: every ratio
+# 'standalone' refreshes its own data; a 'worker' (see serve.py) only reads the snapshot file
+# published by the single refresher process and forwards refresh requests to it
+SERVER_ROLE = os.environ.get('BEI_SERVER_ROLE', 'standalone')
+REFRESHER_URL = os.environ.get('BEI_REFRESHER_URL', 'http://127.0.0.1:5001')
+SNAPSHOT_POLL_INTERVAL = float(os.environ.get('BEI_SNAPSHOT_POLL_INTERVAL', 1.0))  # Seconds between file checks
+# With no snapshot or JSON file, start serving at once and build the first data in the background
+# (answering 503 with Retry-After until it is published) instead of scraping before the server starts
+FAST_START = os.environ.get('BEI_FAST_START', '0') == '1'
+STARTUP_RETRY_AFTER = int(os.environ.get('BEI_STARTUP_RETRY_AFTER', 10))  # Seconds clients wait while data loads
+# Flask debug mode (interactive debugger, reloader) for `python api_server.py`; never enable it on a reachable host
+DEBUG = os.environ.get('BEI_DEBUG', '0') == '1'
+# Endpoints that work before any data is loaded; every other one answers 503 until then
+STARTUP_ENDPOINTS = {'health_check', 'metrics', 'refresh_data', 'get_refresh_job', 'prioritize_refresh', 'stream_updates'}
+# Open /api/stream connections per process; beyond it the endpoint answers 503 (see default_stream_subscribers)
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get('BEI_STREAM_MAX_SUBSCRIBERS') or default_stream_subscribers())
+STREAM_HEARTBEAT = 15.0  # Seconds between keep-alive comments on an idle stream, so proxies keep it open
+STREAM_RETRY_MS = 5000  # Reconnect delay EventSource clients are told to use
+
+universe = UniverseRegistry(UNIVERSE_FILE, default=DEFAULT_COMPANIES)
+# Created by refresh_backend() on first use; a server that only serves never loads them
+scraper = None
+statement_cache = None
+refresh_planner = None
+_backend_lock = threading.Lock()
+snapshot_history = SnapshotHistory(HISTORY_DIR, retention_days=HISTORY_RETENTION_DAYS, max_bytes=HISTORY_MAX_BYTES)
+snapshot_events = SnapshotEvents(max_subscribers=STREAM_MAX_SUBSCRIBERS)  # Feeds /api/stream
 
-# Initialize scraper
-scraper = BEIDataScraper()
+# Request metrics, labelled by route pattern (not raw path) to keep the label set bounded
+HTTP_REQUESTS = REGISTRY.counter('bei_http_requests_total', 'HTTP requests by route, method and status',
+                                 ['route', 'method', 'status'])
+HTTP_LATENCY = REGISTRY.histogram('bei_http_request_duration_seconds', 'Time to produce a response by route',
+                                  ['route', 'method'])
+SNAPSHOT_GAUGES = {
+    'age': REGISTRY.gauge('bei_snapshot_age_seconds', 'Seconds since the published snapshot was built'),
+    'version': REGISTRY.gauge('bei_snapshot_version', 'Version of the published snapshot'),
+    'companies': REGISTRY.gauge('bei_snapshot_companies', 'Companies in the published snapshot'),
+    'cells': REGISTRY.gauge('bei_snapshot_ratio_cells', 'Ticker x ratio x period cells in the published snapshot'),
+    'file_bytes': REGISTRY.gauge('bei_snapshot_file_bytes', 'Size of the binary snapshot file'),
+    'history_bytes': REGISTRY.gauge('bei_snapshot_history_bytes', 'Disk used by the versioned snapshot history'),
+}
+STREAM_SUBSCRIBERS = REGISTRY.gauge('bei_stream_subscribers', 'Open /api/stream connections')
+RESPONSE_CACHE_BYTES = REGISTRY.gauge('bei_response_cache_bytes', 'Bytes of cached response bodies, all encodings')
+STARTUP_SECONDS = REGISTRY.gauge('bei_startup_seconds', 'Seconds from process start to imports done and to first data served',
+                                 ['phase'])
+CACHE_HITS = REGISTRY.counter('bei_cache_hits_total', 'Cache hits since start', ['cache'])
+CACHE_MISSES = REGISTRY.counter('bei_cache_misses_total', 'Cache misses since start', ['cache'])
+CACHE_HIT_RATIO = REGISTRY.gauge('bei_cache_hit_ratio', 'Cache hits / lookups since start', ['cache'])
+
+def publish_snapshot(data, changed=None, updated_at=None, store=None, version=None):
+    """
+    Atomically swap in a new snapshot built off to the side and bump its version
+    """
+    global snapshot
+    
+    updated_at = updated_at or datetime.now()
+    new_snapshot = Snapshot(data, 0, updated_at, changed, store)
+    with snapshot_lock:
+        first = not snapshot.version
+        new_snapshot.version = version or max(snapshot.version + 1, int(updated_at.timestamp() * 1000))
+        snapshot = new_snapshot
+    snapshot_events.publish(new_snapshot.version, {
+        'version': new_snapshot.version,
+        'last_updated': new_snapshot.last_updated,
+        'companies': len(new_snapshot),
+        'changed': new_snapshot.changed
+    })
+    if first:
+        startup['ready_seconds'] = round(time.perf_counter() - STARTUP_CLOCK, 4)
+        STARTUP_SECONDS.set(startup['ready_seconds'], phase='ready')
+        print(f"Serving {len(new_snapshot)} companies {startup['ready_seconds'] * 1000:.0f} ms after start "
+              f"(imports {startup['import_seconds'] * 1000:.0f} ms)")
+    return new_snapshot
+
+_snapshot_file_state = None
+_last_snapshot_check = 0.0
+_reload_lock = threading.Lock()
+
+def _file_state(path):
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def publish_snapshot_file(path):
+    """
+    Publish a binary snapshot file; arrays stay memory-mapped and companies decode on demand
+    """
+    global _snapshot_file_state
+    
+    state = _file_state(path)
+    snapshot_file = load_snapshot(path)
+    published = publish_snapshot(LazyCompanies(snapshot_file), snapshot_file.changed, snapshot_file.updated_at,
+                                 store=snapshot_file.ratio_store(), version=snapshot_file.version)
+    _snapshot_file_state = state
+    return published
 
-def load_or_create_data():
+def reload_snapshot_if_changed():
     """
-    Load data from JSON file if exists, otherwise create new data
+    Worker side: pick up a new snapshot file from the refresher without restarting.
+    The file is checked at most once per SNAPSHOT_POLL_INTERVAL; the refresher replaces it by
+    rename, so a changed inode or mtime always means a complete new version.
     """
-    global financial_data_cache, last_update_time
+    global _last_snapshot_check
     
-    json_file = "bei_financial_data.json"
+    now = time.monotonic()
+    if now - _last_snapshot_check < SNAPSHOT_POLL_INTERVAL or not _reload_lock.acquire(blocking=False):
+        return
+    try:
+        _last_snapshot_check = now
+        if os.path.exists(SNAPSHOT_FILE) and _file_state(SNAPSHOT_FILE) != _snapshot_file_state:
+            published = publish_snapshot_file(SNAPSHOT_FILE)
+            print(f"Picked up snapshot version {published.version} ({len(published)} companies)")
+    except Exception as e:
+        print(f"Error reloading snapshot file: {e}")
+    finally:
+        _reload_lock.release()
+
+_pending_demand = set()
+_last_demand_flush = 0.0
+_demand_lock = threading.Lock()
+
+def _send_demand(tickers):
+    forwarded = Request(REFRESHER_URL + '/api/refresh/priority', method='POST',
+                        data=json.dumps({'tickers': tickers}).encode('utf-8'),
+                        headers={'Content-Type': 'application/json'})
+    try:
+        with urlopen(forwarded, timeout=10) as upstream:
+            upstream.read()
+    except (HTTPError, URLError) as e:
+        print(f"Could not forward requested tickers to the refresher: {e}")
+
+def note_demand(ticker):
+    """
+    Record that a user asked for `ticker` so the scheduler can refresh it ahead of its shard.
+    Workers batch their demand and forward it to the refresher about once per SNAPSHOT_POLL_INTERVAL.
+    """
+    global _last_demand_flush
+
+    if SERVER_ROLE != 'worker':
+        refresh_scheduler.prioritize([ticker])
+        return
+    with _demand_lock:
+        _pending_demand.add(ticker)
+        now = time.monotonic()
+        if now - _last_demand_flush < SNAPSHOT_POLL_INTERVAL:
+            return
+        _last_demand_flush = now
+        tickers = sorted(_pending_demand)
+        _pending_demand.clear()
+    threading.Thread(target=_send_demand, args=(tickers,), daemon=True).start()
+
+@app.before_request
+def _refresh_worker_snapshot():
+    if SERVER_ROLE == 'worker':
+        reload_snapshot_if_changed()
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.before_request
+def _reject_until_loaded():
+    if snapshot.version or request.endpoint in STARTUP_ENDPOINTS or request.method == 'OPTIONS':
+        return None
+    response = jsonify({
+        'success': False,
+        'error': 'Financial data is still loading, retry shortly'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(STARTUP_RETRY_AFTER)
+    return response
+
+@app.after_request
+def _record_demand(response):
+    # Only successful lookups count: a 404 ticker is not in the data, and 400/503 answered nothing
+    ticker = (request.view_args or {}).get('ticker')
+    if ticker and response.status_code < 400:
+        note_demand(ticker.upper())
+    return response
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - start, route=route, method=request.method)
+        HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    return response
+
+def forward_to_refresher():
+    """
+    Worker side: relay a refresh request to the refresher process and return its answer
+    """
+    forwarded = Request(
+        REFRESHER_URL + request.full_path.rstrip('?'),
+        data=request.get_data() if request.method == 'POST' else None,
+        method=request.method,
+        headers={'Content-Type': 'application/json'}
+    )
+    try:
+        with urlopen(forwarded, timeout=10) as upstream:
+            body, status, location = upstream.read(), upstream.status, upstream.headers.get('Location')
+    except HTTPError as e:
+        body, status, location = e.read(), e.code, None
+    except URLError as e:
+        return jsonify({
+            'success': False,
+            'error': f'Refresher unavailable: {e.reason}'
+        }), 503
     
+    response = app.response_class(body, status=status, mimetype='application/json')
+    if location:
+        response.headers['Location'] = location
+    return response
+
+def save_published_snapshot(snap):
+    """
+    Persist a published snapshot in the binary format, plus the JSON export if enabled
+    """
+    with refresh_phase('serialize'):
+        payload = encode_snapshot(snap.data, snap.version, snap.updated_at, snap.changed)
+    with refresh_phase('save'):
+        write_snapshot(payload, SNAPSHOT_FILE)
+    if EXPORT_JSON:
+        with refresh_phase('export_json'):
+            refresh_backend().save_data_to_json(dict(snap.data), DATA_FILE)
+
+def record_history(snap, changed=None):
+    """
+    Append a published snapshot to the versioned history; a failure here never fails the refresh
+    """
+    try:
+        with refresh_phase('history'):
+            snapshot_history.record(snap.data, snap.version, snap.updated_at,
+                                    snap.changed if changed is None else changed)
+    except Exception as e:
+        print(f"Error recording snapshot history: {e}")
+
+def cached_json_response(snap, key, build_payload):
+    """
+    Serve a JSON body that is serialized once per snapshot version.
+    The body is compressed (brotli or gzip, per Accept-Encoding) once per version too and
+    served from the cache afterwards. The response carries a strong ETag for the snapshot
+    and encoding, so If-None-Match gets a 304.
+    """
+    body, etag, encoding = response_cache.get_or_build(
+        snap.version, key, lambda: app.json.dumps(build_payload()).encode('utf-8'),
+        negotiate_encoding(request.headers.get('Accept-Encoding', '')))
+    response = app.response_class(body, mimetype='application/json')
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True  # Always revalidate; a 304 costs almost nothing
+    return response.make_conditional(request)
+
+def run_refresh(options, job):
+    """
+    Refresh job body: build the new snapshot off to the side, then publish and save it
+    """
+    scraper = refresh_backend()
+    current = snapshot
+    refresh_universe()
+    fetch_state = {}
+    if options.get('cache_only'):
+        new_data, changed = scraper.refresh_from_cache(current.data, progress=job.update_progress,
+                                                       only=options.get('tickers'))
+    else:
+        new_data, changed, fetch_state = scraper.refresh_incremental(
+            current.data, refresh_planner, force=bool(options.get('full')), progress=job.update_progress,
+            only=options.get('tickers'))
+    
+    if changed or not current.data:
+        with refresh_phase('publish'):
+            published = publish_snapshot(new_data, changed)
+        save_published_snapshot(published)
+        record_history(published)
+    # Fingerprints are recorded only once the data they describe is published and saved
+    refresh_planner.commit(fetch_state)
+    
+    return {
+        'companies': len(new_data),
+        'changed': changed,
+        'version': snapshot.version,
+        'last_updated': snapshot.last_updated
+    }
+
+refresh_jobs = RefreshJobManager(run_refresh)
+
+def refresh_backend():
+    """
+    The scraper, with the statement cache and refresh planner, created on first use.
+    They pull in pandas, yfinance and requests, which serving a snapshot never needs,
+    so the server starts without them and the first refresh pays for the imports.
+    """
+    global scraper, statement_cache, refresh_planner
+    
+    with _backend_lock:
+        if scraper is None:
+            start = time.perf_counter()
+            from paste import BEIDataScraper
+            from ratio_pool import RatioComputePool
+            from refresh_planner import RefreshPlanner
+            from statement_cache import StatementCache
+            
+            statement_cache = StatementCache(STATEMENT_CACHE_DIR, ttl=STATEMENT_CACHE_TTL,
+                                             max_bytes=STATEMENT_CACHE_MAX_BYTES)
+            refresh_planner = RefreshPlanner(REFRESH_STATE_FILE, max_age=REFRESH_MAX_AGE)
+            scraper = BEIDataScraper(max_workers=FETCH_WORKERS, requests_per_second=FETCH_RPS, cache=statement_cache,
+                                     companies=universe.companies, ratios=ACTIVE_RATIOS,
+                                     compute_pool=RatioComputePool(COMPUTE_PROCESSES))
+            print(f"Loaded the scraper in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return scraper
+
+def refresh_universe():
+    """
+    Pick up changes to the listing file; returns the current tickers
+    """
+    if universe.reload() and scraper is not None:
+        scraper.companies = universe.companies
+    return universe.tickers()
+
+def run_refresh_batch(tickers, options):
+    """
+    Scheduler callback: refresh some tickers as a job and merge them into the live snapshot.
+    If another refresh is in flight, the batch is queued behind it.
+    """
+    job, _ = refresh_jobs.submit(dict(options, tickers=tickers))
+    job.wait()
+    if job.status == 'succeeded':
+        print(f"Refreshed {len(tickers)} tickers ({options['trigger']}), {len(job.result['changed'])} changed")
+    else:
+        print(f"Refresh of {len(tickers)} tickers failed: {job.error}")
+
+def is_stale(ticker):
+    # Until the first refresh loads the planner, treat every ticker as due; the refresh itself re-checks
+    return ticker not in snapshot.data or refresh_planner is None or refresh_planner.is_due(ticker)
+
+refresh_scheduler = ShardedRefreshScheduler(refresh_universe, run_refresh_batch, interval=UPDATE_INTERVAL,
+                                            shards=REFRESH_SHARDS, is_stale=is_stale)
+
+def load_or_create_data(wait=True):
+    """
+    Load the binary snapshot if it exists, falling back to the JSON file, otherwise create new data.
+    With wait=False new data is created in the background and this returns once the job has started.
+    """
     # Try to load existing data
-    if os.path.exists(json_file):
+    if os.path.exists(SNAPSHOT_FILE):
+        try:
+            start = time.perf_counter()
+            published = publish_snapshot_file(SNAPSHOT_FILE)
+            print(f"Loaded snapshot for {len(snapshot)} companies in {(time.perf_counter() - start) * 1000:.1f} ms")
+            record_history(published, changed=[])  # Only adds tickers the history has never seen
+            return True
+        except Exception as e:
+            print(f"Error loading snapshot file: {e}")
+    
+    if os.path.exists(DATA_FILE):
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                financial_data_cache = json.load(f)
-            last_update_time = datetime.now()
-            print(f"Loaded existing data for {len(financial_data_cache)} companies")
+            with open(DATA_FILE, 'r', encoding='utf-8') as f:
+                published = publish_snapshot(json.load(f))
+            print(f"Loaded existing data for {len(snapshot)} companies")
+            save_snapshot(published.data, SNAPSHOT_FILE, published.version, published.updated_at, published.changed)
+            record_history(published, changed=[])
             return True
         except Exception as e:
             print(f"Error loading existing data: {e}")
     
     # Create new data if file doesn't exist
     print("Creating new financial data...")
-    financial_data_cache = scraper.get_all_companies_data()
-    scraper.save_data_to_json(financial_data_cache, json_file)
-    last_update_time = datetime.now()
-    print(f"Created new data for {len(financial_data_cache)} companies")
-    return True
+    job, _ = refresh_jobs.submit({'full': True, 'trigger': 'startup'})
+    if not wait:
+        print(f"Serving while the first load runs as job {job.id}; data endpoints answer 503 until it finishes")
+        return True
+    job.wait()
+    print(f"Created new data for {len(snapshot)} companies")
+    return job.status == 'succeeded'
 
-def update_data_background():
+def start_background_refresh():
     """
-    Background task to periodically update financial data
+    Start the sharded refresh scheduler (only the single refresher process should do this).
+    Each of the REFRESH_SHARDS shards is refreshed once per UPDATE_INTERVAL, one shard at a time.
     """
-    global financial_data_cache, last_update_time
-    
-    while True:
-        try:
-            time.sleep(UPDATE_INTERVAL)
-            print("Updating financial data in background...")
-            
-            new_data = scraper.get_all_companies_data()
-            if new_data:
-                financial_data_cache = new_data
-                scraper.save_data_to_json(financial_data_cache)
-                last_update_time = datetime.now()
-                print(f"Background update completed for {len(financial_data_cache)} companies")
-            
-        except Exception as e:
-            print(f"Error in background update: {e}")
+    return refresh_scheduler.start()
+
+def _data_as_of(snap):
+    """
+    The company records to answer from: the live snapshot, or with ?as_of= the data as it was
+    published at that time. Returns (data, as_of); raises ValueError for a malformed as_of.
+    """
+    value = request.args.get('as_of', '').strip()
+    if not value:
+        return snap.data, None
+    as_of = parse_as_of(value)
+    return snapshot_history.view(as_of), as_of
+
+def _list_arg(name):
+    """
+    Read a comma-separated query parameter as a list
+    """
+    return [item.strip() for item in request.args.get(name, '').split(',') if item.strip()]
+
+def _period_range_arg(name):
+    """
+    Read a period range such as '2022:2024', '2022:', ':2023' or '2024' as (start, end), both inclusive
+    """
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None, None
+    start, _, end = value.partition(':') if ':' in value else (value, '', value)
+    return start.strip() or None, end.strip() or None
+
+def _in_period_range(period, start, end):
+    return (start is None or period >= start) and (end is None or period <= end)
+
+def _field_matcher(fields):
+    """
+    Build a (category, ratio) predicate from 'category.ratio' or bare ratio names (None = everything)
+    """
+    if not fields:
+        return None
+    exact = {f for f in fields if '.' in f}
+    bare = {f for f in fields if '.' not in f}
+    return lambda category, name: name in bare or f"{category}.{name}" in exact
+
+def _project_ratios(ratios, wanted):
+    """
+    Keep only the wanted ratios of a {category: {ratio: value}} dict, dropping emptied categories
+    """
+    if wanted is None:
+        return ratios
+    projected = {}
+    for category, ratio_dict in ratios.items():
+        selected = {name: value for name, value in ratio_dict.items() if wanted(category, name)}
+        if selected:
+            projected[category] = selected
+    return projected
+
+def _filter_series(series, start, end, wanted):
+    """
+    Restrict a {period: {category: {ratio: value}}} series to a period range and set of fields
+    """
+    return {period: _project_ratios(ratios, wanted)
+            for period, ratios in series.items() if _in_period_range(period, start, end)}
 
 @app.route('/api/companies', methods=['GET'])
 def get_companies_list():
@@ -74,19 +540,23 @@ def get_companies_list():
     Get list of all available companies
     """
     try:
-        companies_list = []
-        for ticker, data in financial_data_cache.items():
-            companies_list.append({
-                'ticker': ticker,
-                'name': data.get('name', ''),
-                'sector': data.get('sector', '')
-            })
+        snap = snapshot
+        def build():
+            companies_list = []
+            for ticker, data in snap.data.items():
+                companies_list.append({
+                    'ticker': ticker,
+                    'name': data.get('name', ''),
+                    'sector': data.get('sector', '')
+                })
+            
+            return {
+                'success': True,
+                'data': companies_list,
+                'last_updated': snap.last_updated
+            }
         
-        return jsonify({
-            'success': True,
-            'data': companies_list,
-            'last_updated': last_update_time.isoformat() if last_update_time else None
-        })
+        return cached_json_response(snap, 'companies', build)
     
     except Exception as e:
         return jsonify({
@@ -97,23 +567,38 @@ def get_companies_list():
 @app.route('/api/company/<ticker>', methods=['GET'])
 def get_company_data(ticker):
     """
-    Get detailed financial data for a specific company
+    Get detailed financial data for a specific company.
+    ?as_of=2024-06-03 (or an ISO date-time) returns the data as it was published then.
     """
     try:
+        snap = snapshot
         ticker_upper = ticker.upper()
-        if ticker_upper not in financial_data_cache:
+        try:
+            data, as_of = _data_as_of(snap)
+        except ValueError as e:
             return jsonify({
                 'success': False,
-                'error': f'Company {ticker} not found'
+                'error': str(e)
+            }), 400
+        if ticker_upper not in data:
+            return jsonify({
+                'success': False,
+                'error': f'Company {ticker} not found' + (f' as of {as_of.isoformat()}' if as_of else '')
             }), 404
         
-        company_data = financial_data_cache[ticker_upper]
+        company_data = data[ticker_upper]
         
-        return jsonify({
-            'success': True,
-            'data': company_data,
-            'last_updated': last_update_time.isoformat() if last_update_time else None
-        })
+        def build():
+            payload = {
+                'success': True,
+                'data': company_data,
+                'last_updated': snap.last_updated
+            }
+            if as_of:
+                payload['as_of'] = as_of.isoformat()
+            return payload
+        
+        return cached_json_response(snap, f'company:{ticker_upper}:{as_of}', build)
     
     except Exception as e:
         return jsonify({
@@ -124,32 +609,137 @@ def get_company_data(ticker):
 @app.route('/api/ratios/<ticker>', methods=['GET'])
 def get_company_ratios(ticker):
     """
-    Get only financial ratios for a specific company
+    Get only financial ratios for a specific company.
+    ?granularity=quarterly|ttm returns the latest quarter (or trailing twelve months)
+    and quarterly trends instead of the annual figures; ?as_of= answers from the history.
     """
     try:
+        snap = snapshot
         ticker_upper = ticker.upper()
-        if ticker_upper not in financial_data_cache:
+        granularity = request.args.get('granularity', 'annual').lower()
+        if granularity not in SERIES:
             return jsonify({
                 'success': False,
-                'error': f'Company {ticker} not found'
+                'error': f"Unknown granularity '{granularity}', expected one of: {', '.join(SERIES)}"
+            }), 400
+        try:
+            data, as_of = _data_as_of(snap)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        if ticker_upper not in data:
+            return jsonify({
+                'success': False,
+                'error': f'Company {ticker} not found' + (f' as of {as_of.isoformat()}' if as_of else '')
             }), 404
         
-        company_data = financial_data_cache[ticker_upper]
+        company_data = data[ticker_upper]
         
-        response_data = {
-            'ticker': ticker_upper,
-            'name': company_data.get('name', ''),
-            'sector': company_data.get('sector', ''),
-            'latest_period': company_data.get('latest_period', ''),
-            'ratios': company_data.get('ratios', {}),
-            'trends': company_data.get('trends', {})
-        }
+        def build():
+            if granularity == 'annual':
+                latest_period = company_data.get('latest_period', '')
+                ratios = company_data.get('ratios', {})
+                trends = company_data.get('trends', {})
+            else:
+                field, length = SERIES[granularity]
+                series = company_data.get(field) or {}
+                latest_period = max(series) if series else ''
+                ratios = series.get(latest_period, {})
+                trends = build_trends(series, ratios, length=length)
+            response_data = {
+                'ticker': ticker_upper,
+                'name': company_data.get('name', ''),
+                'sector': company_data.get('sector', ''),
+                'granularity': granularity,
+                'latest_period': latest_period,
+                'ratios': ratios,
+                'trends': trends
+            }
+            
+            payload = {
+                'success': True,
+                'data': response_data,
+                'last_updated': snap.last_updated
+            }
+            if as_of:
+                payload['as_of'] = as_of.isoformat()
+            return payload
         
+        return cached_json_response(snap, f'ratios:{ticker_upper}:{granularity}:{as_of}', build)
+    
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'data': response_data,
-            'last_updated': last_update_time.isoformat() if last_update_time else None
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/ratios', methods=['GET'])
+def get_ratios_batch():
+    """
+    Get ratios for many companies in one cacheable response, e.g.
+    /api/ratios?tickers=BBCA.JK,TLKM.JK&fields=profitability.roe,leverage.der&periods=2022:2024
+    fields and periods project the ratios and trends down to what the caller needs;
+    as_of answers from the data published at that time.
+    """
+    try:
+        snap = snapshot
+        try:
+            data, as_of = _data_as_of(snap)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        tickers = [t.upper() for t in _list_arg('tickers')]
+        if not tickers:
+            return jsonify({
+                'success': False,
+                'error': 'No tickers provided'
+            }), 400
+        if len(tickers) > MAX_BATCH_TICKERS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_BATCH_TICKERS} tickers per request'
+            }), 400
+        
+        fields = _list_arg('fields')
+        start, end = _period_range_arg('periods')
+        wanted = _field_matcher(fields)
+        
+        def build():
+            companies = {}
+            for ticker in tickers:
+                if ticker not in data:
+                    continue
+                company_data = data[ticker]
+                ratios = _project_ratios(company_data.get('ratios', {}), wanted)
+                trends = {}
+                for key, points in company_data.get('trends', {}).items():
+                    category, _, name = key.partition('_')
+                    if wanted is None or wanted(category, name):
+                        trends[key] = [p for p in points if _in_period_range(p['period'], start, end)]
+                companies[ticker] = {
+                    'name': company_data.get('name', ''),
+                    'sector': company_data.get('sector', ''),
+                    'latest_period': company_data.get('latest_period', ''),
+                    'ratios': ratios,
+                    'trends': trends
+                }
+            
+            payload = {
+                'success': True,
+                'data': companies,
+                'missing': [t for t in tickers if t not in data],
+                'last_updated': snap.last_updated
+            }
+            if as_of:
+                payload['as_of'] = as_of.isoformat()
+            return payload
+        
+        key = f"ratios-batch:{','.join(tickers)}:{','.join(fields)}:{start}:{end}:{as_of}"
+        return cached_json_response(snap, key, build)
     
     except Exception as e:
         return jsonify({
@@ -163,6 +753,7 @@ def compare_companies():
     Compare financial ratios between multiple companies
     """
     try:
+        snap = snapshot
         request_data = request.get_json()
         tickers = request_data.get('tickers', [])
         
@@ -175,8 +766,8 @@ def compare_companies():
         comparison_data = {}
         for ticker in tickers:
             ticker_upper = ticker.upper()
-            if ticker_upper in financial_data_cache:
-                company_data = financial_data_cache[ticker_upper]
+            if ticker_upper in snap.data:
+                company_data = snap.data[ticker_upper]
                 comparison_data[ticker_upper] = {
                     'name': company_data.get('name', ''),
                     'sector': company_data.get('sector', ''),
@@ -186,7 +777,7 @@ def compare_companies():
         return jsonify({
             'success': True,
             'data': comparison_data,
-            'last_updated': last_update_time.isoformat() if last_update_time else None
+            'last_updated': snap.last_updated
         })
     
     except Exception as e:
@@ -195,32 +786,440 @@ def compare_companies():
             'error': str(e)
         }), 500
 
+@app.route('/api/peers/<ticker>', methods=['GET'])
+def get_company_peers(ticker):
+    """
+    Get the companies with the most similar ratio profiles, e.g.
+    /api/peers/BBCA.JK?k=5&same_sector=true&ratios=roe,roa,der&period=2023
+    Profiles are robustly standardized per ratio and compared by the root-mean-square
+    difference over the ratios both companies report; the default profile is every ratio
+    in each company's latest period.
+    """
+    try:
+        snap = snapshot
+        ticker_upper = ticker.upper()
+        if ticker_upper not in snap.data:
+            return jsonify({
+                'success': False,
+                'error': f'Company {ticker} not found'
+            }), 404
+        
+        try:
+            k = int(request.args.get('k', 5))
+        except ValueError:
+            k = 0
+        if not 1 <= k <= MAX_PEERS:
+            return jsonify({
+                'success': False,
+                'error': f'k must be an integer between 1 and {MAX_PEERS}'
+            }), 400
+        same_sector = request.args.get('same_sector', '').lower() in ('1', 'true', 'yes')
+        ratios = _list_arg('ratios')
+        period = request.args.get('period', '').strip() or None
+        
+        def build():
+            index, store = snap.peer_index, snap.store
+            peers = []
+            for row, distance in index.query(ticker_upper, k, same_sector, ratios, period):
+                peers.append({
+                    'ticker': store.tickers[row],
+                    'name': store.names[row],
+                    'sector': store.sectors[row],
+                    'distance': round(distance, 4),
+                    'ratios': index.profile(row, ratios, period)
+                })
+            row = store.ticker_index[ticker_upper]
+            return {
+                'success': True,
+                'data': {
+                    'ticker': ticker_upper,
+                    'name': store.names[row],
+                    'sector': store.sectors[row],
+                    'period': period or 'latest',
+                    'same_sector': same_sector,
+                    'ratios': index.profile(row, ratios, period),
+                    'peers': peers
+                },
+                'last_updated': snap.last_updated
+            }
+        
+        key = f"peers:{ticker_upper}:{k}:{same_sector}:{','.join(ratios)}:{period}"
+        try:
+            return cached_json_response(snap, key, build)
+        except KeyError as e:
+            return jsonify({
+                'success': False,
+                'error': e.args[0]
+            }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/sectors', methods=['GET'])
 def get_sectors():
     """
     Get companies grouped by sector
     """
     try:
-        sectors = {}
-        for ticker, data in financial_data_cache.items():
-            sector = data.get('sector', 'Unknown')
-            if sector not in sectors:
-                sectors[sector] = []
+        snap = snapshot
+        def build():
+            sectors = {}
+            for ticker, data in snap.data.items():
+                sector = data.get('sector', 'Unknown')
+                if sector not in sectors:
+                    sectors[sector] = []
+                
+                sectors[sector].append({
+                    'ticker': ticker,
+                    'name': data.get('name', ''),
+                    'latest_period': data.get('latest_period', ''),
+                    'key_ratios': {
+                        'roe': data.get('ratios', {}).get('profitability', {}).get('roe', 0),
+                        'roa': data.get('ratios', {}).get('profitability', {}).get('roa', 0)
+                    }
+                })
             
-            sectors[sector].append({
-                'ticker': ticker,
-                'name': data.get('name', ''),
-                'latest_period': data.get('latest_period', ''),
-                'key_ratios': {
-                    'roe': data.get('ratios', {}).get('profitability', {}).get('roe', 0),
-                    'roa': data.get('ratios', {}).get('profitability', {}).get('roa', 0)
-                }
+            return {
+                'success': True,
+                'data': sectors,
+                'last_updated': snap.last_updated
+            }
+        
+        return cached_json_response(snap, 'sectors', build)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/export', methods=['GET'])
+def export_data():
+    """
+    Stream the whole dataset as NDJSON, one line per company (format=company) or one line per
+    (ticker, period, ratio) row (format=long). Optional filters: sector, periods=2022:2024, fields.
+    """
+    try:
+        snap = snapshot
+        export_format = request.args.get('format', 'company')
+        if export_format not in ('company', 'long'):
+            return jsonify({
+                'success': False,
+                'error': f'Unknown export format: {export_format}'
+            }), 400
+        
+        sectors = {s.lower() for s in _list_arg('sector')}
+        start, end = _period_range_arg('periods')
+        wanted = _field_matcher(_list_arg('fields'))
+        dumps = app.json.dumps
+        
+        def generate():
+            # Companies are visited one at a time, so only the current line is ever held in memory
+            for ticker in snap.data:
+                company = snap.data[ticker]
+                if sectors and company.get('sector', '').lower() not in sectors:
+                    continue
+                series = _filter_series(company.get('all_periods', {}), start, end, wanted)
+                if export_format == 'company':
+                    yield dumps({
+                        'ticker': ticker,
+                        'name': company.get('name', ''),
+                        'sector': company.get('sector', ''),
+                        'latest_period': company.get('latest_period', ''),
+                        'all_periods': series
+                    }) + '\n'
+                    continue
+                for period, ratios in series.items():
+                    for category, ratio_dict in ratios.items():
+                        for name, value in ratio_dict.items():
+                            yield dumps({
+                                'ticker': ticker,
+                                'sector': company.get('sector', ''),
+                                'period': period,
+                                'category': category,
+                                'ratio': name,
+                                'value': value
+                            }) + '\n'
+        
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.headers['X-Snapshot-Version'] = str(snap.version)
+        if snap.updated_at:
+            response.last_modified = snap.updated_at
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/stream', methods=['GET'])
+def stream_updates():
+    """
+    Server-Sent Events: a 'snapshot' event with the new version and its changed tickers each
+    time a snapshot is published, so clients refetch only those instead of polling.
+    The stream opens with a 'hello' event carrying the current version. A client that
+    reconnects with Last-Event-ID gets the events it missed; if they are no longer known,
+    one 'snapshot' event with "changed": null means everything may have changed.
+    Each open stream occupies a request thread, so at most STREAM_MAX_SUBSCRIBERS are
+    accepted per process and the rest get 503; serving many dashboards needs gevent or
+    eventlet workers (see serve.py).
+    """
+    try:
+        snap = snapshot
+        last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', ''))
+        try:
+            resume_from = int(last_event_id) if last_event_id else None
+        except ValueError:
+            resume_from = None
+        
+        if not snapshot_events.subscribe():
+            response = jsonify({
+                'success': False,
+                'error': 'Too many open update streams, retry later'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(STREAM_RETRY_MS // 1000)
+            return response
+        
+        def catch_up(version, events):
+            # Messages for the events after `version`, or one catch-all event when they are no longer all known
+            if events is None:
+                snap = snapshot
+                return snap.version, [format_event('snapshot', {
+                    'version': snap.version,
+                    'last_updated': snap.last_updated,
+                    'companies': len(snap),
+                    'changed': None
+                }, snap.version)]
+            return (events[-1][0] if events else version), [format_event('snapshot', payload, v) for v, payload in events]
+        
+        def generate():
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            if resume_from is None:
+                version = snap.version
+                yield format_event('hello', {
+                    'version': snap.version,
+                    'last_updated': snap.last_updated,
+                    'companies': len(snap)
+                }, snap.version)
+            else:
+                version, messages = catch_up(resume_from, snapshot_events.since(resume_from))
+                yield ''.join(messages)
+            
+            idle_since = time.monotonic()
+            while True:
+                # Workers learn about new versions by polling the snapshot file, so wake up that often
+                timeout = SNAPSHOT_POLL_INTERVAL if SERVER_ROLE == 'worker' else STREAM_HEARTBEAT
+                events = snapshot_events.wait(version, timeout)
+                if events is None or events:
+                    version, messages = catch_up(version, events)
+                    yield ''.join(messages)
+                    idle_since = time.monotonic()
+                elif time.monotonic() - idle_since >= STREAM_HEARTBEAT:
+                    yield ': keep-alive\n\n'
+                    idle_since = time.monotonic()
+                if SERVER_ROLE == 'worker':
+                    reload_snapshot_if_changed()
+        
+        response = Response(generate(), mimetype='text/event-stream')
+        response.call_on_close(snapshot_events.unsubscribe)  # Also runs if the stream never started
+        response.cache_control.no_cache = True
+        response.headers['X-Accel-Buffering'] = 'no'  # Keep nginx from buffering the stream
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/sectors/stats', methods=['GET'])
+def get_sector_stats():
+    """
+    Get per-sector and market-wide ratio statistics (count, mean, median, quartiles).
+    Optional comma-separated filters: sector, ratio, period ('latest' = each company's latest period).
+    """
+    try:
+        snap = snapshot
+        sectors, ratios, periods = _list_arg('sector'), _list_arg('ratio'), _list_arg('period')
+        key = f"sector-stats:{','.join(sectors)}:{','.join(ratios)}:{','.join(periods)}"
+        try:
+            return cached_json_response(snap, key, lambda: {
+                'success': True,
+                'data': snap.sector_stats.to_dict(sectors, ratios, periods),
+                'last_updated': snap.last_updated
+            })
+        except KeyError as e:
+            return jsonify({
+                'success': False,
+                'error': e.args[0]
+            }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/ratios/<ticker>/rank', methods=['GET'])
+def get_company_rank(ticker):
+    """
+    Get a company's percentile rank within its sector and the market for each ratio and period
+    """
+    try:
+        snap = snapshot
+        ticker_upper = ticker.upper()
+        if ticker_upper not in snap.data:
+            return jsonify({
+                'success': False,
+                'error': f'Company {ticker} not found'
+            }), 404
+        
+        ratios, periods = _list_arg('ratio'), _list_arg('period')
+        key = f"rank:{ticker_upper}:{','.join(ratios)}:{','.join(periods)}"
+        try:
+            return cached_json_response(snap, key, lambda: {
+                'success': True,
+                'data': {
+                    'ticker': ticker_upper,
+                    'name': snap.data[ticker_upper].get('name', ''),
+                    'sector': snap.data[ticker_upper].get('sector', ''),
+                    'ranks': snap.sector_stats.ticker_ranks(ticker_upper, ratios, periods)
+                },
+                'last_updated': snap.last_updated
             })
+        except KeyError as e:
+            return jsonify({
+                'success': False,
+                'error': e.args[0]
+            }), 400
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/history/<ticker>', methods=['GET'])
+def get_company_history(ticker):
+    """
+    Get every retained version of a company's ratios, oldest first, e.g.
+    /api/history/BBCA.JK?from=2024-01-01&to=2024-06-30&fields=profitability.roe&period=2023
+    Without period each version shows its latest ratios; with period it shows that period's
+    ratios as published in each version, which makes restatements visible.
+    """
+    try:
+        snap = snapshot
+        ticker_upper = ticker.upper()
+        try:
+            start = parse_as_of(request.args['from'], end_of_day=False) if request.args.get('from') else None
+            end = parse_as_of(request.args['to']) if request.args.get('to') else None
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        period = request.args.get('period', '').strip() or None
+        fields = _list_arg('fields')
+        wanted = _field_matcher(fields)
+        
+        if ticker_upper not in snap.data and ticker_upper not in snapshot_history:
+            return jsonify({
+                'success': False,
+                'error': f'Company {ticker} not found'
+            }), 404
+        
+        def build():
+            versions = []
+            for entry in snapshot_history.history(ticker_upper, start, end):
+                company_data = entry['company']
+                version = {'version': entry['version'], 'updated_at': entry['updated_at']}
+                if company_data is None:
+                    version['removed'] = True
+                else:
+                    version['latest_period'] = company_data.get('latest_period', '')
+                    ratios = (company_data.get('all_periods', {}).get(period, {}) if period
+                              else company_data.get('ratios', {}))
+                    version['ratios'] = _project_ratios(ratios, wanted)
+                versions.append(version)
+            
+            return {
+                'success': True,
+                'data': {
+                    'ticker': ticker_upper,
+                    'period': period,
+                    'versions': versions
+                },
+                'retained_from': snapshot_history.retained_from(),
+                'last_updated': snap.last_updated
+            }
+        
+        key = f"history:{ticker_upper}:{start}:{end}:{period}:{','.join(fields)}"
+        return cached_json_response(snap, key, build)
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/screen', methods=['GET'])
+def screen_companies():
+    """
+    Screen companies by ratio ranges, e.g. /api/screen?roe>15&der<1&sector=Mining&sort=-roe&limit=10
+    Filters may also be passed as where=roe>15,der<1. period defaults to each company's latest.
+    """
+    try:
+        snap = snapshot
+        store = snap.store
+        
+        # Bare conditions like 'roe>15' arrive as query-string segments rather than key=value pairs
+        filters = []
+        segments = [unquote_plus(seg) for seg in request.query_string.decode('utf-8').split('&') if seg]
+        segments += [seg for expr in request.args.getlist('where') for seg in expr.split(',') if seg]
+        for segment in segments:
+            if segment.split('=', 1)[0] in SCREEN_PARAMS:
+                continue
+            parsed = parse_filter(segment)
+            if parsed is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Invalid filter: {segment}'
+                }), 400
+            filters.append(parsed)
+        
+        sectors = _list_arg('sector')
+        period = request.args.get('period') or None
+        sort = request.args.get('sort') or None
+        limit = request.args.get('limit', type=int)
+        descending = bool(sort) and sort.startswith('-')
+        
+        try:
+            rows = store.screen(filters, sectors=sectors, period=period,
+                                sort=sort.lstrip('-') if sort else None, descending=descending, limit=limit)
+        except KeyError as e:
+            return jsonify({
+                'success': False,
+                'error': e.args[0]
+            }), 400
+        
+        results = [{
+            'ticker': store.tickers[row],
+            'name': store.names[row],
+            'sector': store.sectors[row],
+            'period': period or store.latest_periods[row],
+            'ratios': store.row_ratios(row, period)
+        } for row in rows]
         
         return jsonify({
             'success': True,
-            'data': sectors,
-            'last_updated': last_update_time.isoformat() if last_update_time else None
+            'data': results,
+            'count': len(results),
+            'last_updated': snap.last_updated
         })
     
     except Exception as e:
@@ -234,30 +1233,137 @@ def health_check():
     """
     API health check endpoint
     """
+    snap = snapshot
+    current_job = refresh_jobs.current()
     return jsonify({
-        'status': 'healthy',
-        'companies_loaded': len(financial_data_cache),
-        'last_updated': last_update_time.isoformat() if last_update_time else None,
+        'status': 'healthy' if snap.version else 'loading',
+        'companies_loaded': len(snap.data),
+        'snapshot_version': snap.version,
+        'refresh_in_progress': current_job.id if current_job else None,
+        'refresh_queued': [job.id for job in refresh_jobs.queued()],
+        'universe_size': len(universe),
+        'scheduler': refresh_scheduler.status() if SERVER_ROLE != 'worker' else None,
+        'history': snapshot_history.status(),
+        'startup': startup,
+        'last_updated': snap.last_updated,
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """
+    Metrics in the Prometheus text format. Each process reports its own counters; with
+    serve.py, refresh and fetch metrics live on the refresher's port.
+    """
+    snap = snapshot
+    SNAPSHOT_GAUGES['age'].set(time.time() - snap.updated_at.timestamp() if snap.updated_at else 0)
+    SNAPSHOT_GAUGES['version'].set(snap.version)
+    SNAPSHOT_GAUGES['companies'].set(len(snap.data))
+    SNAPSHOT_GAUGES['cells'].set(snap.store.values.size)
+    SNAPSHOT_GAUGES['file_bytes'].set(os.path.getsize(SNAPSHOT_FILE) if os.path.exists(SNAPSHOT_FILE) else 0)
+    SNAPSHOT_GAUGES['history_bytes'].set(snapshot_history.size_bytes())
+    RESPONSE_CACHE_BYTES.set(response_cache.size_bytes)
+    STREAM_SUBSCRIBERS.set(snapshot_events.subscribers)
+    STARTUP_SECONDS.set(startup['import_seconds'], phase='import')
+    for name, cache in (('response', response_cache), ('statement', statement_cache)):
+        if cache is None:
+            continue
+        hits, misses = cache.hits, cache.misses
+        CACHE_HITS.advance_to(hits, cache=name)
+        CACHE_MISSES.advance_to(misses, cache=name)
+        CACHE_HIT_RATIO.set(hits / (hits + misses) if hits + misses else 0, cache=name)
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route('/api/refresh', methods=['POST'])
 def refresh_data():
     """
-    Manually trigger data refresh
+    Manually trigger data refresh as a background job and return its id immediately.
+    Only tickers due for new filings are refetched; send {"full": true} to refetch every
+    ticker, or {"cache_only": true} to recompute ratios from cached statements without refetching.
+    {"tickers": [...]} limits the refresh to those tickers.
+    A running or queued job with the same full/cache_only/tickers options is joined instead
+    of starting another; otherwise the new job is queued behind the running one.
     """
+    if SERVER_ROLE == 'worker':
+        return forward_to_refresher()
     try:
-        global financial_data_cache, last_update_time
+        options = request.get_json(silent=True) or {}
+        job_options = {
+            'full': bool(options.get('full', False)),
+            'cache_only': bool(options.get('cache_only', False)),
+            'trigger': 'manual'
+        }
+        if options.get('tickers'):
+            job_options['tickers'] = [normalize_ticker(t) for t in options['tickers']]
+        job, created = refresh_jobs.submit(job_options)
+        state = ('queued' if job.status == 'queued' else 'started') if created else 'joined'
+        print(f"Manual data refresh {state} (job {job.id})...")
+        
+        response = jsonify({
+            'success': True,
+            'message': {'started': 'Refresh started', 'queued': 'Refresh queued behind the running one',
+                        'joined': 'An identical refresh is already in progress'}[state],
+            'data': job.to_dict(),
+            'last_updated': snapshot.last_updated
+        })
+        response.status_code = 202
+        response.headers['Location'] = f'/api/refresh/{job.id}'
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/refresh/priority', methods=['POST'])
+def prioritize_refresh():
+    """
+    Ask the scheduler to refresh {"tickers": [...]} ahead of their shard if their data is stale.
+    Workers forward the tickers their users request here.
+    """
+    if SERVER_ROLE == 'worker':
+        return forward_to_refresher()
+    try:
+        tickers = (request.get_json(silent=True) or {}).get('tickers', [])
+        if not tickers:
+            return jsonify({
+                'success': False,
+                'error': 'No tickers provided'
+            }), 400
         
-        print("Manual data refresh triggered...")
-        financial_data_cache = scraper.get_all_companies_data()
-        scraper.save_data_to_json(financial_data_cache)
-        last_update_time = datetime.now()
+        queued = refresh_scheduler.prioritize(normalize_ticker(t) for t in tickers)
+        return jsonify({
+            'success': True,
+            'queued': queued,
+            'scheduler': refresh_scheduler.status()
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/refresh/<job_id>', methods=['GET'])
+def get_refresh_job(job_id):
+    """
+    Get status and progress of a refresh job
+    """
+    if SERVER_ROLE == 'worker':
+        return forward_to_refresher()
+    try:
+        job = refresh_jobs.get(job_id)
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': f'Refresh job {job_id} not found'
+            }), 404
         
         return jsonify({
             'success': True,
-            'message': f'Data refreshed successfully for {len(financial_data_cache)} companies',
-            'last_updated': last_update_time.isoformat()
+            'data': job.to_dict(),
+            'last_updated': snapshot.last_updated
         })
     
     except Exception as e:
@@ -266,30 +1372,44 @@ def refresh_data():
             'error': str(e)
         }), 500
 
+startup['import_seconds'] = round(time.perf_counter() - STARTUP_CLOCK, 4)
+
 if __name__ == '__main__':
     print("Starting Financial Dashboard API Server...")
     
     # Load initial data
-    if load_or_create_data():
+    if load_or_create_data(wait=not FAST_START):
         print(f"Initial data loaded successfully")
     else:
         print("Failed to load initial data")
         exit(1)
     
-    # Start background update thread
-    update_thread = threading.Thread(target=update_data_background, daemon=True)
-    update_thread.start()
-    print("Background data update thread started")
+    # Start background refresh scheduler
+    start_background_refresh()
+    print(f"Background refresh scheduler started ({REFRESH_SHARDS} shards per {UPDATE_INTERVAL}s)")
     
-    # Start Flask server
+    # Start Flask server (development only; use serve.py for production)
     print("API Server starting on http://localhost:5000")
     print("\nAvailable endpoints:")
     print("- GET  /api/companies        - List all companies")
     print("- GET  /api/company/{ticker} - Get company details")
     print("- GET  /api/ratios/{ticker}  - Get company ratios")
+    print("- GET  /api/ratios?tickers=  - Get ratios for many companies")
     print("- POST /api/compare          - Compare companies")
+    print("- GET  /api/peers/{ticker}   - Companies with the closest ratio profiles")
     print("- GET  /api/sectors          - Companies by sector")
+    print("- GET  /api/sectors/stats    - Sector and market ratio statistics")
+    print("- GET  /api/ratios/{ticker}/rank - Company percentile ranks")
+    print("- GET  /api/history/{ticker} - Versions of a company's ratios (as_of= on company/ratios)")
+    print("- GET  /api/screen           - Screen companies by ratio filters")
+    print("- GET  /api/export           - Stream the dataset as NDJSON")
+    print("- GET  /api/stream           - Server-Sent Events on every new snapshot")
     print("- GET  /api/health           - Health check")
+    print("- GET  /api/metrics          - Prometheus metrics")
     print("- POST /api/refresh          - Manual data refresh")
+    print("- GET  /api/refresh/{job_id} - Refresh job status")
+    print("- POST /api/refresh/priority - Refresh requested tickers early")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    if DEBUG:
+        print("Debug mode is on (BEI_DEBUG=1); do not expose this server")
+    app.run(debug=DEBUG, host='0.0.0.0', port=5000)
\ No newline at end of file
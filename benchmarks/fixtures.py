@@ -0,0 +1,145 @@
+"""
+Offline stand-in for yfinance used by the benchmarks.
+
+FixtureTicker mimics the parts of yf.Ticker the scraper reads (one attribute per
+statement type) and serves either statements recorded from Yahoo with `record_fixtures`
+or deterministic synthetic ones, with an optional per-statement latency to model the
+network round trip.
+"""
+import os
+import pickle
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import paste
+
+SYNTHETIC_SECTORS = ['Banking', 'Telecommunications', 'Consumer Goods', 'Conglomerate', 'Food & Beverages',
+                     'Pharmaceuticals', 'Tobacco', 'Mining', 'Cement', 'Property', 'Energy', 'Retail']
+
+BALANCE_SHEET_ITEMS = ['Total Assets', 'Stockholders Equity', 'Total Liabilities Net Minority Interest',
+                       'Current Assets', 'Current Liabilities', 'Inventory', 'Cash And Cash Equivalents']
+BANK_BALANCE_SHEET_ITEMS = ['Total Assets', 'Stockholders Equity', 'Total Liabilities Net Minority Interest',
+                            'Cash And Cash Equivalents', 'Total Deposits', 'Net Loans']
+INCOME_STATEMENT_ITEMS = ['Total Revenue', 'Gross Profit', 'Net Income']
+BANK_INCOME_STATEMENT_ITEMS = ['Total Revenue', 'Net Interest Income', 'Net Income']
+CASHFLOW_ITEMS = ['Operating Cash Flow', 'Capital Expenditure', 'Free Cash Flow']
+
+
+def make_universe(size: int, base: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+    """
+    Returns {ticker: {"name", "sector"}} with `size` entries: the real companies in `base`
+    first, then synthetic tickers spread across SYNTHETIC_SECTORS.
+    """
+    base = base if base is not None else paste.BEIDataScraper().companies
+    universe = dict(list(base.items())[:size])
+    n = 0
+    while len(universe) < size:
+        n += 1
+        sector = SYNTHETIC_SECTORS[n % len(SYNTHETIC_SECTORS)]
+        universe[f"SYN{n:04d}.JK"] = {"name": f"Synthetic Company {n} Tbk", "sector": sector}
+    return universe
+
+
+def _statement(rng: np.random.Generator, items: List[str], periods: pd.DatetimeIndex, scale: float) -> pd.DataFrame:
+    # A stable base level per item with modest period-to-period drift, newest period first like yfinance
+    base = rng.uniform(0.2, 1.0, (len(items), 1)) * scale
+    drift = rng.uniform(0.85, 1.15, (len(items), len(periods)))
+    return pd.DataFrame(base * drift, index=items, columns=periods)
+
+
+def synthetic_statements(ticker: str, sector: str = 'Unknown', annual_periods: int = 4,
+                         quarterly_periods: int = 8) -> Dict:
+    """
+    Builds a deterministic set of statements for `ticker` in yfinance's layout
+    (line items as rows, period end dates as columns, newest first).
+    """
+    rng = np.random.default_rng(zlib.crc32(ticker.encode('utf-8')))
+    bank = sector == 'Banking'
+    scale = float(10 ** rng.uniform(11, 14))
+    annual = pd.DatetimeIndex([pd.Timestamp(2024 - i, 12, 31) for i in range(annual_periods)])
+    quarterly = pd.date_range(end='2025-06-30', periods=quarterly_periods, freq='QE')[::-1]
+
+    def balance_sheet(periods):
+        df = _statement(rng, BANK_BALANCE_SHEET_ITEMS if bank else BALANCE_SHEET_ITEMS, periods, scale)
+        df.loc['Total Assets'] = df.loc['Stockholders Equity'] + df.loc['Total Liabilities Net Minority Interest']
+        return df
+
+    def income_statement(periods):
+        return _statement(rng, BANK_INCOME_STATEMENT_ITEMS if bank else INCOME_STATEMENT_ITEMS, periods, scale / 5)
+
+    return {
+        'info': {'symbol': ticker, 'sector': sector, 'currency': 'IDR'},
+        'financials': income_statement(annual),
+        'balance_sheet': balance_sheet(annual),
+        'cashflow': _statement(rng, CASHFLOW_ITEMS, annual, scale / 10),
+        'quarterly_financials': income_statement(quarterly),
+        'quarterly_balance_sheet': balance_sheet(quarterly),
+        'quarterly_cashflow': _statement(rng, CASHFLOW_ITEMS, quarterly, scale / 40),
+    }
+
+
+def record_fixtures(tickers: List[str], directory: str):
+    """
+    Records real yfinance statements for `tickers` into `directory` (one pickle per ticker).
+    This is the only function in the benchmark suite that touches the network.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for ticker in tickers:
+        stock = paste.yf.Ticker(ticker)
+        statements = {key: getattr(stock, key) for key in paste.STATEMENT_TYPES}
+        with open(os.path.join(directory, f"{ticker}.pkl"), 'wb') as f:
+            pickle.dump(statements, f)
+
+
+def load_fixtures(directory: str) -> Dict[str, Dict]:
+    """
+    Loads statements recorded by `record_fixtures`, keyed by ticker.
+    """
+    fixtures = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.pkl'):
+            with open(os.path.join(directory, filename), 'rb') as f:
+                fixtures[filename[:-len('.pkl')]] = pickle.load(f)
+    return fixtures
+
+
+class FixtureTicker:
+    """
+    Drop-in for yf.Ticker. Recorded statements win over synthetic ones; every statement
+    access sleeps `latency` seconds, like one HTTP round trip per statement would.
+    """
+    latency = 0.0
+    sectors: Dict[str, str] = {}
+    recorded: Dict[str, Dict] = {}
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self._statements = self.recorded.get(ticker) or synthetic_statements(ticker, self.sectors.get(ticker, 'Unknown'))
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in self._statements:
+            raise AttributeError(name)
+        if self.latency:
+            time.sleep(self.latency)
+        return self._statements[name]
+
+
+@contextmanager
+def offline_yfinance(universe: Dict[str, Dict], latency: float = 0.0, fixtures_dir: Optional[str] = None):
+    """
+    Swaps yf.Ticker for FixtureTicker inside the block.
+    """
+    FixtureTicker.latency = latency
+    FixtureTicker.sectors = {ticker: info.get('sector', 'Unknown') for ticker, info in universe.items()}
+    FixtureTicker.recorded = load_fixtures(fixtures_dir) if fixtures_dir else {}
+    original = paste.yf.Ticker
+    paste.yf.Ticker = FixtureTicker
+    try:
+        yield FixtureTicker
+    finally:
+        paste.yf.Ticker = original
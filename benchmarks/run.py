@@ -0,0 +1,451 @@
+"""
+Offline performance benchmarks. No network access: yf.Ticker is replaced by the
+fixture-backed stand-in from benchmarks/fixtures.py.
+
+    python -m benchmarks.run --universe 1000 --latency 0.05
+    python -m benchmarks.run --quick --compare benchmarks/results/<earlier run>.json
+
+Measures ratio computation throughput, full scrape wall time, snapshot save/load time,
+API server cold start, per-endpoint latency (p50/p99) under concurrent load, update delivery
+over /api/stream and refresh job turnaround, and writes everything to a JSON file (benchmarks/results/ by default) so runs can be compared across commits.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+from urllib.request import Request, urlopen
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import numpy as np
+
+import paste
+from benchmarks.fixtures import make_universe, offline_yfinance
+from ratio_pool import RatioComputePool
+from snapshot import Snapshot
+from snapshot_format import LazyCompanies, load_snapshot, save_snapshot
+from statement_cache import StatementCache
+
+logger = logging.getLogger('benchmarks')
+
+REFRESH_POLL_INTERVAL = 0.005  # Seconds between job status polls in the refresh benchmark
+
+
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[object, float]:
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def _latency_summary(samples: List[float]) -> Dict:
+    ms = np.array(samples) * 1000
+    return {
+        'count': len(samples),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'max_ms': round(float(ms.max()), 3),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def bench_fetch(scraper: paste.BEIDataScraper) -> Tuple[Dict, Dict]:
+    """
+    Full scrape wall time with a cold statement cache, then a cache-only recompute.
+    Returns (results, scraped data).
+    """
+    universe = scraper.companies
+    data, cold = _timed(scraper.get_all_companies_data)
+    _, warm = _timed(scraper.get_all_companies_data, cache_only=True)
+    return {
+        'tickers': len(universe),
+        'workers': scraper.max_workers,
+        'requests_per_second': scraper.rate_limiter.rate,
+        'cold_wall_s': round(cold, 4),
+        'cache_only_wall_s': round(warm, 4),
+        'cold_tickers_per_s': round(len(universe) / cold, 2),
+    }, data
+
+
+def bench_ratios(scraper: paste.BEIDataScraper, repeat: int, processes: int) -> Dict:
+    """
+    Ratio computation throughput, per ticker through _calculate_ratios and for the whole universe at once,
+    then the full company records (every series) in-process and on a pool of `processes` processes.
+    Statements come from the cache filled by bench_fetch, so nothing is fetched here.
+    """
+    universe = scraper.companies
+    statements = {ticker: scraper._get_financial_data_cached(ticker) for ticker in universe}
+
+    per_ticker = []
+    for _ in range(repeat):
+        _, elapsed = _timed(lambda: [scraper._calculate_ratios(statements[t], t) for t in universe])
+        per_ticker.append(elapsed)
+    batch = [_timed(scraper.calculate_ratios_batch, statements)[1] for _ in range(repeat)]
+
+    records_inline = [_timed(scraper.build_companies_batch, statements)[1] for _ in range(repeat)]
+    scraper.compute_pool = RatioComputePool(processes, min_batch=0)
+    try:
+        scraper.build_companies_batch(statements)  # Start the worker processes outside the timing
+        records_pool = [_timed(scraper.build_companies_batch, statements)[1] for _ in range(repeat)]
+    finally:
+        scraper.compute_pool.shutdown()
+        scraper.compute_pool = None
+
+    return {
+        'tickers': len(universe),
+        'repeat': repeat,
+        'per_ticker_best_s': round(min(per_ticker), 5),
+        'per_ticker_tickers_per_s': round(len(universe) / min(per_ticker), 1),
+        'batch_best_s': round(min(batch), 5),
+        'batch_tickers_per_s': round(len(universe) / min(batch), 1),
+        'records_inline_best_s': round(min(records_inline), 5),
+        'records_pool_best_s': round(min(records_pool), 5),
+        'records_pool_processes': processes,
+    }
+
+
+def bench_snapshot(data: Dict, repeat: int) -> Dict:
+    """
+    Save/load time of the binary snapshot, with the JSON file for comparison.
+    """
+    snap_path, json_path = os.path.abspath('bench.snap'), os.path.abspath('bench.json')
+    save_s = min(_timed(save_snapshot, data, snap_path, 1)[1] for _ in range(repeat))
+
+    def load_binary():
+        snapshot_file = load_snapshot(snap_path)
+        return Snapshot(LazyCompanies(snapshot_file), snapshot_file.version, store=snapshot_file.ratio_store())
+    load_s = min(_timed(load_binary)[1] for _ in range(repeat))
+
+    def save_json():
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+
+    def load_json():
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return Snapshot(json.load(f))
+    json_save_s = min(_timed(save_json)[1] for _ in range(repeat))
+    json_load_s = min(_timed(load_json)[1] for _ in range(repeat))
+
+    return {
+        'companies': len(data),
+        'binary_bytes': os.path.getsize(snap_path),
+        'binary_save_ms': round(save_s * 1000, 3),
+        'binary_load_ms': round(load_s * 1000, 3),
+        'json_bytes': os.path.getsize(json_path),
+        'json_save_ms': round(json_save_s * 1000, 3),
+        'json_load_ms': round(json_load_s * 1000, 3),
+    }
+
+
+def bench_cold_start(snap_path: str, repeat: int) -> Dict:
+    """
+    Time for a fresh API server process to import and start serving an existing snapshot,
+    as reported by the server itself, plus the whole process wall time.
+    """
+    script = ("import json, sys, api_server; api_server.load_or_create_data(); "
+              "print(json.dumps(dict(api_server.startup, pandas_loaded='pandas' in sys.modules)))")
+    env = dict(os.environ, BEI_SNAPSHOT_FILE=snap_path, BEI_HISTORY_DIR=os.path.abspath('cold_start_history'),
+               PYTHONPATH=REPO_ROOT)
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.check_output([sys.executable, '-c', script], env=env, stderr=subprocess.DEVNULL, text=True)
+        runs.append((time.perf_counter() - start, json.loads(output.strip().splitlines()[-1])))
+    wall, best = min(runs, key=lambda run: run[1]['ready_seconds'])
+    return {
+        'import_ms': round(best['import_seconds'] * 1000, 3),
+        'ready_ms': round(best['ready_seconds'] * 1000, 3),
+        'process_wall_ms': round(wall * 1000, 3),
+        'pandas_loaded': best['pandas_loaded'],
+    }
+
+
+def _endpoints(tickers: List[str]) -> List[Tuple[str, str, str, Dict]]:
+    """
+    (label, method, path, json body) for every read endpoint
+    """
+    first, last = tickers[0], tickers[-1]
+    batch = ','.join(tickers[:20])
+    return [
+        ('companies', 'GET', '/api/companies', None),
+        ('company', 'GET', f'/api/company/{first}', None),
+        ('ratios', 'GET', f'/api/ratios/{last}', None),
+        ('ratios_batch', 'GET', f'/api/ratios?tickers={batch}&fields=roe,roa,der', None),
+        ('compare', 'POST', '/api/compare', {'tickers': tickers[:5]}),
+        ('sectors', 'GET', '/api/sectors', None),
+        ('export', 'GET', '/api/export', None),
+        ('sector_stats', 'GET', '/api/sectors/stats?ratio=roe,der', None),
+        ('rank', 'GET', f'/api/ratios/{last}/rank', None),
+        ('screen', 'GET', '/api/screen?roe>5&sort=-roe&limit=20', None),
+        ('peers', 'GET', f'/api/peers/{first}?k=10', None),
+        ('peers_custom', 'GET', f'/api/peers/{last}?k=10&ratios=roe,roa,der&same_sector=true', None),
+        ('history', 'GET', f'/api/history/{first}', None),
+        ('health', 'GET', '/api/health', None),
+        ('metrics', 'GET', '/api/metrics', None),
+    ]
+
+
+def _read_event(stream) -> str:
+    """
+    Reads one Server-Sent Events message from an open /api/stream response and returns its event name
+    """
+    name = None
+    while True:
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("Update stream closed")
+        line = line.decode('utf-8').rstrip('\r\n')
+        if line.startswith('event: '):
+            name = line[len('event: '):]
+        elif not line and name:
+            return name
+
+
+def bench_stream(api_server, base_url: str, data: Dict, subscribers: int, rounds: int) -> Dict:
+    """
+    /api/stream: time from connecting to the opening 'hello' event, and from the start of a
+    publish (which includes building the snapshot's derived structures) until each of
+    `subscribers` open streams has received its 'snapshot' event.
+    """
+    streams, connect = [], []
+    try:
+        for _ in range(subscribers):
+            start = time.perf_counter()
+            stream = urlopen(base_url + '/api/stream', timeout=60)
+            streams.append(stream)
+            if _read_event(stream) != 'hello':
+                raise ValueError("Update stream did not open with a hello event")
+            connect.append(time.perf_counter() - start)
+
+        delivery = []
+        changed = list(data)[:1]
+        with ThreadPoolExecutor(max_workers=subscribers) as pool:
+            for _ in range(rounds):
+                waiting = [pool.submit(_read_event, stream) for stream in streams]
+                start = time.perf_counter()
+                api_server.publish_snapshot(data, changed)
+                for future in waiting:
+                    if future.result() != 'snapshot':
+                        raise ValueError("Expected a snapshot event")
+                    delivery.append(time.perf_counter() - start)
+    finally:
+        for stream in streams:
+            stream.close()
+    return {'subscribers': subscribers, 'first_event': _latency_summary(connect),
+            'publish_to_delivery': _latency_summary(delivery)}
+
+
+def bench_refresh_job(base_url: str, rounds: int) -> Dict:
+    """
+    POST /api/refresh with cache_only, polling the job's Location until it finishes: the
+    time to accept the job and the time until it reports succeeded. Cache-only refreshes
+    recompute every ratio from the statements the fetch benchmark cached; a full refetch is
+    what the fetch benchmark measures.
+    """
+    def run():
+        start = time.perf_counter()
+        request = Request(base_url + '/api/refresh', data=json.dumps({'cache_only': True}).encode('utf-8'),
+                          method='POST', headers={'Content-Type': 'application/json'})
+        with urlopen(request, timeout=60) as response:
+            location = response.headers['Location']
+        accepted = time.perf_counter() - start
+        while True:
+            with urlopen(base_url + location, timeout=60) as response:
+                job = json.loads(response.read())['data']
+            if job['status'] in ('succeeded', 'failed'):
+                return accepted, time.perf_counter() - start, job['status']
+            time.sleep(REFRESH_POLL_INTERVAL)
+
+    run()  # Loads the scraper stack the server defers until the first refresh
+    outcomes = [run() for _ in range(rounds)]
+    return {
+        'accepted': _latency_summary([accepted for accepted, _, _ in outcomes]),
+        'completed': _latency_summary([completed for _, completed, _ in outcomes]),
+        'errors': sum(1 for _, _, status in outcomes if status != 'succeeded'),
+    }
+
+
+def bench_endpoints(data: Dict, concurrency: int, requests_per_endpoint: int, rounds: int) -> Dict:
+    """
+    p50/p99 latency of every endpoint under `concurrency` parallel clients against a
+    threaded server on a loopback port, then `rounds` of update delivery to `concurrency`
+    open streams and of cache-only refresh jobs.
+    """
+    import api_server
+    from werkzeug.serving import make_server
+
+    api_server.record_history(api_server.publish_snapshot(data))
+    server = make_server('127.0.0.1', 0, api_server.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    def call(method, path, body):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        req = Request(base_url + path, data=payload, method=method, headers={'Content-Type': 'application/json'})
+        start = time.perf_counter()
+        with urlopen(req, timeout=60) as response:
+            response.read()
+            status = response.status
+        return time.perf_counter() - start, status
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for label, method, path, body in _endpoints(list(data)):
+                call(method, path, body)  # Warm the response cache
+                start = time.perf_counter()
+                outcomes = list(pool.map(lambda _: call(method, path, body), range(requests_per_endpoint)))
+                wall = time.perf_counter() - start
+                summary = _latency_summary([elapsed for elapsed, _ in outcomes])
+                summary['requests_per_s'] = round(requests_per_endpoint / wall, 1)
+                summary['errors'] = sum(1 for _, status in outcomes if status >= 400)
+                results[label] = summary
+        stream = bench_stream(api_server, base_url, data, concurrency, rounds)
+        refresh_job = bench_refresh_job(base_url, rounds)
+    finally:
+        server.shutdown()
+    return {'concurrency': concurrency, 'endpoints': results, 'stream': stream, 'refresh_job': refresh_job}
+
+
+def _flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(current: Dict, baseline_path: str):
+    """
+    Prints every timing metric that moved by more than 10% against an earlier results file.
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    before, after = _flatten(baseline['results']), _flatten(current['results'])
+    print(f"\nCompared with {baseline['meta'].get('commit')} ({baseline_path}):")
+    if baseline['meta']['args'].get('universe') != current['meta']['args'].get('universe'):
+        print("  (different universe sizes; timings are not directly comparable)")
+    for key in sorted(before.keys() & after.keys()):
+        if key.endswith('per_s') or not key.endswith(('_s', '_ms')) or not before[key]:
+            continue
+        change = (after[key] - before[key]) / before[key] * 100
+        if abs(change) >= 10:
+            print(f"  {key}: {before[key]} -> {after[key]} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline performance benchmarks for the BEI financial ratio backend")
+    parser.add_argument('--universe', type=int, default=15, help="Number of tickers (15 real, the rest synthetic)")
+    parser.add_argument('--latency', type=float, default=0.0, help="Simulated seconds per yfinance statement request")
+    parser.add_argument('--fixtures', help="Directory of statements recorded with benchmarks.fixtures.record_fixtures")
+    parser.add_argument('--workers', type=int, default=8, help="Scraper fetch workers")
+    parser.add_argument('--rps', type=float, default=1000.0, help="Scraper rate limit (requests per second)")
+    parser.add_argument('--concurrency', type=int, default=8, help="Parallel clients in the endpoint benchmark")
+    parser.add_argument('--requests', type=int, default=200, help="Requests per endpoint")
+    parser.add_argument('--compute-processes', type=int, default=os.cpu_count() or 1,
+                        help="Processes for the pooled ratio computation")
+    parser.add_argument('--repeat', type=int, default=5, help="Repetitions for the in-process timings")
+    parser.add_argument('--quick', action='store_true', help="Smaller run for a fast sanity check")
+    parser.add_argument('--output', help="Results file (default benchmarks/results/<timestamp>-<commit>.json)")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--keep-workdir', action='store_true',
+                        help="Keep the scratch directory with the benchmark's cache and snapshot files")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.requests, args.repeat = min(args.requests, 50), min(args.repeat, 2)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', force=True)
+    for name in ('paste', 'werkzeug', 'statement_cache', 'refresh_planner'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    commit = _git_commit()
+    output = args.output or os.path.join(REPO_ROOT, 'benchmarks', 'results',
+                                         f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json")
+    output = os.path.abspath(output)
+
+    # Everything the benchmark writes (statement cache, snapshots, refresh state) lands in a scratch
+    # directory, removed afterwards unless --keep-workdir is given
+    if args.fixtures:
+        args.fixtures = os.path.abspath(args.fixtures)
+    if args.compare:
+        args.compare = os.path.abspath(args.compare)
+    cwd = os.getcwd()
+    workdir = tempfile.mkdtemp(prefix='bei-bench-')
+    os.chdir(workdir)
+    try:
+        os.environ['BEI_SNAPSHOT_FILE'] = os.path.join(workdir, 'bei_financial_data.snap')
+        # The API server refreshes the benchmark universe from the statements the fetch benchmark caches
+        os.environ['BEI_STATEMENT_CACHE_DIR'] = os.path.join(workdir, 'statement_cache')
+        os.environ['BEI_HISTORY_DIR'] = os.path.join(workdir, 'snapshot_history')
+        os.environ['BEI_UNIVERSE_FILE'] = os.path.join(workdir, 'universe.json')
+
+        universe = make_universe(args.universe)
+        with open(os.environ['BEI_UNIVERSE_FILE'], 'w', encoding='utf-8') as f:
+            json.dump(universe, f)
+        scraper = paste.BEIDataScraper(max_workers=args.workers, requests_per_second=args.rps,
+                                       cache=StatementCache(os.path.join(workdir, 'statement_cache')))
+        scraper.companies = universe
+        results = {}
+        with offline_yfinance(universe, args.latency, args.fixtures):
+            logger.info(f"Scraping {len(universe)} tickers ({args.latency * 1000:.0f} ms simulated latency)...")
+            results['fetch'], data = bench_fetch(scraper)
+        logger.info("Timing ratio computation...")
+        results['ratios'] = bench_ratios(scraper, args.repeat, args.compute_processes)
+        logger.info("Timing snapshot save/load...")
+        results['snapshot'] = bench_snapshot(data, args.repeat)
+        logger.info("Timing API server cold start...")
+        results['cold_start'] = bench_cold_start(os.path.abspath('bench.snap'), args.repeat)
+        logger.info(f"Load-testing endpoints with {args.concurrency} clients...")
+        results['endpoints'] = bench_endpoints(data, args.concurrency, args.requests, args.repeat * 5)
+
+        report = {
+            'meta': {
+                'commit': commit,
+                'timestamp': datetime.now().isoformat(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'args': vars(args),
+            },
+            'results': results,
+        }
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        print(json.dumps(results, indent=2))
+        print(f"\nResults written to {output}")
+        if args.compare:
+            compare(report, args.compare)
+    finally:
+        os.chdir(cwd)
+        if args.keep_workdir:
+            print(f"Benchmark files kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,69 +1,168 @@
 import requests
 import pandas as pd
 import json
+import os
 from datetime import datetime, timedelta
 import time
 import logging
-from typing import Dict, List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
 import yfinance as yf
 
+import ratio_engine
+from metrics import REGISTRY, refresh_phase
+from ratio_pool import RatioComputePool
+from refresh_planner import RefreshPlanner
+from statement_cache import StatementCache
+from universe import DEFAULT_COMPANIES
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Raw datasets yfinance provides per ticker; only those the active ratios need are fetched
+STATEMENT_TYPES = ('info', 'financials', 'balance_sheet', 'cashflow',
+                   'quarterly_financials', 'quarterly_balance_sheet', 'quarterly_cashflow')
+
+FETCH_SECONDS = REGISTRY.histogram('bei_fetch_duration_seconds', 'yfinance fetch duration per ticker, all tickers')
+FETCH_TOTAL = REGISTRY.counter('bei_fetch_total', 'yfinance fetches per ticker', ['ticker'])
+FETCH_FAILURES = REGISTRY.counter('bei_fetch_failures_total', 'Failed yfinance fetches per ticker', ['ticker'])
+FETCH_LAST_SECONDS = REGISTRY.gauge('bei_fetch_last_duration_seconds', 'Duration of the latest yfinance fetch per ticker', ['ticker'])
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter shared by all fetch workers.
+    Allows short bursts up to `capacity` while holding the long-run rate at `rate` tokens per second.
+    """
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity is not None else max(1.0, self.rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        """
+        Blocks until `tokens` tokens are available, then consumes them.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+def _same_record(a: Optional[Dict], b: Optional[Dict]) -> bool:
+    """
+    Record equality that treats NaN ratios as equal (NaN != NaN for plain dict comparison).
+    """
+    return a == b or (a is not None and b is not None and
+                      json.dumps(a, sort_keys=True, default=str) == json.dumps(b, sort_keys=True, default=str))
+
+
 class BEIDataScraper:
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, requests_per_second: float = 2.0,
+                 cache: Optional[StatementCache] = None, companies: Optional[Dict[str, Dict]] = None,
+                 ratios: Optional[List[str]] = None, series: Optional[List[str]] = None,
+                 compute_pool: Optional[RatioComputePool] = None):
         """
-        Initializes the scraper with a requests session and a predefined list of IDX companies.
+        Initializes the scraper with a requests session and a list of IDX companies
+        ({ticker: {"name", "sector"}}), by default the built-in DEFAULT_COMPANIES.
+        `max_workers` bounds how many tickers are fetched concurrently and `requests_per_second`
+        caps the combined yfinance request rate across all workers. When a `cache` is given,
+        raw statements are read from and written to it so ratios can be recomputed offline.
+        `ratios` limits the computed ratios (default: every registered ratio) and `series` the
+        granularities computed (default: annual, quarterly and ttm); only the statements they
+        read are fetched. With a `compute_pool`, batches of ratios are computed on its
+        worker processes instead of in this one.
         """
+        self.max_workers = max(1, int(max_workers))
+        self.ratios = ratio_engine.select_ratios(ratios)
+        self.granularities = tuple(series or ratio_engine.GRANULARITIES)
+        unknown = [g for g in self.granularities if g not in ratio_engine.SERIES]
+        if unknown:
+            raise ValueError(f"Unknown ratio series: {', '.join(unknown)}")
+        required = ratio_engine.required_statements(self.ratios, self.granularities)
+        self.statement_types = tuple(s for s in STATEMENT_TYPES if s in required)
+        self.cache = cache
+        self.compute_pool = compute_pool
+        self.rate_limiter = TokenBucket(requests_per_second)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
         
-        # A more comprehensive list of Indonesian public companies
-        self.companies = {
-            "BBCA.JK": {"name": "Bank Central Asia Tbk", "sector": "Banking"},
-            "BMRI.JK": {"name": "Bank Mandiri Tbk", "sector": "Banking"},
-            "BBRI.JK": {"name": "Bank Rakyat Indonesia Tbk", "sector": "Banking"},
-            "BBNI.JK": {"name": "Bank Negara Indonesia Tbk", "sector": "Banking"},
-            "TLKM.JK": {"name": "Telkom Indonesia Tbk", "sector": "Telecommunications"},
-            "UNVR.JK": {"name": "Unilever Indonesia Tbk", "sector": "Consumer Goods"},
-            "ASII.JK": {"name": "Astra International Tbk", "sector": "Conglomerate"},
-            "INDF.JK": {"name": "Indofood Sukses Makmur Tbk", "sector": "Food & Beverages"},
-            "KLBF.JK": {"name": "Kalbe Farma Tbk", "sector": "Pharmaceuticals"},
-            "ICBP.JK": {"name": "Indofood CBP Sukses Makmur Tbk", "sector": "Food & Beverages"},
-            "GGRM.JK": {"name": "Gudang Garam Tbk", "sector": "Tobacco"},
-            "ADRO.JK": {"name": "Adaro Energy Tbk", "sector": "Mining"},
-            "ANTM.JK": {"name": "Aneka Tambang Tbk", "sector": "Mining"},
-            "INCO.JK": {"name": "Vale Indonesia Tbk", "sector": "Mining"},
-            "SMGR.JK": {"name": "Semen Indonesia Tbk", "sector": "Cement"}
-        }
-
-    def _get_financial_data_yfinance(self, ticker: str) -> Optional[Dict]:
+        # Ticker universe; defaults to the built-in list of large IDX companies
+        self.companies = dict(companies) if companies else dict(DEFAULT_COMPANIES)
+
+    def _get_financial_data_yfinance(self, ticker: str, use_cache: bool = True) -> Optional[Dict]:
         """
         Fetches financial data (annual and quarterly) using the yfinance library.
+        Statements still fresh in the statement cache are reused instead of refetched.
         """
+        start = None
         try:
+            financial_data = {}
+            if self.cache is not None and use_cache:
+                financial_data = self.cache.get_many(ticker, self.statement_types)
+                if len(financial_data) == len(self.statement_types):
+                    logger.info(f"Using cached financial data for {ticker}.")
+                    return financial_data
+
             logger.info(f"Fetching financial data for {ticker} from yfinance...")
+            start = time.perf_counter()
             stock = yf.Ticker(ticker)
             
-            # Fetch all available data points
-            financial_data = {
-                'info': stock.info,
-                'financials': stock.financials,
-                'balance_sheet': stock.balance_sheet,
-                'cashflow': stock.cashflow,
-                'quarterly_financials': stock.quarterly_financials,
-                'quarterly_balance_sheet': stock.quarterly_balance_sheet
-            }
+            # Fetch the missing statements, each one counted against the shared rate limit
+            for key in self.statement_types:
+                if key in financial_data:
+                    continue
+                self.rate_limiter.acquire()
+                financial_data[key] = getattr(stock, key)
+                if self.cache is not None:
+                    self.cache.put(ticker, key, financial_data[key])
+            self._record_fetch(ticker, start)
             logger.info(f"Successfully fetched data for {ticker}.")
             return financial_data
             
         except Exception as e:
+            self._record_fetch(ticker, start, failed=True)
             logger.error(f"Error fetching data for {ticker} from yfinance: {e}")
             return None
 
+    @staticmethod
+    def _record_fetch(ticker: str, start: Optional[float], failed: bool = False):
+        """
+        Records one network fetch (including time spent waiting on the rate limiter) in the metrics.
+        """
+        FETCH_TOTAL.inc(ticker=ticker)
+        if failed:
+            FETCH_FAILURES.inc(ticker=ticker)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            FETCH_SECONDS.observe(elapsed)
+            FETCH_LAST_SECONDS.set(elapsed, ticker=ticker)
+
+    def _get_financial_data_cached(self, ticker: str) -> Optional[Dict]:
+        """
+        Reads a ticker's raw statements from the statement cache only, ignoring their TTL.
+        """
+        if self.cache is None:
+            logger.error("Cache-only mode requested but the scraper has no statement cache.")
+            return None
+        financial_data = self.cache.get_many(ticker, self.statement_types, allow_expired=True)
+        if not financial_data:
+            logger.warning(f"No cached statements for {ticker}.")
+            return None
+        return financial_data
+
     def _find_financial_item(self, df: pd.DataFrame, possible_keys: List[str], period) -> float:
         """
         Finds a financial item in a DataFrame by checking a list of possible keys.
@@ -80,186 +179,232 @@ class BEIDataScraper:
         Calculates financial ratios from annual financial statements.
         It intelligently handles differences between banking and non-banking companies.
         """
+        return self.calculate_ratios_batch({ticker: financial_data}).get(ticker, {})
+
+    def calculate_ratios_batch(self, financial_data_by_ticker: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Calculates ratios for many tickers at once with the columnar ratio engine.
+        Statements are aligned to canonical line items once per ticker and every ratio is
+        evaluated for all periods and tickers as array operations.
+        """
+        sectors = {t: self.companies.get(t, {}).get("sector", "Unknown") for t in financial_data_by_ticker}
         try:
-            balance_sheet = financial_data.get('balance_sheet')
-            financials = financial_data.get('financials')
-            
-            if balance_sheet is None or financials is None or balance_sheet.empty or financials.empty:
-                logger.warning(f"Annual financial data is missing or empty for {ticker}. Skipping ratio calculation.")
-                return {}
+            return ratio_engine.calculate_ratios_batch(financial_data_by_ticker, sectors, ratios=self.ratios)
+        except Exception as e:
+            logger.error(f"Error calculating ratios for {', '.join(financial_data_by_ticker)}: {e}", exc_info=True)
+            return {ticker: {} for ticker in financial_data_by_ticker}
 
-            company_info = self.companies.get(ticker, {})
-            is_bank = company_info.get("sector") == "Banking"
-            
-            ratios_by_period = {}
-            
-            # Use the most recent 4 periods available
-            periods = balance_sheet.columns[:4]
-            
-            for period in periods:
-                period_str = str(period.year)
-                
-                # --- Data Extraction ---
-                # Use a helper function to find items with various possible names
-                bs_lower_index = {str(idx).lower(): idx for idx in balance_sheet.index}
-                is_lower_index = {str(idx).lower(): idx for idx in financials.index}
-
-                # Helper to extract value
-                def get_bs_val(keys):
-                    for k in keys:
-                        if k in bs_lower_index:
-                            return float(balance_sheet.loc[bs_lower_index[k], period]) or 0
-                    return 0
-                
-                def get_is_val(keys):
-                    for k in keys:
-                        if k in is_lower_index:
-                            return float(financials.loc[is_lower_index[k], period]) or 0
-                    return 0
-
-                # --- Common Items ---
-                total_assets = get_bs_val(['total assets', 'total asset'])
-                total_equity = get_bs_val(['stockholders equity', 'common stock equity', 'total equity gross minority interest'])
-                net_income = get_is_val(['net income from continuing operation net minority interest', 'net income'])
-                revenue = get_is_val(['total revenue', 'revenue'])
-                total_liabilities = get_bs_val(['total liabilities net minority interest', 'total liabilities'])
-                if total_liabilities == 0 and total_assets > 0 and total_equity > 0:
-                     total_liabilities = total_assets - total_equity
-
-
-                ratios = {}
-                if is_bank:
-                    # --- Banking Specific Ratios ---
-                    deposits = get_bs_val(['total deposits', 'customer deposits'])
-                    net_loans = get_bs_val(['net loans', 'loans'])
-                    net_interest_income = get_is_val(['net interest income'])
-                    
-                    # For banks, "Current Ratio" isn't standard. We can use other liquidity metrics.
-                    # Here, we'll calculate Loan-to-Deposit Ratio (LDR) as an activity/liquidity measure.
-                    ratios = {
-                        'liquidity': {
-                            'loanToDepositRatio': round(net_loans / deposits, 2) if deposits != 0 else 0,
-                        },
-                        'profitability': {
-                            'roe': round((net_income / total_equity) * 100, 2) if total_equity != 0 else 0,
-                            'roa': round((net_income / total_assets) * 100, 2) if total_assets != 0 else 0,
-                            'nim': round((net_interest_income / total_assets) * 100, 2) if total_assets != 0 else 0, # Net Interest Margin
-                        },
-                        'leverage': {
-                            'equityMultiplier': round(total_assets / total_equity, 2) if total_equity != 0 else 0,
-                            'debtToAssets': round(total_liabilities / total_assets, 2) if total_assets != 0 else 0,
-                        },
-                        'activity': {} # LDR is already in liquidity
-                    }
-                else:
-                    # --- Non-Banking Ratios ---
-                    current_assets = get_bs_val(['current assets', 'total current assets'])
-                    current_liabilities = get_bs_val(['current liabilities', 'total current liabilities'])
-                    inventory = get_bs_val(['inventory'])
-                    cash = get_bs_val(['cash and cash equivalents', 'cash'])
-                    gross_profit = get_is_val(['gross profit'])
-                    
-                    ratios = {
-                        'liquidity': {
-                            'currentRatio': round(current_assets / current_liabilities, 2) if current_liabilities != 0 else 0,
-                            'quickRatio': round((current_assets - inventory) / current_liabilities, 2) if current_liabilities != 0 else 0,
-                            'cashRatio': round(cash / current_liabilities, 2) if current_liabilities != 0 else 0
-                        },
-                        'profitability': {
-                            'roe': round((net_income / total_equity) * 100, 2) if total_equity != 0 else 0,
-                            'roa': round((net_income / total_assets) * 100, 2) if total_assets != 0 else 0,
-                            'npm': round((net_income / revenue) * 100, 2) if revenue != 0 else 0,
-                            'gpm': round((gross_profit / revenue) * 100, 2) if revenue != 0 else 0
-                        },
-                        'leverage': {
-                            'der': round(total_liabilities / total_equity, 2) if total_equity != 0 else 0,
-                            'dar': round(total_liabilities / total_assets, 2) if total_assets != 0 else 0,
-                        },
-                        'activity': {
-                            'assetTurnover': round(revenue / total_assets, 2) if total_assets != 0 else 0,
-                        }
-                    }
-                
-                ratios_by_period[period_str] = ratios
-            
-            return ratios_by_period
-            
+    def calculate_series_batch(self, financial_data_by_ticker: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Calculates every configured ratio series for many tickers.
+        Returns {ticker: {series field: ratios_by_period}}, e.g. 'all_periods' and 'ttm_periods'.
+        """
+        sectors = {t: self.companies.get(t, {}).get("sector", "Unknown") for t in financial_data_by_ticker}
+        return ratio_engine.calculate_series(financial_data_by_ticker, sectors, self.ratios, self.granularities)
+
+    def build_companies_batch(self, financial_data_by_ticker: Dict[str, Dict]) -> Dict[str, Dict]:
+        """
+        Computes the company records (all series plus the latest ratios and trends) for many
+        tickers, on the compute pool when there is one. Tickers without ratios map to {}.
+        """
+        if self.compute_pool is not None:
+            return self.compute_pool.compute(financial_data_by_ticker, self.companies,
+                                             [ratio.key for ratio in self.ratios], self.granularities,
+                                             self.statement_types)
+        return {ticker: self._build_company_data(ticker, series.get('all_periods', {}), series)
+                for ticker, series in self.calculate_series_batch(financial_data_by_ticker).items()}
+
+    def build_companies_isolated(self, financial_data_by_ticker: Dict[str, Dict]) -> Dict[str, Optional[Dict]]:
+        """
+        Like build_companies_batch, but a batch that fails is rebuilt ticker by ticker so one bad
+        ticker never costs the others. Tickers that fail on their own (logged) map to None,
+        tickers without ratios to {}.
+        """
+        try:
+            return self.build_companies_batch(financial_data_by_ticker)
         except Exception as e:
-            logger.error(f"Error calculating ratios for {ticker}: {e}", exc_info=True)
-            return {}
+            logger.error(f"Error calculating ratios for a batch of {len(financial_data_by_ticker)} tickers ({e}); "
+                         f"retrying ticker by ticker", exc_info=True)
+        results = {}
+        for ticker, financial_data in financial_data_by_ticker.items():
+            try:
+                results.update(self.build_companies_batch({ticker: financial_data}))
+            except Exception as e:
+                logger.error(f"Error calculating ratios for {ticker}: {e}", exc_info=True)
+                results[ticker] = None
+        return results
 
-    def get_company_data(self, ticker: str) -> Dict:
+    def get_company_data(self, ticker: str, cache_only: bool = False) -> Dict:
         """
         Orchestrates the process of fetching data, calculating ratios, and formatting the final output.
+        With `cache_only`, raw statements come from the statement cache and no network call is made.
         """
         logger.info(f"--- Processing {ticker} ---")
         
-        financial_data = self._get_financial_data_yfinance(ticker)
+        if cache_only:
+            financial_data = self._get_financial_data_cached(ticker)
+        else:
+            financial_data = self._get_financial_data_yfinance(ticker)
+            if self.cache is not None:
+                self.cache.flush()
         if not financial_data:
             return {}
         
-        ratios_by_period = self._calculate_ratios(financial_data, ticker)
-        
-        if not ratios_by_period:
-            logger.warning(f"Could not calculate any ratios for {ticker}. Final data will be empty.")
-            return {}
-            
+        series = self.calculate_series_batch({ticker: financial_data})[ticker]
+        return self._build_company_data(ticker, series.get('all_periods', {}), series)
+
+    def _build_company_data(self, ticker: str, ratios_by_period: Dict, series: Optional[Dict] = None) -> Dict:
+        """
+        Formats a ticker's ratios_by_period into the company record served by the API.
+        Other series from calculate_series_batch (quarterly_periods, ttm_periods) are stored alongside.
+        """
         company_info = self.companies.get(ticker, {"name": ticker, "sector": "Unknown"})
-        
-        # Get latest period data
-        sorted_periods = sorted(ratios_by_period.keys(), reverse=True)
-        latest_period = sorted_periods[0] if sorted_periods else "N/A"
-        latest_ratios = ratios_by_period.get(latest_period, {})
-        
-        # Create trend data for charts (last 4 periods)
-        trends = {}
-        if latest_ratios:
-            for category, ratio_dict in latest_ratios.items():
-                for ratio_name in ratio_dict.keys():
-                    trend_data = []
-                    for period in sorted(ratios_by_period.keys()):
-                        value = ratios_by_period.get(period, {}).get(category, {}).get(ratio_name)
-                        if value is not None:
-                             trend_data.append({'period': period, 'value': value})
-                    trends[f"{category}_{ratio_name}"] = trend_data[-4:]
-        
-        return {
-            'ticker': ticker,
-            'name': company_info['name'],
-            'sector': company_info['sector'],
-            'latest_period': latest_period,
-            'ratios': latest_ratios,
-            'trends': trends,
-            'all_periods': ratios_by_period
-        }
-
-    def get_all_companies_data(self) -> Dict:
+        return ratio_engine.build_company_record(ticker, company_info, dict(series or {}, all_periods=ratios_by_period))
+
+    def get_all_companies_data(self, max_workers: Optional[int] = None, cache_only: bool = False,
+                               progress: Optional[Callable[[int, int], None]] = None) -> Dict:
         """
         Gets data for all companies defined in self.companies.
+        Tickers are fetched on a bounded worker pool; the shared token bucket keeps the
+        overall request rate polite, so no fixed sleep between tickers is needed. Ratios
+        are then computed for the whole universe in one batch (on the compute pool, if any).
+        With `cache_only`, ratios are recomputed from cached statements without any network access.
+        `progress(done, total)` is called as each ticker is fetched.
         """
-        all_data = {}
-        for ticker in self.companies.keys():
-            try:
-                company_data = self.get_company_data(ticker)
+        tickers = list(self.companies.keys())
+
+        with refresh_phase('cache_rebuild' if cache_only else 'full_scrape'):
+            fetched = self._fetch_many(tickers, progress=progress, cache_only=cache_only, max_workers=max_workers)
+            statements = {ticker: fetched[ticker] for ticker in tickers if fetched.get(ticker)}
+            for ticker in tickers:
+                if ticker not in statements:
+                    logger.warning(f"No data generated for {ticker}")
+            results = self.build_companies_isolated(statements)
+
+        # Keep the same ordering as self.companies regardless of completion order
+        return {ticker: results[ticker] for ticker in tickers if results.get(ticker)}
+
+    def _fetch_many(self, tickers: List[str], use_cache: bool = True,
+                    progress: Optional[Callable[[int, int], None]] = None, cache_only: bool = False,
+                    max_workers: Optional[int] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Fetches raw statements for several tickers on the bounded worker pool.
+        With `cache_only`, statements are read from the cache only, without network access.
+        """
+        if not tickers:
+            return {}
+        workers = max(1, min(max_workers or self.max_workers, len(tickers)))
+        results = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bei-fetch") as executor:
+            if cache_only:
+                futures = {executor.submit(self._get_financial_data_cached, ticker): ticker for ticker in tickers}
+            else:
+                futures = {executor.submit(self._get_financial_data_yfinance, ticker, use_cache): ticker
+                           for ticker in tickers}
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(len(results), len(tickers))
+        if self.cache is not None:
+            self.cache.flush()
+        return results
+
+    def _info_changed(self, ticker: str, snapshot: Dict) -> bool:
+        """
+        True when a ticker's record carries a different name or sector than the universe now lists.
+        """
+        record = snapshot.get(ticker)
+        if not record:
+            return False
+        info = self.companies.get(ticker, {})
+        return (record.get('name'), record.get('sector')) != (info.get('name', ticker), info.get('sector', 'Unknown'))
+
+    def refresh_incremental(self, snapshot: Dict, planner: RefreshPlanner, force: bool = False,
+                            progress: Optional[Callable[[int, int], None]] = None,
+                            only: Optional[List[str]] = None):
+        """
+        Refreshes only the tickers the planner considers due (every ticker when `force`),
+        recomputes ratios only for those whose statement fingerprint changed, and merges
+        them into a copy of `snapshot`. A ticker whose name or sector in the universe no longer
+        matches its record is always refetched and recomputed, since the sector decides its ratios. Returns (new_snapshot, changed_tickers, fetch_state):
+        nothing is recorded in the planner here, the caller passes `fetch_state` to
+        planner.commit() once the new snapshot is published.
+        With `only`, candidates are limited to those tickers (one shard of the universe);
+        every other ticker keeps its data from `snapshot`.
+        """
+        tickers = list(self.companies.keys())
+        candidates = tickers if only is None else [t for t in only if t in self.companies]
+        relabeled = {ticker for ticker in candidates if self._info_changed(ticker, snapshot)}
+        due = candidates if force else [t for t in candidates if t in relabeled or planner.is_due(t)]
+        logger.info(f"Incremental refresh: {len(due)} of {len(candidates)} tickers due")
+
+        with refresh_phase('fetch'):
+            fetched = self._fetch_many(due, use_cache=False, progress=progress)
+        to_recompute, fetch_state = {}, {}
+        for ticker in due:
+            financial_data = fetched.get(ticker)
+            if not financial_data:
+                continue  # Keep serving the previous data and retry next cycle
+            modified, fetch_state[ticker] = planner.check_fetch(ticker, financial_data)
+            if modified or ticker not in snapshot or ticker in relabeled:
+                to_recompute[ticker] = financial_data
+
+        changed = []
+        new_snapshot = {ticker: data for ticker, data in snapshot.items() if ticker in self.companies}
+        with refresh_phase('ratios'):
+            for ticker, company_data in self.build_companies_isolated(to_recompute).items():
                 if company_data:
-                    all_data[ticker] = company_data
-                    logger.info(f"Successfully processed and formatted data for {ticker}")
+                    new_snapshot[ticker] = company_data
+                    changed.append(ticker)
                 else:
-                    logger.warning(f"No data generated for {ticker}")
-                
-                time.sleep(1) # Be polite to the API server
-            except Exception as e:
-                logger.error(f"A critical error occurred while processing {ticker}: {e}", exc_info=True)
-                continue
-        return all_data
+                    fetch_state.pop(ticker, None)  # Not recomputed, so not up to date either
+
+        removed = set(snapshot) - set(new_snapshot)
+        logger.info(f"Incremental refresh recomputed {len(changed)} tickers, removed {len(removed)}")
+        new_snapshot = {ticker: new_snapshot[ticker] for ticker in tickers if ticker in new_snapshot}
+        return new_snapshot, changed + sorted(removed), fetch_state
+
+    def refresh_from_cache(self, snapshot: Dict, progress: Optional[Callable[[int, int], None]] = None,
+                           only: Optional[List[str]] = None):
+        """
+        Recomputes ratios from cached statements, without network access, and merges them into a
+        copy of `snapshot`. Tickers with nothing cached (never fetched, or expired or evicted from
+        the cache) keep their data from `snapshot`; with `only`, just those tickers are recomputed.
+        Returns (new_snapshot, changed_tickers), where tickers that left the universe count as changed.
+        """
+        tickers = list(self.companies.keys())
+        candidates = tickers if only is None else [t for t in only if t in self.companies]
+
+        with refresh_phase('cache_rebuild'):
+            fetched = self._fetch_many(candidates, progress=progress, cache_only=True)
+            statements = {ticker: fetched[ticker] for ticker in candidates if fetched.get(ticker)}
+            missing = len(candidates) - len(statements)
+            if missing:
+                logger.warning(f"{missing} tickers have no cached statements and keep their current data")
+            records = self.build_companies_isolated(statements)
+
+        changed = []
+        new_snapshot = {ticker: data for ticker, data in snapshot.items() if ticker in self.companies}
+        for ticker, company_data in records.items():
+            if company_data and not _same_record(company_data, new_snapshot.get(ticker)):
+                new_snapshot[ticker] = company_data
+                changed.append(ticker)
+
+        removed = set(snapshot) - set(new_snapshot)
+        logger.info(f"Cache rebuild recomputed {len(changed)} changed tickers, removed {len(removed)}")
+        new_snapshot = {ticker: new_snapshot[ticker] for ticker in tickers if ticker in new_snapshot}
+        return new_snapshot, changed + sorted(removed)
 
     def save_data_to_json(self, data: Dict, filename: str = "bei_financial_data.json"):
         """
         Saves the final data dictionary to a JSON file.
+        The file is written next to the target and renamed over it, so readers never see a partial file.
         """
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
+            tmp_filename = f"{filename}.tmp"
+            with open(tmp_filename, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=4, ensure_ascii=False, default=str)
+            os.replace(tmp_filename, filename)
             logger.info(f"All data successfully saved to {filename}")
         except Exception as e:
             logger.error(f"Error saving data to JSON file: {e}")
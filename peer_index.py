@@ -0,0 +1,144 @@
+import warnings
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ratio_store import RatioStore
+
+# Neighbours precomputed per company; larger k (or custom ratios/periods) is answered by a direct scan
+MAX_NEIGHBOURS = 50
+# Two companies are only compared when they share at least this many reported ratios
+MIN_SHARED_RATIOS = 3
+# Standardized values are clipped to +/- this many robust standard deviations so one outlier ratio cannot dominate
+Z_CLIP = 5.0
+# Rows of the all-pairs distance computation handled per block, bounding memory at block x companies
+BLOCK_ROWS = 512
+
+
+def standardize(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Robustly standardizes a company x ratio matrix column by column: (value - median) / (IQR / 1.349),
+    falling back to the standard deviation for degenerate columns, then clipped to +/- Z_CLIP.
+    Returns (features, mask) where missing values are 0 in features and 0 in the float mask.
+    """
+    present = ~np.isnan(matrix)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)  # All-NaN columns yield NaN
+        if matrix.shape[0]:
+            q1, median, q3 = np.nanpercentile(matrix, [25, 50, 75], axis=0)
+            std = np.nanstd(matrix, axis=0)
+        else:
+            q1 = median = q3 = std = np.full(matrix.shape[1], np.nan)
+    scale = (q3 - q1) / 1.349
+    scale = np.where(scale > 0, scale, np.where(std > 0, std, 1.0))
+    median = np.nan_to_num(median)
+    with np.errstate(invalid='ignore'):
+        features = np.clip((matrix - median) / scale, -Z_CLIP, Z_CLIP)
+    features[~present] = 0.0
+    return features, present.astype(float)
+
+
+def masked_distances(query: np.ndarray, query_mask: np.ndarray, features: np.ndarray, mask: np.ndarray,
+                     min_shared: int = MIN_SHARED_RATIOS) -> np.ndarray:
+    """
+    Root-mean-square difference over the ratios both sides report, for every (query, company)
+    pair, as three matrix products instead of a loop. Pairs sharing fewer than `min_shared`
+    ratios are infinitely far apart.
+    """
+    squared = ((query ** 2) @ mask.T + query_mask @ (features ** 2).T - 2.0 * query @ features.T)
+    shared = query_mask @ mask.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        distances = np.sqrt(np.maximum(squared, 0.0) / shared)
+    distances[shared < min_shared] = np.inf
+    return distances
+
+
+def _nearest(distances: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Column positions and distances of the k smallest entries of each row, nearest first.
+    """
+    k = min(k, distances.shape[1])
+    if k == 0:
+        return np.zeros((distances.shape[0], 0), dtype=np.int64), np.zeros((distances.shape[0], 0))
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    part_distances = np.take_along_axis(distances, part, axis=1)
+    order = np.argsort(part_distances, axis=1, kind='stable')
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_distances, order, axis=1)
+
+
+class PeerIndex:
+    """
+    Nearest-neighbour index over the standardized latest-period ratio profiles of one
+    snapshot, built once per snapshot next to the sector statistics.
+
+    The `neighbours` nearest companies of every company, market-wide and within its
+    sector, are precomputed with blocked matrix products, so a default query is a table
+    lookup. Queries on a chosen subset of ratios or on another period standardize just
+    those columns and scan the candidates in one vectorized pass.
+    """
+    def __init__(self, store: RatioStore, neighbours: int = MAX_NEIGHBOURS):
+        self.store = store
+        self.neighbours = neighbours
+        self.features, self.mask = standardize(store.latest)
+        self.sector_rows = {code: np.nonzero(store.sector_codes == code)[0]
+                            for code in range(len(store.sector_names))}
+        self.market_table = self._table(np.arange(len(store.tickers)))
+        self.sector_table = [None] * len(store.tickers)
+        for rows in self.sector_rows.values():
+            positions, distances = self._table(rows)
+            for i, row in enumerate(rows):
+                self.sector_table[row] = (positions[i], distances[i])
+
+    def _table(self, rows: np.ndarray):
+        """
+        Precomputes each row's nearest neighbours among `rows` (global row numbers).
+        """
+        k = min(self.neighbours, max(len(rows) - 1, 0))
+        positions = np.zeros((len(rows), k), dtype=np.int64)
+        distances = np.zeros((len(rows), k))
+        features, mask = self.features[rows], self.mask[rows]
+        for start in range(0, len(rows), BLOCK_ROWS):
+            block = slice(start, start + BLOCK_ROWS)
+            d = masked_distances(features[block], mask[block], features, mask)
+            d[np.arange(d.shape[0]), np.arange(start, start + d.shape[0])] = np.inf  # Never your own peer
+            nearest, nearest_d = _nearest(d, k)
+            positions[block], distances[block] = rows[nearest], nearest_d
+        return positions, distances
+
+    def query(self, ticker: str, k: int = 5, same_sector: bool = False, ratios: Optional[Sequence[str]] = None,
+              period: Optional[str] = None) -> List[Tuple[int, float]]:
+        """
+        Returns up to k (row, distance) pairs for the companies closest to `ticker`, nearest first.
+        `ratios` ('category.name' or bare names) and `period` pick the profile compared;
+        by default every ratio in each company's latest period. Raises KeyError for an unknown
+        ticker, ratio or period.
+        """
+        row = self.store.ticker_index[ticker]
+        if not ratios and period in (None, '', 'latest') and k <= self.neighbours:
+            if same_sector:
+                positions, distances = self.sector_table[row]
+            else:
+                positions, distances = self.market_table[0][row], self.market_table[1][row]
+            return [(int(p), float(d)) for p, d in zip(positions[:k], distances[:k]) if np.isfinite(d)]
+
+        columns = [self.store.ratio_position(r) for r in ratios] if ratios else list(range(len(self.store.ratio_keys)))
+        features, mask = standardize(self.store.period_matrix(period)[:, columns])
+        if same_sector:
+            candidates = self.sector_rows[int(self.store.sector_codes[row])]
+        else:
+            candidates = np.arange(len(self.store.tickers))
+        # With a few chosen ratios, require only as many shared ones as the company itself reports
+        min_shared = max(1, min(MIN_SHARED_RATIOS, int(mask[row].sum())))
+        distances = masked_distances(features[row:row + 1], mask[row:row + 1], features[candidates],
+                                     mask[candidates], min_shared)[0]
+        distances[candidates == row] = np.inf
+        nearest, nearest_d = _nearest(distances[None, :], k)
+        return [(int(candidates[p]), float(d)) for p, d in zip(nearest[0], nearest_d[0]) if np.isfinite(d)]
+
+    def profile(self, row: int, ratios: Optional[Sequence[str]] = None, period: Optional[str] = None) -> Dict:
+        """
+        The raw ratio values a comparison used for one company, {ratio key: value}.
+        """
+        columns = [self.store.ratio_position(r) for r in ratios] if ratios else range(len(self.store.ratio_keys))
+        values = self.store.period_matrix(period)[row]
+        return {self.store.ratio_keys[c]: float(values[c]) for c in columns if not np.isnan(values[c])}
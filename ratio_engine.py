@@ -0,0 +1,486 @@
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ratio_series import GRANULARITIES, MAX_PERIODS, SERIES, TTM_WINDOW, build_trends
+
+logger = logging.getLogger(__name__)
+
+# Ratio categories in the order they appear in every ratios dict
+CATEGORIES = ('liquidity', 'profitability', 'leverage', 'activity')
+
+# Canonical line items: name -> (statement, lower-case aliases in priority order).
+# The first alias present in a statement's index wins, matching the old per-period lookups.
+LINE_ITEMS = {
+    'total_assets': ('balance_sheet', ['total assets', 'total asset']),
+    'total_equity': ('balance_sheet', ['stockholders equity', 'common stock equity', 'total equity gross minority interest']),
+    'total_liabilities': ('balance_sheet', ['total liabilities net minority interest', 'total liabilities']),
+    'current_assets': ('balance_sheet', ['current assets', 'total current assets']),
+    'current_liabilities': ('balance_sheet', ['current liabilities', 'total current liabilities']),
+    'inventory': ('balance_sheet', ['inventory']),
+    'cash': ('balance_sheet', ['cash and cash equivalents', 'cash']),
+    'deposits': ('balance_sheet', ['total deposits', 'customer deposits']),
+    'net_loans': ('balance_sheet', ['net loans', 'loans']),
+    'net_income': ('financials', ['net income from continuing operation net minority interest', 'net income']),
+    'revenue': ('financials', ['total revenue', 'revenue']),
+    'gross_profit': ('financials', ['gross profit']),
+    'net_interest_income': ('financials', ['net interest income']),
+}
+
+# Items another item falls back on when it is not reported (total liabilities = assets - equity)
+ITEM_DEPENDENCIES = {
+    'total_liabilities': ('total_assets', 'total_equity'),
+}
+
+# Annual statements in the order they are read; the first one required supplies the periods
+STATEMENTS = ('balance_sheet', 'financials', 'cashflow')
+# The quarterly statement each annual one maps to for the quarterly and TTM series
+QUARTERLY_STATEMENTS = {
+    'balance_sheet': 'quarterly_balance_sheet',
+    'financials': 'quarterly_financials',
+    'cashflow': 'quarterly_cashflow',
+}
+# Statements reporting point-in-time balances; the others report flows, which TTM sums over 4 quarters
+STOCK_STATEMENTS = ('balance_sheet',)
+
+BANK_SECTORS = ('Banking',)
+
+# Collects the positions where safe_div hit a zero denominator while one ratio is evaluated
+_zero_denominators = threading.local()
+
+
+def register_line_item(name: str, statement: str, aliases: List[str]):
+    """
+    Adds (or redefines) a canonical line item that ratios can declare as an input.
+    """
+    if statement not in STATEMENTS:
+        raise ValueError(f"Unknown statement '{statement}' for line item '{name}'")
+    LINE_ITEMS[name] = (statement, [alias.lower() for alias in aliases])
+
+
+def safe_div(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Element-wise division that yields 0 wherever the denominator is 0.
+    NaN inputs propagate, as they did with the scalar formulas.
+    Inside compute_ratio_frame, the zero-denominator positions are also recorded so
+    that they can be reported as the integer 0 the scalar formulas returned.
+    """
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    defined = denominator != 0
+    np.divide(numerator, denominator, out=out, where=defined)
+    mask = getattr(_zero_denominators, 'mask', None)
+    if mask is not None:
+        _zero_denominators.mask = mask | ~defined
+    return out
+
+
+def _pct(numerator, denominator):
+    return safe_div(numerator, denominator) * 100
+
+
+class Ratio:
+    """
+    One ratio definition: its category and name, the canonical line items it reads, a
+    formula over those items' arrays and the sectors it applies to. `sectors` limits it to
+    those sectors and `exclude_sectors` leaves some out; with neither it applies everywhere.
+    """
+    def __init__(self, category: str, name: str, inputs: Sequence[str], formula: Callable[[Dict], np.ndarray],
+                 sectors: Sequence[str] = (), exclude_sectors: Sequence[str] = ()):
+        if category not in CATEGORIES:
+            raise ValueError(f"Unknown category '{category}' for ratio '{name}'")
+        unknown = [item for item in inputs if item not in LINE_ITEMS]
+        if unknown:
+            raise ValueError(f"Ratio '{name}' uses unknown line items: {', '.join(unknown)}")
+        self.category = category
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.formula = formula
+        self.sectors = frozenset(sectors)
+        self.exclude_sectors = frozenset(exclude_sectors)
+
+    @property
+    def key(self) -> str:
+        return f"{self.category}.{self.name}"
+
+    def applies_to(self, sector: str) -> bool:
+        if self.sectors and sector not in self.sectors:
+            return False
+        return sector not in self.exclude_sectors
+
+    def evaluate(self, values: Dict[str, np.ndarray]) -> np.ndarray:
+        # Only the declared inputs are visible, so an undeclared one fails loudly instead of being fetched by luck
+        return self.formula({item: values[item] for item in self.inputs})
+
+
+# Every known ratio, in output order within each category
+RATIOS: List[Ratio] = []
+
+
+def register_ratio(category: str, name: str, inputs: Sequence[str], formula: Callable[[Dict], np.ndarray],
+                   sectors: Sequence[str] = (), exclude_sectors: Sequence[str] = ()) -> Ratio:
+    """
+    Adds a ratio to the registry. The statements it needs are fetched automatically.
+    """
+    ratio = Ratio(category, name, inputs, formula, sectors, exclude_sectors)
+    if any(existing.key == ratio.key for existing in RATIOS):
+        raise ValueError(f"Ratio '{ratio.key}' is already registered")
+    RATIOS.append(ratio)
+    return ratio
+
+
+# For banks, "Current Ratio" isn't standard, so Loan-to-Deposit Ratio stands in as the liquidity measure
+register_ratio('liquidity', 'loanToDepositRatio', ['net_loans', 'deposits'],
+               lambda v: safe_div(v['net_loans'], v['deposits']), sectors=BANK_SECTORS)
+register_ratio('liquidity', 'currentRatio', ['current_assets', 'current_liabilities'],
+               lambda v: safe_div(v['current_assets'], v['current_liabilities']), exclude_sectors=BANK_SECTORS)
+register_ratio('liquidity', 'quickRatio', ['current_assets', 'inventory', 'current_liabilities'],
+               lambda v: safe_div(v['current_assets'] - v['inventory'], v['current_liabilities']),
+               exclude_sectors=BANK_SECTORS)
+register_ratio('liquidity', 'cashRatio', ['cash', 'current_liabilities'],
+               lambda v: safe_div(v['cash'], v['current_liabilities']), exclude_sectors=BANK_SECTORS)
+register_ratio('profitability', 'roe', ['net_income', 'total_equity'],
+               lambda v: _pct(v['net_income'], v['total_equity']))
+register_ratio('profitability', 'roa', ['net_income', 'total_assets'],
+               lambda v: _pct(v['net_income'], v['total_assets']))
+register_ratio('profitability', 'nim', ['net_interest_income', 'total_assets'],  # Net Interest Margin
+               lambda v: _pct(v['net_interest_income'], v['total_assets']), sectors=BANK_SECTORS)
+register_ratio('profitability', 'npm', ['net_income', 'revenue'],
+               lambda v: _pct(v['net_income'], v['revenue']), exclude_sectors=BANK_SECTORS)
+register_ratio('profitability', 'gpm', ['gross_profit', 'revenue'],
+               lambda v: _pct(v['gross_profit'], v['revenue']), exclude_sectors=BANK_SECTORS)
+register_ratio('leverage', 'equityMultiplier', ['total_assets', 'total_equity'],
+               lambda v: safe_div(v['total_assets'], v['total_equity']), sectors=BANK_SECTORS)
+register_ratio('leverage', 'debtToAssets', ['total_liabilities', 'total_assets'],
+               lambda v: safe_div(v['total_liabilities'], v['total_assets']), sectors=BANK_SECTORS)
+register_ratio('leverage', 'der', ['total_liabilities', 'total_equity'],
+               lambda v: safe_div(v['total_liabilities'], v['total_equity']), exclude_sectors=BANK_SECTORS)
+register_ratio('leverage', 'dar', ['total_liabilities', 'total_assets'],
+               lambda v: safe_div(v['total_liabilities'], v['total_assets']), exclude_sectors=BANK_SECTORS)
+register_ratio('activity', 'assetTurnover', ['revenue', 'total_assets'],
+               lambda v: safe_div(v['revenue'], v['total_assets']), exclude_sectors=BANK_SECTORS)
+
+
+def select_ratios(names: Optional[Sequence[str]] = None) -> List[Ratio]:
+    """
+    Returns the registered ratios matching `names` ('category.name' or bare name), or all of them.
+    """
+    if not names:
+        return list(RATIOS)
+    wanted = set(names)
+    selected = [ratio for ratio in RATIOS if ratio.key in wanted or ratio.name in wanted]
+    matched = {ratio.key for ratio in selected} | {ratio.name for ratio in selected}
+    unknown = wanted - matched
+    if unknown:
+        raise ValueError(f"Unknown ratios: {', '.join(sorted(unknown))}")
+    return selected
+
+
+def required_items(ratios: Optional[Sequence[Ratio]] = None) -> List[str]:
+    """
+    Canonical line items the given ratios read, including fallback dependencies, in LINE_ITEMS order.
+    """
+    needed = set()
+    for ratio in RATIOS if ratios is None else ratios:
+        for item in ratio.inputs:
+            needed.add(item)
+            needed.update(ITEM_DEPENDENCIES.get(item, ()))
+    return [item for item in LINE_ITEMS if item in needed]
+
+
+def _source_statement(statement: str, granularity: str) -> str:
+    return statement if granularity == 'annual' else QUARTERLY_STATEMENTS[statement]
+
+
+def required_statements(ratios: Optional[Sequence[Ratio]] = None,
+                        granularities: Sequence[str] = ('annual',)) -> Tuple[str, ...]:
+    """
+    Statements that must be fetched to compute the given ratios for the given series
+    (annual statements first, then their quarterly counterparts).
+    """
+    needed = [statement for statement in STATEMENTS
+              if any(LINE_ITEMS[item][0] == statement for item in required_items(ratios))]
+    result = []
+    for granularity in granularities:
+        for statement in needed:
+            source = _source_statement(statement, granularity)
+            if source not in result:
+                result.append(source)
+    return tuple(result)
+
+
+def period_label(period, granularity: str = 'annual') -> str:
+    """
+    Returns the key a statement column is stored under in ratios_by_period:
+    '2024' for annual periods, '2024Q3' for quarterly and TTM periods.
+    """
+    if granularity != 'annual' and hasattr(period, 'quarter'):
+        return f"{period.year}Q{period.quarter}"
+    return str(period.year) if hasattr(period, 'year') else str(period)
+
+
+def _to_float(block: pd.DataFrame) -> np.ndarray:
+    try:
+        return block.to_numpy(dtype=float, na_value=np.nan)
+    except (TypeError, ValueError):
+        return block.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def trailing_sum(df: pd.DataFrame, window: int = TTM_WINDOW) -> pd.DataFrame:
+    """
+    Sums a quarterly flow statement over rolling `window`-quarter windows in one vectorized pass.
+    Returns the same layout (items x period ends, newest first) holding only the quarter ends
+    that have `window` consecutive quarters behind them; a missing value makes its sum NaN.
+    """
+    try:
+        ends = pd.DatetimeIndex(df.columns)
+    except (TypeError, ValueError):
+        return df.iloc[:, :0]
+    order = np.argsort(ends)
+    if len(order) < window:
+        return df.iloc[:, :0]
+
+    values = _to_float(df.iloc[:, order])
+    sums = np.lib.stride_tricks.sliding_window_view(values, window, axis=1).sum(axis=-1)
+    chronological = ends[order]
+    window_ends, window_starts = chronological[window - 1:], chronological[:len(chronological) - window + 1]
+    # Consecutive quarters put the first and last quarter end of a window about (window - 1) * 91 days apart
+    span = (window_ends - window_starts).days.to_numpy()
+    consecutive = np.abs(span - (window - 1) * 91.3) <= 20
+    ttm = pd.DataFrame(sums[:, consecutive], index=df.index, columns=df.columns[order][window - 1:][consecutive])
+    return ttm.iloc[:, ::-1]
+
+
+def _item_positions(df: pd.DataFrame, items: List[str]) -> List[Optional[int]]:
+    """
+    Resolves each canonical item to a row position in `df` (None when no alias is present).
+    """
+    lower_index = {str(idx).lower(): pos for pos, idx in enumerate(df.index)}
+    positions = []
+    for item in items:
+        aliases = LINE_ITEMS[item][1]
+        positions.append(next((lower_index[a] for a in aliases if a in lower_index), None))
+    return positions
+
+
+def _statement_block(df: pd.DataFrame, positions: List[int], periods) -> np.ndarray:
+    """
+    Extracts the given rows of a statement as a float array with one column per period.
+    Periods the statement does not report come back as NaN.
+    """
+    block = df.iloc[positions]
+    col_idx = df.columns.get_indexer(periods)
+    values = _to_float(block)
+    out = np.full((len(positions), len(periods)), np.nan)
+    present = col_idx >= 0
+    out[:, present] = values[:, col_idx[present]]
+    return out
+
+
+def _align_values(financial_data: Dict, max_periods: int, items: Sequence[str], granularity: str = 'annual'):
+    """
+    Returns (values, periods) for one company's statements at `granularity`, where values is a
+    (canonical item, period) float array, or None when a statement the items come from is
+    missing or empty. Items with no matching alias are 0.
+    Quarterly and TTM series read the quarterly statements; TTM replaces every flow with its
+    trailing four-quarter sum and keeps only quarters where that sum exists, while balances
+    stay point-in-time.
+    """
+    statements = [name for name in STATEMENTS if any(LINE_ITEMS[item][0] == name for item in items)]
+    frames = [financial_data.get(_source_statement(name, granularity)) for name in statements]
+    if not frames or any(df is None or df.empty for df in frames):
+        return None
+
+    periods = frames[0].columns
+    if granularity == 'ttm':
+        frames = [df if name in STOCK_STATEMENTS else trailing_sum(df) for name, df in zip(statements, frames)]
+        for name, df in zip(statements, frames):
+            if name not in STOCK_STATEMENTS:
+                periods = periods[periods.isin(df.columns)]
+        if len(periods) == 0:
+            return None
+    periods = periods[:max_periods]
+
+    values = np.zeros((len(items), len(periods)))
+    for name, df in zip(statements, frames):
+        rows = [i for i, item in enumerate(items) if LINE_ITEMS[item][0] == name]
+        positions = _item_positions(df, [items[i] for i in rows])
+        found = [(row, pos) for row, pos in zip(rows, positions) if pos is not None]
+        if found:
+            values[[row for row, _ in found]] = _statement_block(df, [pos for _, pos in found], periods)
+    return values, periods
+
+
+def align_statements(financial_data: Dict, max_periods: int = MAX_PERIODS,
+                     items: Optional[Sequence[str]] = None, granularity: str = 'annual') -> Optional[pd.DataFrame]:
+    """
+    Aligns one company's statements to the canonical line items in a single pass.
+    Returns a frame indexed by canonical item (every item unless `items` is given) with one
+    column per period (newest first), or None when the statements are missing or empty.
+    """
+    items = list(items or LINE_ITEMS)
+    aligned = _align_values(financial_data, max_periods, items, granularity)
+    if aligned is None:
+        return None
+    values, periods = aligned
+    return pd.DataFrame(values, index=items, columns=periods)
+
+
+def stack_statements(statements: Dict[str, Dict], max_periods: int = MAX_PERIODS,
+                     items: Optional[Sequence[str]] = None, granularity: str = 'annual') -> pd.DataFrame:
+    """
+    Aligns a batch of tickers and stacks them into one frame whose columns are a
+    (ticker, period) MultiIndex. Tickers without usable statements are left out, and so is
+    a ticker whose statements cannot be aligned (logged), so it never costs the others.
+    """
+    items = list(items or LINE_ITEMS)
+    blocks, columns = [], []
+    for ticker, financial_data in statements.items():
+        try:
+            aligned = _align_values(financial_data or {}, max_periods, items, granularity)
+        except Exception as e:
+            logger.error(f"Error aligning the {granularity} statements of {ticker}, skipping it: {e}", exc_info=True)
+            continue
+        if aligned is None:
+            if granularity == 'annual':
+                logger.warning(f"Annual financial data is missing or empty for {ticker}. Skipping ratio calculation.")
+            else:
+                logger.info(f"No usable quarterly data for the {granularity} series of {ticker}.")
+            continue
+        values, periods = aligned
+        blocks.append(values)
+        columns.extend((ticker, period) for period in periods)
+
+    values = np.hstack(blocks) if blocks else np.zeros((len(items), 0))
+    return pd.DataFrame(values, index=items,
+                        columns=pd.MultiIndex.from_tuples(columns, names=['ticker', 'period']))
+
+
+def compute_ratio_frame(items: pd.DataFrame,
+                        ratios: Optional[Sequence[Ratio]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluates every ratio over all columns of a stacked item frame at once, regardless of
+    sector. Returns a (ratio, column) array rounded to 2 decimals and a boolean array of
+    the same shape marking the values that came from a zero denominator.
+    """
+    ratios = RATIOS if ratios is None else ratios
+    v = {item: items.loc[item].to_numpy(dtype=float) for item in items.index}
+
+    # Fall back to assets - equity when no liabilities line item was reported
+    if all(item in v for item in ('total_liabilities',) + ITEM_DEPENDENCIES['total_liabilities']):
+        v['total_liabilities'] = np.where(
+            (v['total_liabilities'] == 0) & (v['total_assets'] > 0) & (v['total_equity'] > 0),
+            v['total_assets'] - v['total_equity'],
+            v['total_liabilities'],
+        )
+
+    matrix = np.empty((len(ratios), items.shape[1]))
+    undefined = np.zeros(matrix.shape, dtype=bool)
+    try:
+        for i, ratio in enumerate(ratios):
+            _zero_denominators.mask = False
+            matrix[i] = ratio.evaluate(v)
+            undefined[i] = _zero_denominators.mask
+    finally:
+        _zero_denominators.mask = None
+    return np.round(matrix, 2), undefined
+
+
+def build_company_record(ticker: str, info: Dict, series: Dict) -> Dict:
+    """
+    Formats a ticker's ratio series ({series field: ratios_by_period}) into the company
+    record served by the API: the latest annual ratios and their trends up front, then
+    every series. Returns {} when there are no annual ratios.
+    """
+    ratios_by_period = series.get('all_periods', {})
+    if not ratios_by_period:
+        logger.warning(f"Could not calculate any ratios for {ticker}. Final data will be empty.")
+        return {}
+
+    # Get latest period data
+    sorted_periods = sorted(ratios_by_period.keys(), reverse=True)
+    latest_period = sorted_periods[0] if sorted_periods else "N/A"
+    latest_ratios = ratios_by_period.get(latest_period, {})
+
+    # Create trend data for charts (last 4 periods)
+    trends = build_trends(ratios_by_period, latest_ratios)
+
+    return {
+        'ticker': ticker,
+        'name': info.get('name', ticker),
+        'sector': info.get('sector', 'Unknown'),
+        'latest_period': latest_period,
+        'ratios': latest_ratios,
+        'trends': trends,
+        'all_periods': ratios_by_period,
+        **{field: values for field, values in series.items() if field != 'all_periods'}
+    }
+
+
+def calculate_series(statements: Dict[str, Dict], sectors: Dict[str, str],
+                     ratios: Optional[Sequence[Ratio]] = None,
+                     granularities: Sequence[str] = GRANULARITIES) -> Dict[str, Dict]:
+    """
+    Computes every requested series for many tickers.
+    Returns {ticker: {series field: ratios_by_period}}, e.g. 'all_periods' and 'ttm_periods'.
+    When a series fails for the batch it is computed ticker by ticker, so only the tickers it
+    fails for (logged) are left with that series empty.
+    """
+    result = {ticker: {} for ticker in statements}
+    for granularity in granularities:
+        field = SERIES[granularity][0]
+        try:
+            series = calculate_ratios_batch(statements, sectors, ratios=ratios, granularity=granularity)
+        except Exception as e:
+            logger.warning(f"Batch {granularity} ratio calculation failed ({e}); computing ticker by ticker")
+            series = {}
+            for ticker in statements:
+                try:
+                    series.update(calculate_ratios_batch({ticker: statements[ticker]}, sectors,
+                                                         ratios=ratios, granularity=granularity))
+                except Exception as e:
+                    logger.error(f"Error calculating {granularity} ratios for {ticker}: {e}", exc_info=True)
+        for ticker in result:
+            result[ticker][field] = series.get(ticker, {})
+    return result
+
+
+def calculate_ratios_batch(statements: Dict[str, Dict], sectors: Dict[str, str],
+                           max_periods: Optional[int] = None, ratios: Optional[Sequence[Ratio]] = None,
+                           granularity: str = 'annual') -> Dict[str, Dict]:
+    """
+    Computes ratios_by_period for many tickers in one vectorized pass.
+    `sectors` maps each ticker to its sector, which decides the ratios that apply to it, and
+    `granularity` picks the annual, quarterly or trailing-twelve-month series.
+    Returns {ticker: {period: {category: {ratio: value}}}}, the same shape the
+    per-ticker calculation has always produced; tickers without data map to {}.
+    Quarterly flow ratios (ROE, margins, turnover) cover a single quarter and are not annualized.
+    """
+    if granularity not in SERIES:
+        raise ValueError(f"Unknown granularity '{granularity}'")
+    ratios = RATIOS if ratios is None else list(ratios)
+    max_periods = SERIES[granularity][1] if max_periods is None else max_periods
+    result = {ticker: {} for ticker in statements}
+    items = stack_statements(statements, max_periods, required_items(ratios), granularity)
+    if items.shape[1] == 0:
+        return result
+
+    matrix, undefined = compute_ratio_frame(items, ratios)
+    values = matrix.tolist()
+    for row, col in zip(*np.nonzero(undefined)):
+        values[row][col] = 0  # An int, as the per-ticker formulas returned for a zero denominator
+    applicable = {}
+    for col, (ticker, period) in enumerate(items.columns):
+        sector = sectors.get(ticker, 'Unknown')
+        if sector not in applicable:
+            applicable[sector] = [(row, ratio.category, ratio.name) for row, ratio in enumerate(ratios)
+                                  if ratio.applies_to(sector)]
+        period_ratios = {category: {} for category in CATEGORIES}
+        for row, category, name in applicable[sector]:
+            period_ratios[category][name] = values[row][col]
+        result[ticker][period_label(period, granularity)] = period_ratios
+    return result
@@ -0,0 +1,168 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import ratio_engine
+
+logger = logging.getLogger(__name__)
+
+# Below this many tickers the vectorized engine is faster in-process than a round trip to the pool
+# (packing, pickling the records back and per-chunk overhead); at 120 tickers the pool was still slower
+MIN_POOL_BATCH = 500
+# Chunks per process, so a slow chunk does not leave the other processes idle at the end
+CHUNKS_PER_PROCESS = 4
+
+
+def pack_statements(statements: Dict[str, Dict], statement_types: Sequence[str]):
+    """
+    Copies the float values of every statement DataFrame into one shared memory segment.
+    Returns (segment, manifest): manifest maps ticker -> {statement: (offset, shape, index, columns)},
+    which is all a worker needs besides the segment to rebuild the frames without copying.
+    """
+    blocks, manifest, size = [], {}, 0
+    for ticker, financial_data in statements.items():
+        entry = manifest[ticker] = {}
+        for key in statement_types:
+            df = (financial_data or {}).get(key)
+            if not isinstance(df, pd.DataFrame):
+                continue
+            values = ratio_engine._to_float(df)
+            entry[key] = (size, values.shape, df.index, df.columns)
+            blocks.append((size, values))
+            size += values.nbytes
+
+    segment = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    try:
+        for offset, values in blocks:
+            np.ndarray(values.shape, dtype=np.float64, buffer=segment.buf, offset=offset)[...] = values
+    except Exception:
+        segment.close()
+        segment.unlink()
+        raise
+    return segment, manifest
+
+
+def unpack_statements(buffer, manifest: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Rebuilds {ticker: {statement: DataFrame}} as read-only views over a packed buffer.
+    """
+    statements = {}
+    for ticker, entry in manifest.items():
+        statements[ticker] = {}
+        for key, (offset, shape, index, columns) in entry.items():
+            values = np.ndarray(shape, dtype=np.float64, buffer=buffer, offset=offset)
+            values.flags.writeable = False
+            statements[ticker][key] = pd.DataFrame(values, index=index, columns=columns, copy=False)
+    return statements
+
+
+def compute_records(statements: Dict[str, Dict], companies: Dict[str, Dict], ratio_keys: List[str],
+                    granularities: Sequence[str]) -> Dict[str, Dict]:
+    """
+    Computes {ticker: company record} in this process; `companies` maps every ticker to its name and sector.
+    """
+    sectors = {ticker: companies[ticker].get('sector', 'Unknown') for ticker in statements}
+    series = ratio_engine.calculate_series(statements, sectors, ratio_engine.select_ratios(ratio_keys), granularities)
+    return {ticker: ratio_engine.build_company_record(ticker, companies[ticker], series[ticker])
+            for ticker in statements}
+
+
+# Ratios a worker can look up: workers import ratio_engine afresh, so only those registered at import exist there
+WORKER_RATIOS = frozenset(ratio.key for ratio in ratio_engine.RATIOS)
+
+
+def _compute_chunk(segment_name: str, manifest: Dict[str, Dict], companies: Dict[str, Dict],
+                   ratio_keys: List[str], granularities: Sequence[str]) -> Dict[str, Dict]:
+    """
+    Pool task: computes the company records of one chunk of tickers from the shared segment.
+    Only the plain-Python records travel back to the parent.
+    """
+    # Workers share the parent's resource tracker, so attaching does not take ownership of the segment
+    segment = shared_memory.SharedMemory(name=segment_name)
+    try:
+        # The frames are views over the segment and must be gone before it is closed
+        return compute_records(unpack_statements(segment.buf, manifest), companies, ratio_keys, granularities)
+    finally:
+        segment.close()
+
+
+class RatioComputePool:
+    """
+    Computes company records (ratio series and trends) on a pool of worker processes,
+    so a large refresh uses every core and leaves the serving process's GIL alone.
+
+    Statements are packed once into a shared memory segment per batch and each
+    process reads its chunk of tickers straight from it instead of unpickling
+    DataFrames. Batches smaller than `min_batch` tickers, a pool of fewer than two
+    processes and ratios registered at runtime are computed in-process, and so is a
+    batch the pool fails on for any reason. The pool starts on first use.
+    """
+    def __init__(self, processes: Optional[int] = None, min_batch: int = MIN_POOL_BATCH):
+        self.processes = (os.cpu_count() or 1) if processes is None else max(0, int(processes))
+        self.min_batch = min_batch
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.processes > 1
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Start workers from a clean server process rather than forking a threaded API server
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                context = multiprocessing.get_context(method)
+                if method == 'forkserver':
+                    context.set_forkserver_preload(['ratio_engine', 'ratio_pool'])
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            return self._executor
+
+    def _chunks(self, tickers: List[str]) -> List[List[str]]:
+        size = max(1, -(-len(tickers) // (self.processes * CHUNKS_PER_PROCESS)))
+        return [tickers[i:i + size] for i in range(0, len(tickers), size)]
+
+    def compute(self, statements: Dict[str, Dict], companies: Dict[str, Dict], ratio_keys: List[str],
+                granularities: Sequence[str], statement_types: Sequence[str]) -> Dict[str, Dict]:
+        """
+        Returns {ticker: company record} for every ticker in `statements` ({} where no
+        ratios could be computed). `companies` supplies each ticker's name and sector and
+        `ratio_keys` the ratios, by key, so that they can be looked up in the workers; a
+        batch with ratios the workers do not know (WORKER_RATIOS) stays in-process.
+        """
+        companies = {t: companies.get(t, {'name': t, 'sector': 'Unknown'}) for t in statements}
+        if not self.enabled or len(statements) < self.min_batch or not WORKER_RATIOS.issuperset(ratio_keys):
+            return compute_records(statements, companies, ratio_keys, granularities)
+
+        segment, manifest = pack_statements(statements, statement_types)
+        try:
+            executor = self._get_executor()
+            futures = [executor.submit(_compute_chunk, segment.name, {t: manifest[t] for t in chunk},
+                                       {t: companies[t] for t in chunk}, ratio_keys, list(granularities))
+                       for chunk in self._chunks(list(statements))]
+            records = {}
+            for future in futures:
+                records.update(future.result())
+            return records
+        except Exception as e:
+            logger.error(f"Ratio compute pool failed ({e!r}); computing {len(statements)} tickers in-process")
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+            return compute_records(statements, companies, ratio_keys, granularities)
+        finally:
+            segment.close()
+            segment.unlink()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
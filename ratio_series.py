@@ -0,0 +1,33 @@
+from typing import Dict
+
+# Number of most recent annual periods ratios are computed for
+MAX_PERIODS = 4
+# Number of most recent quarters the quarterly and trailing-twelve-month series keep
+MAX_QUARTERS = 8
+# Quarters summed for a trailing-twelve-month flow
+TTM_WINDOW = 4
+
+# Ratio series by granularity: company field the series is stored in and periods kept
+SERIES = {
+    'annual': ('all_periods', MAX_PERIODS),
+    'quarterly': ('quarterly_periods', MAX_QUARTERS),
+    'ttm': ('ttm_periods', MAX_QUARTERS),
+}
+GRANULARITIES = tuple(SERIES)
+
+
+def build_trends(ratios_by_period: Dict, latest_ratios: Dict, length: int = 4) -> Dict:
+    """
+    Builds the chart series for every ratio in `latest_ratios` over the last `length` periods.
+    """
+    trends = {}
+    sorted_periods = sorted(ratios_by_period.keys())
+    for category, ratio_dict in latest_ratios.items():
+        for ratio_name in ratio_dict.keys():
+            trend_data = []
+            for period in sorted_periods:
+                value = ratios_by_period.get(period, {}).get(category, {}).get(ratio_name)
+                if value is not None:
+                    trend_data.append({'period': period, 'value': value})
+            trends[f"{category}_{ratio_name}"] = trend_data[-length:]
+    return trends
@@ -0,0 +1,169 @@
+import operator
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Comparison operators accepted in screen filters, longest first so '>=' wins over '>'
+FILTER_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '<': operator.lt,
+    '=': operator.eq,
+}
+FILTER_PATTERN = re.compile(r'^\s*([A-Za-z_][\w.]*)\s*(>=|<=|!=|>|<|=)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+
+def parse_filter(expression: str) -> Optional[Tuple[str, str, float]]:
+    """
+    Parses a filter such as 'roe>15' into ('roe', '>', 15.0); returns None if it is not one.
+    """
+    match = FILTER_PATTERN.match(expression)
+    if not match:
+        return None
+    return match.group(1), match.group(2), float(match.group(3))
+
+
+class RatioStore:
+    """
+    Columnar view of one snapshot, built once per refresh.
+    `values` is a ticker x ratio x period matrix (NaN where a company does not report a
+    ratio for a period) and `latest` holds each company's ratios for its own latest period.
+    Ratios are keyed as 'category.name'; a bare name like 'roe' works when it is unambiguous.
+    """
+    def __init__(self, tickers: List[str], names: List[str], sectors: List[str], latest_periods: List[str],
+                 ratio_keys: List[str], periods: List[str], values: np.ndarray):
+        self.tickers = tickers
+        self.names = names
+        self.sectors = sectors
+        self.latest_periods = latest_periods
+        self.ratio_keys = ratio_keys
+        self.periods = periods
+        self.values = values
+
+        self.ticker_index = {ticker: i for i, ticker in enumerate(tickers)}
+        self.period_index = {period: i for i, period in enumerate(periods)}
+        self.sector_names = sorted(set(sectors))
+        sector_lookup = {sector: code for code, sector in enumerate(self.sector_names)}
+        self.sector_codes = np.array([sector_lookup[s] for s in sectors], dtype=np.int32)
+
+        self._ratio_lookup = {key: i for i, key in enumerate(ratio_keys)}
+        bare_names = [key.split('.', 1)[1] for key in ratio_keys]
+        for i, name in enumerate(bare_names):
+            if bare_names.count(name) == 1:
+                self._ratio_lookup[name] = i
+
+        latest_idx = np.array([self.period_index.get(p, -1) for p in latest_periods], dtype=np.int64)
+        self.latest = np.full((len(tickers), len(ratio_keys)), np.nan)
+        has_latest = latest_idx >= 0
+        if has_latest.any():
+            rows = np.nonzero(has_latest)[0]
+            self.latest[rows] = values[rows, :, latest_idx[has_latest]]
+
+    @classmethod
+    def from_snapshot(cls, data: Dict) -> "RatioStore":
+        """
+        Builds the store from a snapshot's {ticker: company_data} dict.
+        """
+        tickers = list(data)
+        ratio_keys, periods = [], set()
+        seen = set()
+        for company in data.values():
+            for period, ratios in company.get('all_periods', {}).items():
+                periods.add(period)
+                for category, ratio_dict in ratios.items():
+                    for name in ratio_dict:
+                        key = f"{category}.{name}"
+                        if key not in seen:
+                            seen.add(key)
+                            ratio_keys.append(key)
+        periods = sorted(periods)
+
+        ratio_index = {key: i for i, key in enumerate(ratio_keys)}
+        period_index = {period: i for i, period in enumerate(periods)}
+        values = np.full((len(tickers), len(ratio_keys), len(periods)), np.nan)
+        for t, company in enumerate(data.values()):
+            for period, ratios in company.get('all_periods', {}).items():
+                p = period_index[period]
+                for category, ratio_dict in ratios.items():
+                    for name, value in ratio_dict.items():
+                        if value is not None:
+                            values[t, ratio_index[f"{category}.{name}"], p] = value
+
+        return cls(
+            tickers=tickers,
+            names=[company.get('name', '') for company in data.values()],
+            sectors=[company.get('sector', 'Unknown') for company in data.values()],
+            latest_periods=[company.get('latest_period', '') for company in data.values()],
+            ratio_keys=ratio_keys,
+            periods=periods,
+            values=values,
+        )
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def ratio_position(self, name: str) -> int:
+        """
+        Returns the column of a ratio given as 'category.name' or a bare unambiguous name.
+        """
+        try:
+            return self._ratio_lookup[name]
+        except KeyError:
+            raise KeyError(f"Unknown ratio '{name}'")
+
+    def period_matrix(self, period: Optional[str] = None) -> np.ndarray:
+        """
+        Returns the ticker x ratio matrix for one period, or for each company's latest period.
+        """
+        if period in (None, '', 'latest'):
+            return self.latest
+        if period not in self.period_index:
+            raise KeyError(f"Unknown period '{period}'")
+        return self.values[:, :, self.period_index[period]]
+
+    def sector_mask(self, sectors: Optional[Sequence[str]]) -> np.ndarray:
+        if not sectors:
+            return np.ones(len(self.tickers), dtype=bool)
+        wanted = {s.lower() for s in sectors}
+        codes = [code for code, name in enumerate(self.sector_names) if name.lower() in wanted]
+        return np.isin(self.sector_codes, codes)
+
+    def screen(self, filters: Sequence[Tuple[str, str, float]] = (), sectors: Optional[Sequence[str]] = None,
+               period: Optional[str] = None, sort: Optional[str] = None, descending: bool = False,
+               limit: Optional[int] = None) -> List[int]:
+        """
+        Returns the row positions of tickers matching every filter and sector, sorted and truncated.
+        All filtering is done with vectorized masks; NaN never matches and always sorts last.
+        """
+        matrix = self.period_matrix(period)
+        mask = self.sector_mask(sectors)
+        with np.errstate(invalid='ignore'):
+            for name, op, value in filters:
+                mask &= FILTER_OPERATORS[op](matrix[:, self.ratio_position(name)], value)
+        rows = np.nonzero(mask)[0]
+
+        if sort:
+            keys = matrix[rows, self.ratio_position(sort)]
+            keys = np.where(np.isnan(keys), np.inf, -keys if descending else keys)
+            if limit is not None and 0 < limit < len(rows):
+                top = np.argpartition(keys, limit - 1)[:limit]
+                rows = rows[top[np.argsort(keys[top], kind='stable')]]
+            else:
+                rows = rows[np.argsort(keys, kind='stable')]
+        if limit is not None:
+            rows = rows[:max(limit, 0)]
+        return rows.tolist()
+
+    def row_ratios(self, row: int, period: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Returns one ticker's non-missing ratios for a period, nested by category like the snapshot.
+        """
+        result: Dict[str, Dict[str, float]] = {}
+        for key, value in zip(self.ratio_keys, self.period_matrix(period)[row].tolist()):
+            if value == value:  # Skip NaN
+                category, name = key.split('.', 1)
+                result.setdefault(category, {})[name] = value
+        return result
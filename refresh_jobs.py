@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Options that change what a refresh does; two requests agreeing on all of them share one job
+WORK_OPTIONS = ('full', 'cache_only', 'tickers')
+
+
+def work_key(options: Dict) -> Tuple:
+    tickers = options.get('tickers')
+    return (bool(options.get('full')), bool(options.get('cache_only')),
+            tuple(sorted(tickers)) if tickers else None)
+
+
+class RefreshJob:
+    """
+    One refresh run. Status moves from 'queued' (waiting for the job before it) to
+    'running' and then to 'succeeded' or 'failed'.
+    """
+    def __init__(self, options: Dict, status: str = 'running'):
+        self.id = uuid.uuid4().hex[:12]
+        self.options = dict(options)
+        self.work = work_key(options)
+        self.status = status
+        self.progress = {'done': 0, 'total': 0}
+        self.created_at = time.time()
+        self.finished_at = None
+        self.result: Dict = {}
+        self.error = None
+        self._done = threading.Event()
+
+    def update_progress(self, done: int, total: int):
+        self.progress = {'done': done, 'total': total}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'options': self.options,
+            'progress': self.progress,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+class RefreshJobManager:
+    """
+    Runs refreshes as background jobs, one at a time. A trigger that asks for the same
+    work (WORK_OPTIONS) as the running job or a queued one joins that job instead of
+    scraping twice; any other trigger is queued to run after the jobs ahead of it, so
+    nobody is told a refresh finished that never ran with their options.
+    `run_refresh(options, job)` does the work and returns a small result dict.
+    """
+    def __init__(self, run_refresh: Callable[[Dict, RefreshJob], Dict], history: int = 20):
+        self._run_refresh = run_refresh
+        self._history = history
+        self._jobs: "OrderedDict[str, RefreshJob]" = OrderedDict()
+        self._current: Optional[RefreshJob] = None
+        self._queue: "deque[RefreshJob]" = deque()
+        self._lock = threading.Lock()
+
+    def submit(self, options: Optional[Dict] = None) -> Tuple[RefreshJob, bool]:
+        """
+        Starts a refresh job, queues it behind the running one, or returns the running or
+        queued job that already does the same work. Returns (job, created).
+        """
+        options = options or {}
+        key = work_key(options)
+        with self._lock:
+            for pending in ([self._current] if self._current is not None else []) + list(self._queue):
+                if pending.work == key:
+                    return pending, False
+            job = RefreshJob(options, status='queued' if self._current is not None else 'running')
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in ('queued', 'running'):
+                    break
+                self._jobs.popitem(last=False)
+            if self._current is not None:
+                self._queue.append(job)
+                return job, True
+            self._current = job
+
+        threading.Thread(target=self._run, args=(job,), name=f"refresh-{job.id}", daemon=True).start()
+        return job, True
+
+    def get(self, job_id: str) -> Optional[RefreshJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def current(self) -> Optional[RefreshJob]:
+        return self._current
+
+    def queued(self) -> List[RefreshJob]:
+        with self._lock:
+            return list(self._queue)
+
+    def _run(self, job: RefreshJob):
+        # Runs `job`, then every job queued behind it, on this thread
+        while job is not None:
+            job.status = 'running'
+            try:
+                job.result = self._run_refresh(job.options, job) or {}
+                job.status = 'succeeded'
+            except Exception as e:
+                logger.error(f"Refresh job {job.id} failed: {e}", exc_info=True)
+                job.error = str(e)
+                job.status = 'failed'
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._current = self._queue.popleft() if self._queue else None
+                    next_job = self._current
+                job._done.set()
+            job = next_job
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Statements that feed the fingerprint when they were fetched (the active ratios decide which are);
+# `info` carries live market fields and would change every fetch
+FINGERPRINT_STATEMENTS = ('financials', 'balance_sheet', 'cashflow',
+                          'quarterly_financials', 'quarterly_balance_sheet', 'quarterly_cashflow')
+# Quarterly statements that date the latest reported quarter, in order of preference
+QUARTERLY_PERIOD_STATEMENTS = ('quarterly_balance_sheet', 'quarterly_financials')
+# IDX issuers file quarterly reports within about a month and a half of the quarter end
+QUARTERLY_FILING_LAG = 45 * 86400
+
+
+def fingerprint_statements(financial_data: Dict) -> str:
+    """
+    Returns a content hash of a ticker's raw statements that is stable across fetches.
+    Statements that were not fetched are left out rather than hashed as empty.
+    """
+    digest = hashlib.sha256()
+    for name in FINGERPRINT_STATEMENTS:
+        if name not in financial_data:
+            continue
+        df = financial_data[name]
+        digest.update(name.encode())
+        if df is None or getattr(df, 'empty', True):
+            digest.update(b'<empty>')
+            continue
+        digest.update('|'.join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def latest_period_end(financial_data: Dict, statements=('balance_sheet',)) -> Optional[datetime]:
+    """
+    Returns the end date of the most recent period of the first of `statements` that has
+    data (by default the annual balance sheet), if known.
+    """
+    for name in statements:
+        df = financial_data.get(name)
+        if df is None or df.empty:
+            continue
+        period = df.columns[0]
+        return pd.Timestamp(period).to_pydatetime() if hasattr(period, 'year') else None
+    return None
+
+
+class RefreshPlanner:
+    """
+    Tracks per-ticker refresh state (latest fiscal period seen, statement fingerprint and
+    last fetch time) and decides which tickers are worth refetching on each cycle.
+
+    A ticker is due when it has never been fetched, when its data is older than `max_age`,
+    or when its next annual period has closed and the filing could be out, in which case it
+    is polled every `filing_poll_interval` until the new period shows up. The same goes for
+    quarterly reports, which are expected `quarterly_filing_lag` seconds after the quarter
+    following the latest one seen has closed.
+    """
+    def __init__(self, state_file: str = "refresh_state.json", max_age: float = 7 * 86400,
+                 filing_poll_interval: float = 86400, quarterly_filing_lag: float = QUARTERLY_FILING_LAG):
+        self.state_file = state_file
+        self.max_age = max_age
+        self.filing_poll_interval = filing_poll_interval
+        self.quarterly_filing_lag = quarterly_filing_lag
+        self._lock = threading.Lock()
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict:
+        if not os.path.exists(self.state_file):
+            return {}
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not read refresh state from {self.state_file}, starting fresh: {e}")
+            return {}
+
+    def save(self):
+        """
+        Persists the planner state atomically.
+        """
+        with self._lock:
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, indent=2)
+            os.replace(tmp_path, self.state_file)
+
+    def is_due(self, ticker: str, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        entry = self.state.get(ticker)
+        if not entry:
+            return True
+
+        since_fetch = now - entry.get('last_fetch', 0)
+        if since_fetch >= self.max_age:
+            return True
+
+        period_end = entry.get('latest_period_end')
+        if period_end:
+            # The next fiscal year has closed, so a new annual report may have been published
+            next_period_end = datetime.fromisoformat(period_end) + timedelta(days=365)
+            if now >= next_period_end.timestamp() and since_fetch >= self.filing_poll_interval:
+                return True
+
+        quarter_end = entry.get('latest_quarter_end')
+        if quarter_end:
+            # The next quarter closed long enough ago for its report to be out
+            next_quarter_end = (pd.Timestamp(quarter_end) + pd.DateOffset(months=3)).to_pydatetime()
+            if now >= next_quarter_end.timestamp() + self.quarterly_filing_lag and \
+                    since_fetch >= self.filing_poll_interval:
+                return True
+        return False
+
+    def due_tickers(self, tickers: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """
+        Returns the tickers that should be refetched this cycle.
+        """
+        return [ticker for ticker in tickers if self.is_due(ticker, now)]
+
+    def check_fetch(self, ticker: str, financial_data: Dict, now: Optional[float] = None) -> Tuple[bool, Dict]:
+        """
+        Compares a successful fetch with the recorded state without changing it.
+        Returns (changed, entry): True when the statements changed since the last recorded
+        fetch, and the state entry to hand to commit() once the new data has been published.
+        """
+        fingerprint = fingerprint_statements(financial_data)
+        period_end = latest_period_end(financial_data)
+        quarter_end = latest_period_end(financial_data, QUARTERLY_PERIOD_STATEMENTS)
+        with self._lock:
+            previous = self.state.get(ticker, {})
+        entry = {
+            'latest_period': str(period_end.year) if period_end else previous.get('latest_period'),
+            'latest_period_end': period_end.isoformat() if period_end else previous.get('latest_period_end'),
+            'latest_quarter_end': quarter_end.isoformat() if quarter_end else previous.get('latest_quarter_end'),
+            'fingerprint': fingerprint,
+            'last_fetch': time.time() if now is None else now,
+        }
+        return previous.get('fingerprint') != fingerprint, entry
+
+    def commit(self, entries: Dict[str, Dict]):
+        """
+        Records a batch of check_fetch() entries and persists the state. Called only after the
+        data they describe is published, so a failed refresh leaves those tickers to be
+        fetched and recomputed again instead of marked as up to date.
+        """
+        if not entries:
+            return
+        with self._lock:
+            self.state.update(entries)
+        self.save()
+
+    def forget(self, ticker: str):
+        with self._lock:
+            self.state.pop(ticker, None)
@@ -0,0 +1,156 @@
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from universe import shard_of
+
+logger = logging.getLogger(__name__)
+
+
+class ShardedRefreshScheduler:
+    """
+    Spreads the refresh of a large universe evenly over `interval` seconds.
+
+    Tickers are split into `shards` stable groups and one group is refreshed every
+    interval / shards seconds, so the request rate stays smooth instead of bursting
+    once per interval. Tickers users actually ask for jump the queue: `prioritize`
+    queues the stale ones and they are refreshed in a small batch ahead of the next
+    shard, after at most `priority_delay` seconds (which also batches bursts of demand).
+    Within a shard, the most requested tickers go first.
+
+    `run_batch(tickers, options)` refreshes the given tickers and merges them into the
+    live snapshot; `is_stale(ticker)` says whether a requested ticker needs a refresh.
+    `universe()` may reload the listing file, so it is only called from the scheduler
+    thread; `prioritize` checks membership against the set cached there.
+    """
+    def __init__(self, universe: Callable[[], List[str]], run_batch: Callable[[List[str], Dict], None],
+                 interval: float = 3600, shards: int = 12, is_stale: Optional[Callable[[str], bool]] = None,
+                 priority_delay: float = 5.0, max_priority_batch: int = 50):
+        self.universe = universe
+        self.run_batch = run_batch
+        self.interval = float(interval)
+        self.shards = max(1, int(shards))
+        self.is_stale = is_stale or (lambda ticker: True)
+        self.priority_delay = priority_delay
+        self.max_priority_batch = max_priority_batch
+
+        self.demand: Counter = Counter()
+        self._priority: Dict[str, float] = {}  # ticker -> time first queued
+        self._universe: List[str] = list(universe())
+        self._members = frozenset(self._universe)  # Replaced, never mutated, so readers need no lock
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        # Continue the rotation where the clock says we are, so restarts don't always begin at shard 0
+        self.next_shard = int(time.time() % self.interval // self.slot) % self.shards
+        self.last_run: Dict = {}
+
+    @property
+    def slot(self) -> float:
+        """
+        Seconds between consecutive shard refreshes.
+        """
+        return self.interval / self.shards
+
+    def shard_tickers(self, shard: int) -> List[str]:
+        """
+        Tickers of one shard, most requested first.
+        """
+        tickers = [t for t in self._universe if shard_of(t, self.shards) == shard]
+        return sorted(tickers, key=lambda t: -self.demand[t])
+
+    def _reload_universe(self):
+        tickers = list(self.universe())
+        if tickers != self._universe:
+            self._universe, self._members = tickers, frozenset(tickers)
+
+    def prioritize(self, tickers: Iterable[str]) -> List[str]:
+        """
+        Records demand for `tickers` and queues the stale ones for an early refresh.
+        Returns the tickers that were queued.
+        """
+        members = self._members
+        queued = []
+        now = time.monotonic()
+        with self._lock:
+            for ticker in tickers:
+                if ticker not in members:
+                    continue
+                self.demand[ticker] += 1
+                if ticker not in self._priority and self.is_stale(ticker):
+                    self._priority[ticker] = now
+                    queued.append(ticker)
+        if queued:
+            self._wake.set()
+        return queued
+
+    def _take_priority_batch(self, now: float) -> List[str]:
+        with self._lock:
+            if not self._priority or min(self._priority.values()) + self.priority_delay > now:
+                return []
+            batch = sorted(self._priority, key=lambda t: -self.demand[t])[:self.max_priority_batch]
+            for ticker in batch:
+                del self._priority[ticker]
+        return batch
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='bei-refresh-scheduler', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+
+    def _run(self, tickers: List[str], options: Dict):
+        start = time.monotonic()
+        try:
+            self.run_batch(tickers, options)
+        except Exception as e:
+            logger.error(f"Refresh of {len(tickers)} tickers ({options}) failed: {e}", exc_info=True)
+        self.last_run = dict(options, tickers=len(tickers), seconds=round(time.monotonic() - start, 3),
+                             finished_at=time.time())
+
+    def _loop(self):
+        next_shard_at = time.monotonic() + self.slot
+        while not self._stopped.is_set():
+            now = time.monotonic()
+            batch = self._take_priority_batch(now)
+            if batch:
+                logger.info(f"Refreshing {len(batch)} requested tickers ahead of schedule")
+                self._run(batch, {'trigger': 'priority'})
+                continue
+
+            if now >= next_shard_at:
+                self._reload_universe()
+                shard = self.next_shard
+                self.next_shard = (shard + 1) % self.shards
+                tickers = self.shard_tickers(shard)
+                if tickers:
+                    logger.info(f"Refreshing shard {shard + 1}/{self.shards} ({len(tickers)} tickers)")
+                    self._run(tickers, {'trigger': 'scheduled', 'shard': shard})
+                # Keep the cadence; if a shard overran its slot, start the next one right away
+                next_shard_at = max(next_shard_at + self.slot, time.monotonic())
+                continue
+
+            wait = next_shard_at - now
+            with self._lock:
+                if self._priority:
+                    wait = min(wait, max(0.0, min(self._priority.values()) + self.priority_delay - now))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def status(self) -> Dict:
+        with self._lock:
+            queued = len(self._priority)
+        return {
+            'shards': self.shards,
+            'slot_seconds': round(self.slot, 3),
+            'next_shard': self.next_shard,
+            'priority_queued': queued,
+            'last_run': self.last_run,
+        }
@@ -0,0 +1,148 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+# Content codings we can produce, in order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+# Smaller bodies are sent as-is; compressing them saves less than it costs
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """
+    Picks the content coding for a response from an Accept-Encoding header: the supported
+    coding with the highest q-value, 'identity' when none is acceptable.
+    """
+    qualities: Dict[str, float] = {}
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    best, best_quality = 'identity', 0.0
+    for coding in ENCODINGS:
+        quality = qualities.get(coding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # A fixed mtime keeps the output, and so the cached bytes, identical across processes
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    raise ValueError(f"Unsupported content coding '{encoding}'")
+
+
+class ResponseCache:
+    """
+    Holds pre-serialized response bodies for one data snapshot at a time.
+    Each body is built once per snapshot version and served as-is afterwards; the
+    whole cache is dropped the first time a newer version is requested.
+    Compressed variants (gzip, and brotli when installed) are produced from the cached
+    body the first time a client accepts them and cached alongside it. The cache holds
+    at most `max_bytes` of bodies and evicts the least recently used ones beyond that.
+    """
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._version = None
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[bytes, str]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_etag(version, key: str, encoding: str = 'identity') -> str:
+        """
+        Strong validator for the body of `key` in snapshot `version`; each coding is its own representation.
+        """
+        etag = f"{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+        return etag if encoding == 'identity' else f"{etag}-{encoding}"
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def _lookup(self, version, key: str, encoding: str):
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self._entries = OrderedDict()
+                self._bytes = 0
+            entry = self._entries.get((key, encoding))
+            if entry is not None:
+                self._entries.move_to_end((key, encoding))
+            return entry
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _store(self, version, key: str, encoding: str, entry: Tuple[bytes, str]):
+        with self._lock:
+            if version != self._version or len(entry[0]) > self.max_bytes or (key, encoding) in self._entries:
+                return
+            self._entries[(key, encoding)] = entry
+            self._bytes += len(entry[0])
+            while self._bytes > self.max_bytes:
+                _, (body, _) = self._entries.popitem(last=False)
+                self._bytes -= len(body)
+
+    def get_or_build(self, version, key: str, build: Callable[[], bytes],
+                     encoding: str = 'identity') -> Tuple[bytes, str, str]:
+        """
+        Returns (body, etag, encoding) for `key`, calling `build` only on the first request per
+        version and compressing only on the first request per version and coding. Bodies under
+        MIN_COMPRESS_BYTES always come back uncompressed, with encoding 'identity'.
+        """
+        if encoding != 'identity':
+            entry = self._lookup(version, key, encoding)
+            if entry is not None:
+                self._count(hit=True)
+                return entry[0], entry[1], encoding
+
+        entry = self._lookup(version, key, 'identity')
+        if entry is None:
+            body = build()
+            entry = (body, self.make_etag(version, key))
+            self._store(version, key, 'identity', entry)
+            self._count(hit=False)
+        else:
+            self._count(hit=True)
+        if encoding == 'identity' or len(entry[0]) < MIN_COMPRESS_BYTES:
+            return entry[0], entry[1], 'identity'
+
+        compressed = (compress(entry[0], encoding), self.make_etag(version, key, encoding))
+        self._store(version, key, encoding, compressed)
+        return compressed[0], compressed[1], encoding
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries = OrderedDict()
+            self._bytes = 0
@@ -0,0 +1,154 @@
+import warnings
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from ratio_store import RatioStore
+
+MARKET = 'market'  # Group name used for exchange-wide aggregates
+LATEST = 'latest'  # Pseudo-period holding each company's own latest period
+
+
+def _clean(value: float, digits: int = 4):
+    return None if value != value else round(value, digits)
+
+
+def percentile_ranks(block: np.ndarray) -> np.ndarray:
+    """
+    Percentile rank (0-100] of every value within its column, ties sharing their average
+    rank and NaN staying NaN: the same numbers as pandas' rank(pct=True).
+    """
+    rows = np.arange(block.shape[0])[:, None]
+    order = np.argsort(block, axis=0, kind='stable')  # NaN sorts last
+    ordered = np.take_along_axis(block, order, axis=0)
+    # First and last sorted position of each run of equal values
+    starts_run = np.ones(block.shape, dtype=bool)
+    starts_run[1:] = ordered[1:] != ordered[:-1]
+    ends_run = np.ones(block.shape, dtype=bool)
+    ends_run[:-1] = starts_run[1:]
+    first = np.maximum.accumulate(np.where(starts_run, rows, 0), axis=0)
+    last = np.minimum.accumulate(np.where(ends_run, rows, block.shape[0])[::-1], axis=0)[::-1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sorted_ranks = (first + last + 2) / 2 / np.sum(~np.isnan(block), axis=0) * 100
+    ranks = np.empty(block.shape)
+    np.put_along_axis(ranks, order, sorted_ranks, axis=0)
+    ranks[np.isnan(block)] = np.nan
+    return ranks
+
+
+class SectorStats:
+    """
+    Per-sector and market-wide aggregates of every ratio and period in one snapshot:
+    count, mean, median and quartiles, plus each company's percentile rank within its
+    sector and within the market. Everything is computed once per snapshot with array
+    operations over the RatioStore matrix.
+    """
+    def __init__(self, store: RatioStore):
+        self.store = store
+        self.periods = list(store.periods) + [LATEST]
+        self.period_index = {period: i for i, period in enumerate(self.periods)}
+
+        # ticker x ratio x (periods + latest)
+        cube = np.concatenate([store.values, store.latest[:, :, None]], axis=2)
+        self.groups = {name: store.sector_codes == code for code, name in enumerate(store.sector_names)}
+        self.groups[MARKET] = np.ones(len(store.tickers), dtype=bool)
+        self.aggregates = {name: self._aggregate(cube[mask]) for name, mask in self.groups.items()}
+
+        # Percentile ranks (0-100], NaN where the company has no value
+        if len(store.tickers):
+            flat = cube.reshape(len(store.tickers), -1)
+            sector_rank = np.full(flat.shape, np.nan)
+            for code in np.unique(store.sector_codes):
+                rows = store.sector_codes == code
+                sector_rank[rows] = percentile_ranks(flat[rows])
+            self.sector_rank = sector_rank.reshape(cube.shape)
+            self.market_rank = percentile_ranks(flat).reshape(cube.shape)
+        else:
+            self.sector_rank = self.market_rank = cube
+        self.values = cube
+
+    @staticmethod
+    def _aggregate(block: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Aggregates a (company, ratio, period) block over companies.
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)  # All-NaN slices yield NaN
+            count = np.sum(~np.isnan(block), axis=0)
+            if block.shape[0] == 0:
+                empty = np.full(block.shape[1:], np.nan)
+                return {'count': count, 'mean': empty, 'median': empty, 'q1': empty, 'q3': empty}
+            q1, median, q3 = np.nanpercentile(block, [25, 50, 75], axis=0)
+            return {'count': count, 'mean': np.nanmean(block, axis=0), 'median': median, 'q1': q1, 'q3': q3}
+
+    def _select(self, ratios: Optional[Sequence[str]], periods: Optional[Sequence[str]]):
+        ratio_cols = [self.store.ratio_position(r) for r in ratios] if ratios else range(len(self.store.ratio_keys))
+        if periods:
+            unknown = [p for p in periods if p not in self.period_index]
+            if unknown:
+                raise KeyError(f"Unknown period '{unknown[0]}'")
+            period_cols = [self.period_index[p] for p in periods]
+        else:
+            period_cols = range(len(self.periods))
+        return list(ratio_cols), list(period_cols)
+
+    def to_dict(self, sectors: Optional[Sequence[str]] = None, ratios: Optional[Sequence[str]] = None,
+                periods: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Returns {group: {ratio: {period: {count, mean, median, q1, q3}}}} for the requested slice.
+        """
+        ratio_cols, period_cols = self._select(ratios, periods)
+        wanted = {s.lower() for s in sectors} if sectors else None
+        result = {}
+        for group, stats in self.aggregates.items():
+            if wanted is not None and group.lower() not in wanted:
+                continue
+            columns = {name: array.tolist() for name, array in stats.items()}
+            group_result = {}
+            for r in ratio_cols:
+                by_period = {}
+                for p in period_cols:
+                    if columns['count'][r][p] == 0:
+                        continue
+                    by_period[self.periods[p]] = {
+                        'count': columns['count'][r][p],
+                        'mean': _clean(columns['mean'][r][p]),
+                        'median': _clean(columns['median'][r][p]),
+                        'q1': _clean(columns['q1'][r][p]),
+                        'q3': _clean(columns['q3'][r][p]),
+                    }
+                if by_period:
+                    group_result[self.store.ratio_keys[r]] = by_period
+            result[group] = group_result
+        return result
+
+    def ticker_ranks(self, ticker: str, ratios: Optional[Sequence[str]] = None,
+                     periods: Optional[Sequence[str]] = None) -> Dict:
+        """
+        Returns {ratio: {period: {value, sector_percentile, market_percentile, ...}}} for one ticker.
+        """
+        row = self.store.ticker_index[ticker]
+        sector = self.store.sectors[row]
+        ratio_cols, period_cols = self._select(ratios, periods)
+        values = self.values[row].tolist()
+        sector_rank = self.sector_rank[row].tolist()
+        market_rank = self.market_rank[row].tolist()
+        sector_count = self.aggregates[sector]['count'].tolist()
+        market_count = self.aggregates[MARKET]['count'].tolist()
+
+        result = {}
+        for r in ratio_cols:
+            by_period = {}
+            for p in period_cols:
+                if values[r][p] != values[r][p]:
+                    continue
+                by_period[self.periods[p]] = {
+                    'value': values[r][p],
+                    'sector_percentile': _clean(sector_rank[r][p], 2),
+                    'sector_count': sector_count[r][p],
+                    'market_percentile': _clean(market_rank[r][p], 2),
+                    'market_count': market_count[r][p],
+                }
+            if by_period:
+                result[self.store.ratio_keys[r]] = by_period
+        return result
@@ -0,0 +1,143 @@
+"""
+Production entry point: one refresher process plus N read-only API workers.
+
+The refresher is the only process that scrapes. It runs the normal API server on a
+loopback port, keeps the periodic refresh loop going and publishes every new version
+as the binary snapshot file (SNAPSHOT_FILE). Workers share one listening socket, never
+scrape, memory-map that file and switch to a new version on the next request after it
+is replaced. Refresh requests that reach a worker are forwarded to the refresher.
+
+    python serve.py --workers 4 --port 5000
+
+Workers can also be hosted by another WSGI server, as long as the refresher runs:
+
+    python serve.py --refresher-only &
+    BEI_SERVER_ROLE=worker gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:5000 'serve:worker_app()'
+
+/api/stream keeps one request thread per open connection, so a thread-pool worker only
+admits a quarter of its --threads as streams (BEI_STREAM_MAX_SUBSCRIBERS overrides this)
+and answers 503 beyond that. To push updates to many dashboards, run the workers on
+greenlets instead, where an idle stream costs little:
+
+    BEI_SERVER_ROLE=worker gunicorn -w 4 -k gevent --worker-connections 1000 -b 0.0.0.0:5000 'serve:worker_app()'
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+
+
+def worker_app():
+    """
+    WSGI app for a read-only worker; serves whatever snapshot the refresher last published
+    """
+    os.environ['BEI_SERVER_ROLE'] = 'worker'
+    import api_server
+
+    if os.path.exists(api_server.SNAPSHOT_FILE):
+        api_server.publish_snapshot_file(api_server.SNAPSHOT_FILE)
+    return api_server.app
+
+
+def run_refresher(port):
+    os.environ['BEI_SERVER_ROLE'] = 'standalone'
+    import api_server
+    from werkzeug.serving import make_server
+
+    api_server.load_or_create_data(wait=not api_server.FAST_START)
+    api_server.start_background_refresh()
+    print(f"Refresher {os.getpid()} listening on http://127.0.0.1:{port}")
+    make_server('127.0.0.1', port, api_server.app, threaded=True).serve_forever()
+
+
+def run_worker(listen_fd, host, port):
+    from werkzeug.serving import make_server
+
+    app = worker_app()
+    print(f"Worker {os.getpid()} serving on http://{host}:{port}")
+    make_server(host, port, app, threaded=True, fd=listen_fd).serve_forever()
+
+
+def _spawn(target, *args):
+    """
+    Fork a child running target(*args); the child never returns
+    """
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            target(*args)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the BEI financial ratio API with multiple worker processes")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="Number of API worker processes")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--refresher-port', type=int, default=5001, help="Loopback port of the refresher process")
+    parser.add_argument('--refresher-only', action='store_true', help="Run only the refresher (workers hosted elsewhere)")
+    args = parser.parse_args()
+
+    os.environ.setdefault('BEI_REFRESHER_URL', f"http://127.0.0.1:{args.refresher_port}")
+    if args.refresher_only:
+        run_refresher(args.refresher_port)
+        return
+
+    # Bind once in the parent so every worker accepts from the same socket
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(128)
+    listener.set_inheritable(True)
+
+    refresher = _spawn(run_refresher, args.refresher_port)
+    workers = {_spawn(run_worker, listener.fileno(), args.host, args.port) for _ in range(args.workers)}
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers (refresher pid {refresher})")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers | {refresher}:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Supervise: restart any child that dies until we are asked to stop
+    while workers or refresher:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        if stopping:
+            workers.discard(pid)
+            if pid == refresher:
+                refresher = None
+            continue
+        print(f"Process {pid} exited with status {status}, restarting")
+        time.sleep(1)
+        if pid == refresher:
+            refresher = _spawn(run_refresher, args.refresher_port)
+        elif pid in workers:
+            workers.discard(pid)
+            workers.add(_spawn(run_worker, listener.fileno(), args.host, args.port))
+
+    listener.close()
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import List, Mapping, Optional
+
+from peer_index import PeerIndex
+from ratio_store import RatioStore
+from sector_stats import SectorStats
+
+
+class Snapshot:
+    """
+    One published version of the financial data.
+    A snapshot is never mutated after it is published: a refresh builds a new one off to
+    the side and swaps the module-level reference in a single assignment, so a request
+    that grabbed a snapshot sees one consistent dataset from start to finish.
+    Derived read structures (the columnar ratio store, sector aggregates and the peer
+    index) are built here, before the swap.
+    """
+    def __init__(self, data: Mapping, version: int = 0, updated_at: Optional[datetime] = None,
+                 changed: Optional[List[str]] = None, store: Optional[RatioStore] = None):
+        self.data = data
+        self.version = version
+        self.updated_at = updated_at
+        self.changed = list(changed) if changed is not None else list(data)
+        self.store = store if store is not None else RatioStore.from_snapshot(data)
+        self.sector_stats = SectorStats(self.store)
+        self.peer_index = PeerIndex(self.store)
+
+    @property
+    def last_updated(self) -> Optional[str]:
+        return self.updated_at.isoformat() if self.updated_at else None
+
+    def __len__(self):
+        return len(self.data)
@@ -0,0 +1,86 @@
+import json
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+# Published events kept for subscribers that reconnect with Last-Event-ID
+EVENT_BACKLOG = 64
+
+
+def format_event(name: str, data: Dict, event_id=None) -> str:
+    """
+    One Server-Sent Events message; `event_id` becomes the Last-Event-ID a reconnecting client sends back.
+    """
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {name}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class SnapshotEvents:
+    """
+    Fan-out of snapshot publications to Server-Sent Events subscribers.
+
+    Every publication is one compact event keyed by its snapshot version. Subscribers do
+    not get a queue of their own: they all block on one condition and read the shared
+    backlog past the last version they sent, so a publication costs the same however many
+    are connected. Each subscriber does keep its server thread (or greenlet) blocked for as
+    long as it stays connected, which is why at most `max_subscribers` are admitted.
+    The last `backlog` events are kept so a reconnecting client can catch up.
+    """
+    def __init__(self, backlog: int = EVENT_BACKLOG, max_subscribers: int = 1000):
+        self.max_subscribers = max_subscribers
+        self._events = deque(maxlen=backlog)  # (version, payload), oldest first
+        self._floor = None  # Every event after this version is still in the backlog
+        self._condition = threading.Condition()
+        self.subscribers = 0
+        self.published = 0
+
+    def publish(self, version: int, payload: Dict):
+        with self._condition:
+            if self._events and version <= self._events[-1][0]:
+                return
+            if self._floor is None:
+                self._floor = version  # What changed up to the first version we see is unknown
+            elif len(self._events) == self._events.maxlen:
+                self._floor = self._events[0][0]  # About to be dropped
+            self._events.append((version, payload))
+            self.published += 1
+            self._condition.notify_all()
+
+    def _after(self, version: int) -> Optional[List]:
+        if self._floor is not None and version < self._floor:
+            return None
+        return [event for event in self._events if event[0] > version]
+
+    def since(self, version: int) -> Optional[List]:
+        """
+        Events published after `version`, oldest first; None when they are no longer all known
+        (evicted from the backlog, or from before this process started), in which case the
+        client has to assume everything changed.
+        """
+        with self._condition:
+            return self._after(version)
+
+    def wait(self, version: int, timeout: float) -> Optional[List]:
+        """
+        Like since(), but first blocks until something newer than `version` is published or
+        `timeout` seconds pass.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._events and self._events[-1][0] > version, timeout)
+            return self._after(version)
+
+    def subscribe(self) -> bool:
+        """
+        Takes a subscriber slot; False when all `max_subscribers` are in use.
+        """
+        with self._condition:
+            if self.subscribers >= self.max_subscribers:
+                return False
+            self.subscribers += 1
+            return True
+
+    def unsubscribe(self):
+        with self._condition:
+            self.subscribers -= 1
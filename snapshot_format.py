@@ -0,0 +1,306 @@
+import json
+import os
+import struct
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ratio_series import build_trends
+from ratio_store import RatioStore
+
+# File layout (all integers little-endian):
+#   8 bytes  magic
+#   4 bytes  format version
+#   4 bytes  header length N
+#   N bytes  JSON header (tickers, per-company metadata, ratio layouts, array offsets)
+#   padding  to ARRAY_ALIGNMENT
+#   arrays   per series: float64 values [ticker, ratio, period] then uint8 presence mask
+#            (PRESENT, or PRESENT_INT for a value that was an int, such as the 0 for a zero denominator)
+# Each ratio value is stored once; `ratios` and `trends` are derived on read.
+MAGIC = b'BEISNAP\x00'
+FORMAT_VERSION = 1
+ARRAY_ALIGNMENT = 64
+_PREAMBLE = struct.Struct('<8sII')
+PRESENT = 1
+PRESENT_INT = 2
+
+# Company fields holding {period: {category: {ratio: value}}} that are stored as matrices
+SERIES_FIELDS = ('all_periods', 'quarterly_periods', 'ttm_periods')
+# Company fields that are derived from the series on read and never stored
+DERIVED_FIELDS = ('ratios', 'trends')
+
+
+class SnapshotFormatError(ValueError):
+    pass
+
+
+def restore_derived(company: Dict) -> Dict:
+    """
+    Rebuilds the derived `ratios` and `trends` of a company stored without them, keeping
+    the familiar key order: metadata, ratios, trends, then the series.
+    """
+    all_periods = company.get('all_periods', {})
+    ratios = all_periods.get(company.get('latest_period'), {})
+    ordered = {k: v for k, v in company.items() if k not in DERIVED_FIELDS + SERIES_FIELDS}
+    ordered['ratios'] = ratios
+    ordered['trends'] = build_trends(all_periods, ratios)
+    for field in SERIES_FIELDS:
+        if field in company:
+            ordered[field] = company[field]
+    return ordered
+
+
+def _align(offset: int) -> int:
+    return (offset + ARRAY_ALIGNMENT - 1) // ARRAY_ALIGNMENT * ARRAY_ALIGNMENT
+
+
+def _layout_of(company: Dict) -> List:
+    """
+    Returns a company's ratio layout, [[category, [ratio names]], ...], in snapshot order.
+    """
+    layout, seen = [], {}
+    sources = [company.get('ratios', {})]
+    for field in SERIES_FIELDS:
+        sources.extend(company.get(field, {}).values())
+    for ratios in sources:
+        for category, ratio_dict in ratios.items():
+            if category not in seen:
+                seen[category] = []
+                layout.append([category, seen[category]])
+            for name in ratio_dict:
+                if name not in seen[category]:
+                    seen[category].append(name)
+    return layout
+
+
+def encode_snapshot(data: Dict, version: int = 0, updated_at: Optional[datetime] = None,
+                    changed: Optional[List[str]] = None) -> bytes:
+    """
+    Encodes `data` ({ticker: company_data}) as the bytes of a compact binary snapshot.
+    """
+    tickers = list(data)
+    layouts, layout_ids, companies = [], [], []
+    ratio_keys, ratio_index = [], {}
+    for company in data.values():
+        layout = _layout_of(company)
+        if layout not in layouts:
+            layouts.append(layout)
+        layout_ids.append(layouts.index(layout))
+        for category, names in layout:
+            for name in names:
+                key = f"{category}.{name}"
+                if key not in ratio_index:
+                    ratio_index[key] = len(ratio_keys)
+                    ratio_keys.append(key)
+        companies.append({k: v for k, v in company.items() if k not in SERIES_FIELDS + DERIVED_FIELDS})
+
+    arrays, series_meta = [], {}
+    for field in SERIES_FIELDS:
+        periods = sorted({p for company in data.values() for p in company.get(field, {})})
+        period_index = {p: i for i, p in enumerate(periods)}
+        values = np.full((len(tickers), len(ratio_keys), len(periods)), np.nan)
+        present = np.zeros(values.shape, dtype=np.uint8)
+        period_order = []
+        for t, company in enumerate(data.values()):
+            series = company.get(field, {})
+            period_order.append([period_index[p] for p in series])
+            for period, ratios in series.items():
+                p = period_index[period]
+                for category, ratio_dict in ratios.items():
+                    for name, value in ratio_dict.items():
+                        r = ratio_index[f"{category}.{name}"]
+                        values[t, r, p] = np.nan if value is None else value
+                        present[t, r, p] = PRESENT_INT if type(value) is int else PRESENT
+        series_meta[field] = {'periods': periods, 'period_order': period_order}
+        arrays.append((field, 'values', values))
+        arrays.append((field, 'present', present))
+
+    header = {
+        'format_version': FORMAT_VERSION,
+        'snapshot_version': version,
+        'updated_at': updated_at.isoformat() if updated_at else None,
+        'changed': list(changed) if changed is not None else tickers,
+        'tickers': tickers,
+        'companies': companies,
+        'ratio_keys': ratio_keys,
+        'layouts': layouts,
+        'layout_ids': layout_ids,
+        'series': series_meta,
+    }
+
+    # Offsets depend on the header length, so lay the arrays out against a provisional header first
+    header['arrays'] = {f"{f}.{kind}": [0, list(a.shape), a.dtype.str] for f, kind, a in arrays}
+    while True:
+        header_bytes = json.dumps(header, ensure_ascii=False, default=str).encode('utf-8')
+        end = _align(_PREAMBLE.size + len(header_bytes))
+        arrays_meta = {}
+        for field, kind, array in arrays:
+            arrays_meta[f"{field}.{kind}"] = [end, list(array.shape), array.dtype.str]
+            end = _align(end + array.nbytes)
+        if arrays_meta == header['arrays']:
+            break
+        header['arrays'] = arrays_meta
+
+    payload = bytearray(end)
+    preamble = _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes))
+    payload[:len(preamble) + len(header_bytes)] = preamble + header_bytes
+    for field, kind, array in arrays:
+        offset = header['arrays'][f"{field}.{kind}"][0]
+        payload[offset:offset + array.nbytes] = np.ascontiguousarray(array).tobytes()
+    return bytes(payload)
+
+
+def write_snapshot(payload: bytes, path: str):
+    """
+    Writes encoded snapshot bytes next to `path` and renames them over it, so readers never see a partial file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def save_snapshot(data: Dict, path: str, version: int = 0, updated_at: Optional[datetime] = None,
+                  changed: Optional[List[str]] = None):
+    """
+    Writes `data` ({ticker: company_data}) as a compact binary snapshot.
+    """
+    write_snapshot(encode_snapshot(data, version, updated_at, changed), path)
+
+
+class SnapshotFile:
+    """
+    Read-only view of a binary snapshot. Arrays are memory-mapped, so opening a file
+    only parses the JSON header; company records are decoded on first access.
+    """
+    def __init__(self, path: str, mmap: bool = True):
+        self.path = path
+        with open(path, 'rb') as f:
+            preamble = f.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise SnapshotFormatError(f"{path} is too short to be a snapshot")
+            magic, format_version, header_len = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise SnapshotFormatError(f"{path} is not a binary snapshot")
+            if format_version > FORMAT_VERSION:
+                raise SnapshotFormatError(f"{path} uses unsupported format version {format_version}")
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+
+        self.tickers: List[str] = self.header['tickers']
+        self.ticker_index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.ratio_keys: List[str] = self.header['ratio_keys']
+        self._ratio_positions = {key: i for i, key in enumerate(self.ratio_keys)}
+        self.arrays = {}
+        for name, (offset, shape, dtype) in self.header['arrays'].items():
+            if mmap and int(np.prod(shape)) > 0:
+                self.arrays[name] = np.memmap(path, dtype=np.dtype(dtype), mode='r', offset=offset, shape=tuple(shape))
+            else:
+                count = int(np.prod(shape))
+                self.arrays[name] = np.fromfile(path, dtype=np.dtype(dtype), count=count, offset=offset).reshape(shape)
+
+    @property
+    def version(self) -> int:
+        return self.header.get('snapshot_version', 0)
+
+    @property
+    def updated_at(self) -> Optional[datetime]:
+        value = self.header.get('updated_at')
+        return datetime.fromisoformat(value) if value else None
+
+    @property
+    def changed(self) -> List[str]:
+        return self.header.get('changed', self.tickers)
+
+    def series_periods(self, field: str = 'all_periods') -> List[str]:
+        return self.header['series'][field]['periods']
+
+    def values(self, field: str = 'all_periods') -> np.ndarray:
+        """
+        Returns the (memory-mapped) ticker x ratio x period matrix of a series.
+        """
+        return self.arrays[f"{field}.values"]
+
+    def _series(self, row: int, field: str, layout: List) -> Dict:
+        meta = self.header['series'][field]
+        periods = meta['periods']
+        values = self.arrays[f"{field}.values"][row].tolist()
+        present = self.arrays[f"{field}.present"][row].tolist()
+        positions = self._ratio_positions
+        series = {}
+        for p in meta['period_order'][row]:
+            ratios = {}
+            for category, names in layout:
+                ratios[category] = {}
+                for name in names:
+                    r = positions[f"{category}.{name}"]
+                    if present[r][p] == PRESENT_INT:
+                        ratios[category][name] = int(values[r][p])
+                    elif present[r][p]:
+                        ratios[category][name] = values[r][p]
+            series[periods[p]] = ratios
+        return series
+
+    def ratio_store(self) -> RatioStore:
+        """
+        Builds the columnar ratio store straight from the mapped matrix, without decoding companies.
+        """
+        companies = self.header['companies']
+        return RatioStore(
+            tickers=self.tickers,
+            names=[c.get('name', '') for c in companies],
+            sectors=[c.get('sector', 'Unknown') for c in companies],
+            latest_periods=[c.get('latest_period', '') for c in companies],
+            ratio_keys=self.ratio_keys,
+            periods=self.series_periods('all_periods'),
+            values=self.values('all_periods'),
+        )
+
+    def company(self, ticker: str) -> Dict:
+        """
+        Decodes one company record in the same shape the scraper produces.
+        """
+        row = self.ticker_index[ticker]
+        layout = self.header['layouts'][self.header['layout_ids'][row]]
+        company = dict(self.header['companies'][row])
+        for field in SERIES_FIELDS:
+            if field in self.header['series']:
+                company[field] = self._series(row, field, layout)
+        return restore_derived(company)
+
+
+class LazyCompanies(Mapping):
+    """
+    Read-only {ticker: company_data} mapping over a SnapshotFile that decodes each
+    company the first time it is looked up and keeps the result.
+    """
+    def __init__(self, snapshot_file: SnapshotFile):
+        self._file = snapshot_file
+        self._decoded: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, ticker: str) -> Dict:
+        company = self._decoded.get(ticker)
+        if company is None:
+            if ticker not in self._file.ticker_index:
+                raise KeyError(ticker)
+            company = self._file.company(ticker)
+            with self._lock:
+                company = self._decoded.setdefault(ticker, company)
+        return company
+
+    def __contains__(self, ticker) -> bool:
+        return ticker in self._file.ticker_index
+
+    def __iter__(self):
+        return iter(self._file.tickers)
+
+    def __len__(self) -> int:
+        return len(self._file.tickers)
+
+
+def load_snapshot(path: str, mmap: bool = True) -> SnapshotFile:
+    return SnapshotFile(path, mmap=mmap)
+
@@ -0,0 +1,435 @@
+import bisect
+import hashlib
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from snapshot_format import DERIVED_FIELDS, restore_derived
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = 'index.jsonl'
+SEGMENT_SUFFIX = '.seg'
+# Each frame in a segment is a little-endian length followed by one zlib-compressed JSON company record
+_FRAME_HEADER = struct.Struct('<I')
+
+
+def parse_as_of(value: str, end_of_day: bool = True) -> datetime:
+    """
+    Parses an as_of query value. A bare date ('2024-06-03') means the end of that day, so it
+    includes every refresh published on it (or its start, without `end_of_day`).
+    """
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected an ISO date or date-time")
+    if len(value.strip()) == 10 and end_of_day:
+        parsed += timedelta(days=1, microseconds=-1)
+    # Published timestamps are naive local time
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+class _Entry:
+    """
+    Where one version of one ticker's record lives (length 0 marks a delisted ticker).
+    """
+    __slots__ = ('version', 'timestamp', 'segment', 'offset', 'length', 'digest')
+
+    def __init__(self, version: int, timestamp: float, segment: str, offset: int, length: int, digest: str):
+        self.version = version
+        self.timestamp = timestamp
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.digest = digest
+
+
+class SnapshotHistory:
+    """
+    Append-only, versioned history of the published company records.
+
+    Each refresh appends only the companies whose record actually changed (plus a
+    tombstone for removed tickers) to a segment file, one compressed frame per company,
+    and a line to an index of (ticker -> segment, offset) per version. The index is kept
+    in memory per ticker in version order, so a point-in-time lookup is a bisect and a
+    single frame read, never a replay of the log.
+
+    Versions older than `retention_days`, or the oldest ones once the history exceeds
+    `max_bytes`, are folded into a single base version holding each ticker's state at that
+    point; compaction runs at most once per `compact_interval` seconds and rewrites the
+    segments, so disk use stays bounded. Only one process (the refresher) should record;
+    other processes pick up new versions from the index file on their next lookup.
+    """
+    def __init__(self, directory: str = 'snapshot_history', retention_days: float = 730,
+                 max_bytes: int = 1024 * 1024 * 1024, segment_bytes: int = 64 * 1024 * 1024,
+                 compact_interval: float = 86400):
+        self.directory = directory
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.compact_interval = compact_interval
+        self._lock = threading.RLock()
+        self._last_compaction = time.monotonic()
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    # --- Index bookkeeping ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, INDEX_FILE)
+
+    def _load_index(self):
+        self._entries: Dict[str, List[_Entry]] = {}
+        self._timestamps: Dict[str, List[float]] = {}
+        self._versions: List[Dict] = []
+        self._last_segment = None
+        self._index_state = None
+        self._index_offset = 0
+        self._read_index()
+
+    def _read_index(self):
+        """
+        Reads index lines appended since the last read, or the whole index after a compaction replaced it.
+        """
+        path = self._index_path()
+        if not os.path.exists(path):
+            return
+        stat = os.stat(path)
+        if self._index_state is not None and stat.st_ino != self._index_state[0]:
+            self._entries, self._timestamps, self._versions, self._last_segment = {}, {}, [], None
+            self._index_offset = 0
+        self._index_state = (stat.st_ino, stat.st_size)
+        if stat.st_size <= self._index_offset:
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            f.seek(self._index_offset)
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # A line still being written; read it next time
+                self._index_offset += len(line.encode('utf-8'))
+                try:
+                    version_line = json.loads(line)
+                except ValueError as e:
+                    logger.warning(f"Skipping unreadable snapshot history index line: {e}")
+                    continue
+                self._apply(version_line)
+
+    def _apply(self, version_line: Dict):
+        timestamp = datetime.fromisoformat(version_line['updated_at']).timestamp()
+        for ticker, (offset, length, digest) in version_line['entries'].items():
+            entry = _Entry(version_line['version'], timestamp, version_line['segment'], offset, length, digest)
+            self._entries.setdefault(ticker, []).append(entry)
+            self._timestamps.setdefault(ticker, []).append(timestamp)
+        self._versions.append({'version': version_line['version'], 'updated_at': version_line['updated_at'],
+                               'timestamp': timestamp, 'companies': len(version_line['entries']),
+                               'base': version_line.get('base', False)})
+        self._last_segment = version_line['segment']
+
+    def refresh(self):
+        """
+        Picks up versions recorded by another process since the last lookup.
+        """
+        with self._lock:
+            path = self._index_path()
+            if not os.path.exists(path):
+                return
+            stat = os.stat(path)
+            if self._index_state != (stat.st_ino, stat.st_size):
+                self._read_index()
+
+    # --- Segments ---
+
+    def _segment_path(self, segment: str) -> str:
+        return os.path.join(self.directory, segment)
+
+    @staticmethod
+    def _new_segment_name() -> str:
+        return f"{time.time_ns():020d}{SEGMENT_SUFFIX}"
+
+    def _active_segment(self) -> str:
+        segment = self._last_segment
+        if segment and os.path.exists(self._segment_path(segment)) and \
+                os.path.getsize(self._segment_path(segment)) < self.segment_bytes:
+            return segment
+        return self._new_segment_name()
+
+    @staticmethod
+    def _encode(company: Dict) -> bytes:
+        stored = {k: v for k, v in company.items() if k not in DERIVED_FIELDS}
+        return json.dumps(stored, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+
+    def _raw_frame(self, entry: _Entry) -> bytes:
+        with open(self._segment_path(entry.segment), 'rb') as f:
+            f.seek(entry.offset)
+            frame = f.read(entry.length)
+        (size,) = _FRAME_HEADER.unpack_from(frame)
+        return zlib.decompress(frame[_FRAME_HEADER.size:_FRAME_HEADER.size + size])
+
+    def _read(self, entry: _Entry) -> Optional[Dict]:
+        return restore_derived(json.loads(self._raw_frame(entry))) if entry.length else None
+
+    def _retrying(self, lookup):
+        try:
+            return lookup()
+        except FileNotFoundError:
+            # Another process compacted the history since our index was read; reload it and look again
+            self.refresh()
+            return lookup()
+
+    def _write_version(self, version: int, updated_at: datetime, frames: Dict[str, Optional[bytes]],
+                       segment: str, base: bool = False) -> Dict:
+        entries = {}
+        with open(self._segment_path(segment), 'ab') as f:
+            offset = f.tell()
+            for ticker, raw in frames.items():
+                if raw is None:
+                    entries[ticker] = [offset, 0, '']
+                    continue
+                compressed = zlib.compress(raw, 6)
+                f.write(_FRAME_HEADER.pack(len(compressed)) + compressed)
+                length = _FRAME_HEADER.size + len(compressed)
+                entries[ticker] = [offset, length, hashlib.sha1(raw).hexdigest()[:16]]
+                offset += length
+        line = {'version': version, 'updated_at': updated_at.isoformat(), 'segment': segment, 'entries': entries}
+        if base:
+            line['base'] = True
+        return line
+
+    # --- Recording ---
+
+    def record(self, data: Mapping, version: int, updated_at: datetime,
+               changed: Optional[Iterable[str]] = None) -> int:
+        """
+        Appends the version of `data` ({ticker: company_data}) published at `updated_at`.
+        Only tickers in `changed` (every ticker when None) are compared, along with tickers
+        the history has not seen yet; removed tickers get a tombstone. Records identical to
+        the previous version are skipped. Returns the number of tickers written.
+        """
+        with self._lock:
+            self._read_index()
+            alive = {ticker for ticker, entries in self._entries.items() if entries[-1].length}
+            candidates = list(data) if changed is None else [t for t in changed if t in data]
+            listed = set(candidates)
+            candidates += [ticker for ticker in data if ticker not in alive and ticker not in listed]
+
+            frames = {}
+            for ticker in candidates:
+                raw = self._encode(data[ticker])
+                previous = self._entries.get(ticker)
+                if previous and previous[-1].length and previous[-1].digest == hashlib.sha1(raw).hexdigest()[:16]:
+                    continue
+                frames[ticker] = raw
+            for ticker in sorted(alive - set(data)):
+                frames[ticker] = None
+            if not frames:
+                return 0
+
+            line = self._write_version(version, updated_at, frames, self._active_segment())
+            self._drop_partial_index_line()
+            with open(self._index_path(), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(line, separators=(',', ':')) + '\n')
+            self._read_index()
+            logger.info(f"Recorded snapshot version {version} in history ({len(frames)} companies changed)")
+
+        if time.monotonic() - self._last_compaction >= self.compact_interval:
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"Snapshot history compaction failed: {e}", exc_info=True)
+        return len(frames)
+
+    def _drop_partial_index_line(self):
+        """
+        Cuts off an index line left half-written by a recorder that died while appending it, so
+        the next line does not get glued onto it. Only the recorder appends, so nobody else can
+        still be writing that line.
+        """
+        path = self._index_path()
+        if os.path.exists(path) and os.path.getsize(path) > self._index_offset:
+            logger.warning(f"Dropping a partial line at the end of {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(self._index_offset)
+
+    # --- Lookups ---
+
+    def _entry_at(self, ticker: str, as_of: datetime) -> Optional[_Entry]:
+        timestamps = self._timestamps.get(ticker)
+        if not timestamps:
+            return None
+        position = bisect.bisect_right(timestamps, as_of.timestamp()) - 1
+        return self._entries[ticker][position] if position >= 0 else None
+
+    def company(self, ticker: str, as_of: datetime) -> Optional[Dict]:
+        """
+        Returns the company record as it was published at `as_of`, or None if the ticker was
+        not listed then (or that point lies before the retained history).
+        """
+        self.refresh()
+
+        def lookup():
+            with self._lock:
+                entry = self._entry_at(ticker, as_of)
+            return self._read(entry) if entry is not None else None
+        return self._retrying(lookup)
+
+    def history(self, ticker: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict]:
+        """
+        Returns every retained version of a ticker's record, oldest first, as
+        {'version', 'updated_at', 'company'} where company is None for a removal.
+        """
+        self.refresh()
+
+        def lookup():
+            with self._lock:
+                entries = list(self._entries.get(ticker, []))
+            versions = []
+            for entry in entries:
+                updated_at = datetime.fromtimestamp(entry.timestamp)
+                if (start and updated_at < start) or (end and updated_at > end):
+                    continue
+                versions.append({'version': entry.version, 'updated_at': updated_at.isoformat(),
+                                 'company': self._read(entry)})
+            return versions
+        return self._retrying(lookup)
+
+    def __contains__(self, ticker: str) -> bool:
+        self.refresh()
+        return ticker in self._entries
+
+    def view(self, as_of: datetime) -> 'HistoryView':
+        self.refresh()
+        return HistoryView(self, as_of)
+
+    def retained_from(self) -> Optional[str]:
+        """
+        Publication time of the oldest retained version.
+        """
+        return self._versions[0]['updated_at'] if self._versions else None
+
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(os.path.join(self.directory, name)) for name in os.listdir(self.directory)
+                   if name.endswith(SEGMENT_SUFFIX) or name == INDEX_FILE)
+
+    def status(self) -> Dict:
+        return {
+            'versions': len(self._versions),
+            'tickers': len(self._entries),
+            'retained_from': self.retained_from(),
+            'bytes': self.size_bytes(),
+        }
+
+    # --- Retention and compaction ---
+
+    def compact(self, now: Optional[datetime] = None) -> bool:
+        """
+        Folds the versions that fall outside the retention policy into one base version and
+        rewrites the retained ones into fresh segments, then drops the old segments.
+        Returns True when anything was folded.
+        """
+        with self._lock:
+            self._last_compaction = time.monotonic()
+            self._read_index()
+            if len(self._versions) < 2:
+                return False
+
+            cutoff = ((now or datetime.now()) - timedelta(days=self.retention_days)).timestamp()
+            sizes = {}
+            for entries in self._entries.values():
+                for entry in entries:
+                    sizes[entry.version] = sizes.get(entry.version, 0) + entry.length
+            # Expire versions past the retention period, then the oldest ones while over the size
+            # budget; the latest version is always kept
+            expired_count = 0
+            while expired_count < len(self._versions) - 1 and self._versions[expired_count]['timestamp'] < cutoff:
+                expired_count += 1
+            retained_bytes = sum(sizes.get(v['version'], 0) for v in self._versions[expired_count:])
+            while expired_count < len(self._versions) - 1 and retained_bytes > self.max_bytes:
+                retained_bytes -= sizes.get(self._versions[expired_count]['version'], 0)
+                expired_count += 1
+            # Folding a single version into a base changes nothing
+            if expired_count < 2:
+                return False
+            expired = {v['version'] for v in self._versions[:expired_count]}
+
+            base = self._versions[expired_count - 1]
+            old_segments = {e.segment for entries in self._entries.values() for e in entries}
+            segment = self._new_segment_name()
+            lines = []
+
+            base_frames = {}
+            for ticker, entries in self._entries.items():
+                folded = [e for e in entries if e.version in expired]
+                if folded and folded[-1].length:
+                    base_frames[ticker] = self._raw_frame(folded[-1])
+            lines.append(self._write_version(base['version'], datetime.fromisoformat(base['updated_at']),
+                                             base_frames, segment, base=True))
+
+            for version_info in self._versions:
+                if version_info['version'] in expired:
+                    continue
+                frames = {}
+                for ticker, entries in self._entries.items():
+                    for entry in entries:
+                        if entry.version == version_info['version']:
+                            frames[ticker] = self._raw_frame(entry) if entry.length else None
+                if os.path.getsize(self._segment_path(segment)) >= self.segment_bytes:
+                    segment = self._new_segment_name()
+                lines.append(self._write_version(version_info['version'],
+                                                 datetime.fromisoformat(version_info['updated_at']),
+                                                 frames, segment))
+
+            tmp_path = self._index_path() + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(json.dumps(line, separators=(',', ':')) + '\n')
+            os.replace(tmp_path, self._index_path())
+            for name in old_segments:
+                try:
+                    os.remove(self._segment_path(name))
+                except FileNotFoundError:
+                    pass
+            self._load_index()
+            logger.info(f"Compacted snapshot history: folded {len(expired)} versions into base version "
+                        f"{base['version']}, {len(self._versions)} versions retained")
+            return True
+
+
+class HistoryView(Mapping):
+    """
+    Read-only {ticker: company_data} mapping of the data as published at `as_of`.
+    Each company is resolved on first lookup from that ticker's own entries.
+    """
+    def __init__(self, history: SnapshotHistory, as_of: datetime):
+        self.history = history
+        self.as_of = as_of
+        self._cache: Dict[str, Optional[Dict]] = {}
+
+    def _get(self, ticker: str) -> Optional[Dict]:
+        if ticker not in self._cache:
+            self._cache[ticker] = self.history.company(ticker, self.as_of)
+        return self._cache[ticker]
+
+    def __getitem__(self, ticker: str) -> Dict:
+        company = self._get(ticker)
+        if company is None:
+            raise KeyError(ticker)
+        return company
+
+    def __contains__(self, ticker) -> bool:
+        return self._get(ticker) is not None
+
+    def __iter__(self):
+        with self.history._lock:
+            tickers = [ticker for ticker in self.history._entries
+                       if (entry := self.history._entry_at(ticker, self.as_of)) is not None and entry.length]
+        return iter(tickers)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
@@ -14,10 +14,74 @@ interface Company {
   sector: string;
 }
 
+// 'quarterly' and 'ttm' periods are labelled like '2024Q3'
+type Granularity = 'annual' | 'quarterly' | 'ttm';
+
+type BatchRatios = Record<string, Omit<CompanyRatios, 'ticker'>>;
+
+interface BatchRatiosOptions {
+  fields?: string[];   // e.g. ['profitability.roe', 'leverage.der']
+  periods?: string;    // e.g. '2022:2024'
+}
+
+interface RefreshJob {
+  job_id: string;
+  status: 'queued' | 'running' | 'succeeded' | 'failed';
+  progress: { done: number; total: number };
+  result: { companies?: number; changed?: string[]; version?: number; last_updated?: string };
+  error: string | null;
+}
+
+interface PeerOptions {
+  k?: number;            // 1-50, default 5
+  sameSector?: boolean;
+  ratios?: string[];     // e.g. ['roe', 'leverage.der']; default every ratio
+  period?: string;       // default each company's latest period
+}
+
+interface Peers {
+  ticker: string;
+  name: string;
+  sector: string;
+  period: string;
+  same_sector: boolean;
+  ratios: Record<string, number>;
+  peers: Array<{ ticker: string; name: string; sector: string; distance: number; ratios: Record<string, number> }>;
+}
+
+interface CompanyHistory {
+  ticker: string;
+  period: string | null;
+  versions: Array<{
+    version: number;
+    updated_at: string;
+    latest_period?: string;
+    ratios?: CompanyRatios['ratios'];
+    removed?: boolean;
+  }>;
+}
+
+interface HistoryOptions {
+  from?: string;       // ISO date or date-time
+  to?: string;
+  period?: string;     // e.g. '2023' to follow restatements of one period
+  fields?: string[];
+}
+
+// Pushed by /api/stream when a new snapshot is published; changed is null when
+// the client missed too much to know, and everything should be refetched
+interface SnapshotUpdate {
+  version: number;
+  last_updated: string | null;
+  companies: number;
+  changed: string[] | null;
+}
+
 interface CompanyRatios {
   ticker: string;
   name: string;
   sector: string;
+  granularity?: Granularity;
   latest_period: string;
   ratios: {
     liquidity?: Record<string, number>;
@@ -67,8 +131,35 @@ class ApiService {
     return this.fetchData<Company[]>('/companies');
   }
 
-  async getCompanyRatios(ticker: string): Promise<ApiResponse<CompanyRatios>> {
-    return this.fetchData<CompanyRatios>(`/ratios/${ticker}`);
+  async getCompanyRatios(ticker: string, granularity: Granularity = 'annual'): Promise<ApiResponse<CompanyRatios>> {
+    const query = granularity === 'annual' ? '' : `?granularity=${granularity}`;
+    return this.fetchData<CompanyRatios>(`/ratios/${ticker}${query}`);
+  }
+
+  async getPeers(ticker: string, options: PeerOptions = {}): Promise<ApiResponse<Peers>> {
+    const params = new URLSearchParams({ k: String(options.k ?? 5) });
+    if (options.sameSector) params.set('same_sector', 'true');
+    if (options.ratios?.length) params.set('ratios', options.ratios.join(','));
+    if (options.period) params.set('period', options.period);
+    return this.fetchData<Peers>(`/peers/${ticker}?${params.toString()}`);
+  }
+
+  async getCompanyHistory(ticker: string, options: HistoryOptions = {}): Promise<ApiResponse<CompanyHistory> & { retained_from?: string }> {
+    const params = new URLSearchParams();
+    if (options.from) params.set('from', options.from);
+    if (options.to) params.set('to', options.to);
+    if (options.period) params.set('period', options.period);
+    if (options.fields?.length) params.set('fields', options.fields.join(','));
+    const query = params.toString();
+    return this.fetchData<CompanyHistory>(`/history/${ticker}${query ? `?${query}` : ''}`);
+  }
+
+  // One cacheable round trip for many tickers, projected to the requested fields and periods
+  async getRatiosBatch(tickers: string[], options: BatchRatiosOptions = {}): Promise<ApiResponse<BatchRatios> & { missing?: string[] }> {
+    const params = new URLSearchParams({ tickers: tickers.join(',') });
+    if (options.fields?.length) params.set('fields', options.fields.join(','));
+    if (options.periods) params.set('periods', options.periods);
+    return this.fetchData<BatchRatios>(`/ratios?${params.toString()}`);
   }
 
   async compareCompanies(tickers: string[]): Promise<ApiResponse<any>> {
@@ -79,15 +170,45 @@ class ApiService {
     return this.fetchData('/sectors');
   }
 
-  async refreshData(): Promise<ApiResponse<any>> {
-    return this.postData('/refresh', {});
+  async startRefresh(options: { full?: boolean; cache_only?: boolean } = {}): Promise<ApiResponse<RefreshJob>> {
+    return this.postData<RefreshJob>('/refresh', options);
+  }
+
+  async getRefreshJob(jobId: string): Promise<ApiResponse<RefreshJob>> {
+    return this.fetchData<RefreshJob>(`/refresh/${jobId}`);
+  }
+
+  // Starts, queues or joins a refresh job and resolves once it has finished
+  async refreshData(pollIntervalMs = 1000): Promise<ApiResponse<RefreshJob>> {
+    let response = await this.startRefresh();
+    while (response.success && (response.data.status === 'queued' || response.data.status === 'running')) {
+      await new Promise(resolve => setTimeout(resolve, pollIntervalMs));
+      response = await this.getRefreshJob(response.data.job_id);
+    }
+    if (response.data?.status === 'failed') {
+      throw new Error(response.data.error || 'Refresh failed');
+    }
+    return response;
   }
 
   async getHealth(): Promise<ApiResponse<any>> {
     return this.fetchData('/health');
   }
+
+  // Calls onUpdate for every snapshot published from now on; returns a function that closes the stream.
+  // EventSource reconnects by itself and resumes from the last version it saw.
+  subscribeToUpdates(onUpdate: (update: SnapshotUpdate) => void, onError?: (event: Event) => void): () => void {
+    const source = new EventSource(`${this.baseURL}/stream`);
+    source.addEventListener('snapshot', event => {
+      onUpdate(JSON.parse((event as MessageEvent).data) as SnapshotUpdate);
+    });
+    if (onError) {
+      source.onerror = onError;
+    }
+    return () => source.close();
+  }
 }
 
 export const apiService = new ApiService();
 export default apiService;
-export type { Company, CompanyRatios, ApiResponse };
\ No newline at end of file
+export type { Company, CompanyRatios, ApiResponse, RefreshJob, BatchRatios, BatchRatiosOptions, Granularity, CompanyHistory, HistoryOptions, Peers, PeerOptions, SnapshotUpdate };
\ No newline at end of file
@@ -42,6 +42,19 @@ export default function Dashboard() {
     }
   }, [selectedCompany]);
 
+  // Refetch only what a newly published snapshot changed
+  useEffect(() => {
+    return apiService.subscribeToUpdates(update => {
+      setLastUpdated(update.last_updated);
+      if (update.changed === null || update.changed.length > 0) {
+        loadCompanies();
+      }
+      if (selectedCompany && (update.changed === null || update.changed.includes(selectedCompany))) {
+        loadCompanyData(selectedCompany);
+      }
+    });
+  }, [selectedCompany]);
+
   const loadCompanies = async () => {
     try {
       const response = await apiService.getCompanies();
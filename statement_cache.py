@@ -0,0 +1,241 @@
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Parquet (via pyarrow) is preferred; pickle keeps the cache usable without it
+PARQUET_AVAILABLE = importlib.util.find_spec('pyarrow') is not None
+
+INDEX_FILE = 'index.json'
+# Seconds between index writes while statements are being stored; flush() writes it at the end of a batch
+INDEX_SAVE_INTERVAL = 5.0
+# Eviction frees space down to this share of max_bytes, so a full cache does not evict on every put
+EVICT_TO = 0.9
+
+
+class StatementCache:
+    """
+    On-disk cache of raw yfinance statements, one file per ticker and statement type.
+    DataFrames are stored in a binary columnar format (Parquet, or pickle when pyarrow
+    is not installed) and `info` dicts as JSON. Every entry carries its own expiry time,
+    and the least recently used entries are evicted once the cache exceeds `max_bytes`.
+    The index of entries is written at most every INDEX_SAVE_INTERVAL seconds while
+    statements are stored; call flush() after a batch to persist it right away.
+    """
+    def __init__(self, cache_dir: str = "statement_cache", ttl: float = 86400,
+                 max_bytes: int = 512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index = self._load_index()
+        self._bytes = sum(entry['size'] for entry in self._index.values())
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    # --- Index bookkeeping ---
+
+    def _index_path(self) -> str:
+        return os.path.join(self.cache_dir, INDEX_FILE)
+
+    def _load_index(self) -> Dict:
+        try:
+            with open(self._index_path(), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning(f"Statement cache index is unreadable, starting empty: {e}")
+            return {}
+        # Drop entries whose files disappeared behind our back
+        return {key: entry for key, entry in index.items()
+                if os.path.exists(os.path.join(self.cache_dir, entry['path']))}
+
+    def _save_index(self):
+        tmp_path = self._index_path() + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path())
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _index_changed_locked(self):
+        self._dirty = True
+        if time.monotonic() - self._last_save >= INDEX_SAVE_INTERVAL:
+            self._save_index()
+
+    def flush(self):
+        """
+        Writes the index if it changed since it was last saved.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    @staticmethod
+    def _key(ticker: str, statement: str) -> str:
+        return f"{ticker}/{statement}"
+
+    # --- Serialization ---
+
+    @staticmethod
+    def _write_frame(df: pd.DataFrame, path: str) -> Dict:
+        frame = df.copy()
+        dated_columns = isinstance(frame.columns, pd.DatetimeIndex)
+        frame.columns = [c.isoformat() if dated_columns else str(c) for c in frame.columns]
+        frame.index = frame.index.map(str)
+        frame.index.name = 'line_item'
+        if PARQUET_AVAILABLE:
+            frame.to_parquet(path)
+        else:
+            frame.to_pickle(path)
+        return {'dated_columns': dated_columns}
+
+    @staticmethod
+    def _read_frame(path: str, entry: Dict) -> pd.DataFrame:
+        frame = pd.read_parquet(path) if entry['format'] == 'parquet' else pd.read_pickle(path)
+        frame.index.name = None
+        if entry.get('dated_columns'):
+            frame.columns = pd.to_datetime(frame.columns)
+        return frame
+
+    # --- Public API ---
+
+    def put(self, ticker: str, statement: str, value, ttl: Optional[float] = None):
+        """
+        Stores one raw statement (a DataFrame, or a dict for `info`) with its own TTL.
+        """
+        ticker_dir = os.path.join(self.cache_dir, ticker)
+        os.makedirs(ticker_dir, exist_ok=True)
+        now = time.time()
+        entry = {'fetched_at': now, 'expires_at': now + (self.ttl if ttl is None else ttl), 'last_access': now}
+
+        if isinstance(value, pd.DataFrame):
+            entry['format'] = 'parquet' if PARQUET_AVAILABLE else 'pickle'
+            rel_path = os.path.join(ticker, f"{statement}.{entry['format']}")
+            tmp_path = os.path.join(self.cache_dir, rel_path + '.tmp')
+            entry.update(self._write_frame(value, tmp_path))
+        else:
+            entry['format'] = 'json'
+            rel_path = os.path.join(ticker, f"{statement}.json")
+            tmp_path = os.path.join(self.cache_dir, rel_path + '.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, default=str)
+
+        os.replace(tmp_path, os.path.join(self.cache_dir, rel_path))
+        entry['path'] = rel_path
+        entry['size'] = os.path.getsize(os.path.join(self.cache_dir, rel_path))
+
+        with self._lock:
+            previous = self._index.get(self._key(ticker, statement))
+            self._index[self._key(ticker, statement)] = entry
+            self._bytes += entry['size'] - (previous['size'] if previous else 0)
+            self._evict_locked()
+            self._index_changed_locked()
+
+    def get(self, ticker: str, statement: str, allow_expired: bool = False):
+        """
+        Returns a cached statement, or None when it is missing or (unless `allow_expired`) past its TTL.
+        """
+        key = self._key(ticker, statement)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or (not allow_expired and entry['expires_at'] < time.time()):
+                self.misses += 1
+                return None
+            entry['last_access'] = time.time()
+
+        path = os.path.join(self.cache_dir, entry['path'])
+        try:
+            if entry['format'] == 'json':
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)
+            else:
+                value = self._read_frame(path, entry)
+        except Exception as e:
+            logger.warning(f"Dropping unreadable cache entry {key}: {e}")
+            self.invalidate(ticker, statement)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def get_many(self, ticker: str, statements: Iterable[str], allow_expired: bool = False) -> Dict:
+        """
+        Returns {statement: value} for every requested statement that is cached.
+        """
+        result = {}
+        for statement in statements:
+            value = self.get(ticker, statement, allow_expired=allow_expired)
+            if value is not None:
+                result[statement] = value
+        return result
+
+    def invalidate(self, ticker: str, statement: Optional[str] = None):
+        """
+        Removes one statement, or every statement of a ticker when `statement` is None.
+        """
+        with self._lock:
+            keys = [self._key(ticker, statement)] if statement else \
+                [k for k in self._index if k.startswith(f"{ticker}/")]
+            for key in keys:
+                entry = self._index.pop(key, None)
+                if entry:
+                    self._remove_file(entry)
+                    self._bytes -= entry['size']
+            self._index_changed_locked()
+
+    def tickers(self):
+        """
+        Returns every ticker that has at least one cached statement.
+        """
+        with self._lock:
+            return sorted({key.split('/', 1)[0] for key in self._index})
+
+    def total_bytes(self) -> int:
+        return self._bytes
+
+    def clear(self):
+        with self._lock:
+            self._index = {}
+            self._bytes = 0
+            self._dirty = False
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    # --- Eviction ---
+
+    def _remove_file(self, entry: Dict):
+        try:
+            os.remove(os.path.join(self.cache_dir, entry['path']))
+        except FileNotFoundError:
+            pass
+
+    def _evict_locked(self):
+        """
+        Once the cache exceeds max_bytes, evicts least recently used entries until it is
+        back under EVICT_TO of it.
+        """
+        if self._bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['last_access']):
+            if self._bytes <= target:
+                break
+            self._remove_file(entry)
+            del self._index[key]
+            self._bytes -= entry['size']
+            logger.info(f"Evicted {key} from statement cache")
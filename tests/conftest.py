@@ -0,0 +1,50 @@
+import os
+import sys
+
+import pytest
+
+# The server modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Companies the read-side tests serve: two per sector, so sector statistics and peers have something to work with
+COMPANIES = {
+    'AAAA.JK': {'name': 'Alpha', 'sector': 'Energy'},
+    'BBBB.JK': {'name': 'Beta', 'sector': 'Energy'},
+    'CCCC.JK': {'name': 'Gamma', 'sector': 'Banking'},
+    'DDDD.JK': {'name': 'Delta', 'sector': 'Banking'},
+    'EEEE.JK': {'name': 'Epsilon', 'sector': 'Retail'},
+    'FFFF.JK': {'name': 'Zeta', 'sector': 'Retail'},
+}
+
+
+@pytest.fixture(scope='session')
+def company_records():
+    """
+    {ticker: company record} for COMPANIES, computed from the synthetic benchmark statements
+    """
+    import ratio_engine
+    from benchmarks.fixtures import synthetic_statements
+
+    statements = {ticker: synthetic_statements(ticker, info['sector']) for ticker, info in COMPANIES.items()}
+    series = ratio_engine.calculate_series(statements, {ticker: info['sector'] for ticker, info in COMPANIES.items()})
+    return {ticker: ratio_engine.build_company_record(ticker, info, series[ticker])
+            for ticker, info in COMPANIES.items()}
+
+
+@pytest.fixture(scope='session')
+def api_server(tmp_path_factory):
+    """
+    The api_server module, with every file it reads or writes pointed into a scratch directory.
+    It is imported once per session, so tests publish the snapshot they need themselves.
+    """
+    workdir = tmp_path_factory.mktemp('api')
+    os.environ.update({
+        'BEI_SNAPSHOT_FILE': str(workdir / 'bei_financial_data.snap'),
+        'BEI_HISTORY_DIR': str(workdir / 'snapshot_history'),
+        'BEI_STATEMENT_CACHE_DIR': str(workdir / 'statement_cache'),
+        'BEI_REFRESH_STATE_FILE': str(workdir / 'refresh_state.json'),
+        'BEI_UNIVERSE_FILE': str(workdir / 'idx_universe.csv'),
+        'BEI_EXPORT_JSON': '0',
+    })
+    import api_server
+    return api_server
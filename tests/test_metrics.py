@@ -0,0 +1,24 @@
+from metrics import Registry
+
+
+def test_counter_advances_to_running_total():
+    registry = Registry()
+    hits = registry.counter('bei_cache_hits_total', 'Cache hits since start', ['cache'])
+    hits.advance_to(5, cache='response')
+    hits.advance_to(3, cache='response')  # A stale total never lowers a counter
+    assert hits.value(cache='response') == 5
+    rendered = registry.render()
+    assert '# TYPE bei_cache_hits_total counter' in rendered
+    assert 'bei_cache_hits_total{cache="response"} 5' in rendered
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('bei_latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+    rendered = registry.render()
+    assert 'bei_latency_seconds_bucket{le="0.1"} 1' in rendered
+    assert 'bei_latency_seconds_bucket{le="1"} 2' in rendered
+    assert 'bei_latency_seconds_bucket{le="+Inf"} 3' in rendered
+    assert 'bei_latency_seconds_count 3' in rendered
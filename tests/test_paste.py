@@ -0,0 +1,100 @@
+import pandas as pd
+import pytest
+
+import paste
+import ratio_engine
+from benchmarks.fixtures import offline_yfinance, synthetic_statements
+from refresh_planner import RefreshPlanner
+
+UNIVERSE = {
+    'AAAA.JK': {'name': 'Alpha', 'sector': 'Energy'},
+    'BBBB.JK': {'name': 'Beta', 'sector': 'Banking'},
+    'CCCC.JK': {'name': 'Gamma', 'sector': 'Retail'},
+}
+
+
+@pytest.fixture
+def yfinance():
+    with offline_yfinance(UNIVERSE) as ticker_class:
+        yield ticker_class
+
+
+@pytest.fixture
+def scraper():
+    return paste.BEIDataScraper(max_workers=2, requests_per_second=1000, companies=UNIVERSE)
+
+
+def malformed(ticker, sector):
+    statements = synthetic_statements(ticker, sector)
+    balance_sheet = statements['balance_sheet']
+    statements['balance_sheet'] = pd.concat([balance_sheet, balance_sheet.iloc[:, :1]], axis=1)
+    return statements
+
+
+def test_malformed_ticker_in_full_scrape(yfinance, scraper):
+    yfinance.recorded = {'CCCC.JK': malformed('CCCC.JK', 'Retail')}
+    data = scraper.get_all_companies_data()
+    assert list(data) == ['AAAA.JK', 'BBBB.JK']
+    assert all(data[ticker]['all_periods'] for ticker in data)
+
+
+def test_malformed_ticker_in_incremental_refresh(yfinance, scraper, tmp_path):
+    yfinance.recorded = {'CCCC.JK': malformed('CCCC.JK', 'Retail')}
+    planner = RefreshPlanner(str(tmp_path / 'refresh_state.json'))
+    data, changed, fetch_state = scraper.refresh_incremental({}, planner)
+    assert list(data) == ['AAAA.JK', 'BBBB.JK']
+    assert changed == ['AAAA.JK', 'BBBB.JK']
+    assert sorted(fetch_state) == ['AAAA.JK', 'BBBB.JK']
+
+
+def test_failing_record_keeps_previous_data(yfinance, scraper, tmp_path, monkeypatch):
+    previous = {ticker: {'ticker': ticker, 'stale': True} for ticker in UNIVERSE}
+    build_company_record = ratio_engine.build_company_record
+
+    def failing(ticker, info, series):
+        if ticker == 'BBBB.JK':
+            raise RuntimeError('cannot format')
+        return build_company_record(ticker, info, series)
+    monkeypatch.setattr(ratio_engine, 'build_company_record', failing)
+
+    planner = RefreshPlanner(str(tmp_path / 'refresh_state.json'))
+    data, changed, fetch_state = scraper.refresh_incremental(previous, planner, force=True)
+    assert data['BBBB.JK'] == previous['BBBB.JK']
+    assert not data['AAAA.JK'].get('stale') and not data['CCCC.JK'].get('stale')
+    assert changed == ['AAAA.JK', 'CCCC.JK']
+    assert sorted(fetch_state) == ['AAAA.JK', 'CCCC.JK']  # BBBB.JK is refetched next cycle
+
+
+def test_cache_rebuild_keeps_uncached_tickers(yfinance, tmp_path):
+    from statement_cache import StatementCache
+    scraper = paste.BEIDataScraper(max_workers=2, requests_per_second=1000, companies=UNIVERSE,
+                                   cache=StatementCache(str(tmp_path / 'cache')))
+    data = scraper.get_all_companies_data()
+    scraper.cache.invalidate('BBBB.JK')
+    current = dict(data, **{'ZZZZ.JK': {'ticker': 'ZZZZ.JK'}})  # Delisted since
+    current['AAAA.JK'] = dict(data['AAAA.JK'], name='Stale')
+
+    rebuilt, changed = scraper.refresh_from_cache(current)
+    assert list(rebuilt) == ['AAAA.JK', 'BBBB.JK', 'CCCC.JK']
+    assert rebuilt['AAAA.JK'] == data['AAAA.JK']
+    assert rebuilt['BBBB.JK'] == data['BBBB.JK']  # Not cached, kept as it was
+    assert changed == ['AAAA.JK', 'ZZZZ.JK']
+
+    current['CCCC.JK'] = dict(data['CCCC.JK'], name='Stale')
+    rebuilt, changed = scraper.refresh_from_cache(current, only=['CCCC.JK'])
+    assert changed == ['CCCC.JK', 'ZZZZ.JK']
+    assert rebuilt['AAAA.JK']['name'] == 'Stale'  # Outside `only`
+
+
+def test_sector_change_recomputes_existing_record(yfinance, scraper, tmp_path):
+    planner = RefreshPlanner(str(tmp_path / 'refresh_state.json'))
+    data, _, fetch_state = scraper.refresh_incremental({}, planner)
+    planner.commit(fetch_state)
+    assert not planner.due_tickers(UNIVERSE)
+
+    # A listing file that files the bank under 'Financials' produced non-bank records
+    stale = dict(data, **{'BBBB.JK': dict(data['BBBB.JK'], sector='Financials')})
+    data, changed, _ = scraper.refresh_incremental(stale, planner)
+    assert changed == ['BBBB.JK']
+    assert data['BBBB.JK']['sector'] == 'Banking'
+    assert 'loanToDepositRatio' in data['BBBB.JK']['ratios']['liquidity']
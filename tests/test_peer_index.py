@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+import peer_index
+from peer_index import MIN_SHARED_RATIOS, PeerIndex, standardize
+from ratio_store import RatioStore
+
+RATIOS = ['profitability.roe', 'profitability.roa', 'profitability.npm', 'leverage.der', 'liquidity.cr']
+SECTORS = ['Energy', 'Banking', 'Retail']
+
+
+@pytest.fixture
+def store():
+    rng = np.random.default_rng(7)
+    n = 40
+    values = rng.normal(10, 5, (n, len(RATIOS), 2))
+    values[rng.random(values.shape) < 0.15] = np.nan
+    values[3, :, :] = np.nan  # Reports nothing, so it has no peers
+    values[3, 0, :] = 1.0
+    return RatioStore(tickers=[f"T{i:03d}.JK" for i in range(n)], names=[''] * n,
+                      sectors=[SECTORS[i % 3] for i in range(n)], latest_periods=['2024'] * n,
+                      ratio_keys=RATIOS, periods=['2023', '2024'], values=values)
+
+
+def brute_force(store, ticker, k, same_sector=False, columns=None, period=None, min_shared=MIN_SHARED_RATIOS):
+    """
+    The peers of `ticker` found by comparing it with every other company one pair at a time
+    """
+    matrix = store.period_matrix(period)
+    if columns is not None:
+        matrix = matrix[:, columns]
+    features, mask = standardize(matrix)
+    row = store.ticker_index[ticker]
+    peers = []
+    for other in range(len(store.tickers)):
+        if other == row or (same_sector and store.sectors[other] != store.sectors[row]):
+            continue
+        shared = (mask[row] > 0) & (mask[other] > 0)
+        if shared.sum() < min_shared:
+            continue
+        peers.append((other, float(np.sqrt(np.mean((features[row, shared] - features[other, shared]) ** 2)))))
+    return sorted(peers, key=lambda peer: peer[1])[:k]
+
+
+def assert_same_peers(found, expected):
+    assert [row for row, _ in found] == [row for row, _ in expected]
+    assert np.allclose([d for _, d in found], [d for _, d in expected])
+
+
+def test_standardize_is_robust_and_masks_missing_values():
+    matrix = np.array([[1.0, np.nan], [2.0, 5.0], [3.0, 5.0], [1000.0, 5.0]])
+    features, mask = standardize(matrix)
+    assert mask.tolist() == [[1, 0], [1, 1], [1, 1], [1, 1]]
+    assert features[0, 1] == 0.0
+    assert features[3, 0] == peer_index.Z_CLIP  # The outlier is clipped
+    assert np.allclose(features[1:, 1], 0.0)  # A constant column does not divide by zero
+
+
+@pytest.mark.parametrize('same_sector', [False, True])
+def test_precomputed_neighbours_match_brute_force(store, monkeypatch, same_sector):
+    monkeypatch.setattr(peer_index, 'BLOCK_ROWS', 7)  # Several blocks, the last one partial
+    index = PeerIndex(store, neighbours=10)
+    for ticker in store.tickers:
+        assert_same_peers(index.query(ticker, 10, same_sector), brute_force(store, ticker, 10, same_sector))
+
+
+def test_custom_ratios_and_period_are_scanned(store):
+    index = PeerIndex(store, neighbours=5)
+    columns = [store.ratio_position(r) for r in ('roe', 'der')]
+    assert_same_peers(index.query('T010.JK', 8, ratios=['roe', 'der'], period='2023'),
+                      brute_force(store, 'T010.JK', 8, columns=columns, period='2023', min_shared=2))
+    # More peers than were precomputed
+    assert_same_peers(index.query('T010.JK', 20), brute_force(store, 'T010.JK', 20))
+
+
+def test_company_without_enough_ratios_has_no_peers(store):
+    index = PeerIndex(store)
+    assert index.query('T003.JK', 5) == []
+    assert all(row != 3 for ticker in store.tickers for row, _ in index.query(ticker, 50))
+    assert index.profile(3) == {'profitability.roe': 1.0}
+
+
+def test_unknown_ticker_or_ratio(store):
+    index = PeerIndex(store)
+    with pytest.raises(KeyError):
+        index.query('ZZZZ.JK')
+    with pytest.raises(KeyError):
+        index.query('T000.JK', ratios=['pbv'])
+
+
+def test_peers_endpoint(api_server, company_records):
+    api_server.publish_snapshot(company_records)
+    client = api_server.app.test_client()
+
+    response = client.get('/api/peers/aaaa.jk?k=3&same_sector=true')
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert [peer['ticker'] for peer in data['peers']] == ['BBBB.JK']
+    assert client.get('/api/peers/AAAA.JK?k=0').status_code == 400
+    assert client.get('/api/peers/AAAA.JK?ratios=pbv_unknown').status_code == 400
+    assert client.get('/api/peers/ZZZZ.JK').status_code == 404
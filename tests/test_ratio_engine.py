@@ -0,0 +1,60 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import ratio_engine
+from benchmarks.fixtures import synthetic_statements
+
+# Statements and the company records the per-ticker calculation in paste.py produced for
+# them before the vectorized engine replaced it (commit b8f037a), including banks, zero
+# denominators and a balance sheet without a liabilities line item
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'data', 'baseline_records.json')
+
+with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+    BASELINE = json.load(f)
+
+# The fields the baseline records had; the engine adds the quarterly and TTM series
+BASELINE_FIELDS = ('ticker', 'name', 'sector', 'latest_period', 'ratios', 'trends', 'all_periods')
+
+
+def _frame(data):
+    return pd.DataFrame(data['data'], index=data['index'], columns=pd.to_datetime(data['columns']))
+
+
+@pytest.mark.parametrize('ticker', sorted(BASELINE))
+def test_company_record_matches_baseline(ticker):
+    case = BASELINE[ticker]
+    statements = {ticker: {key: _frame(frame) for key, frame in case['statements'].items()}}
+    series = ratio_engine.calculate_series(statements, {ticker: case['company']['sector']},
+                                           granularities=('annual',))[ticker]
+    record = ratio_engine.build_company_record(ticker, case['company'], series)
+
+    # Compared as JSON so that key order and int/float types count too
+    assert json.dumps({field: record[field] for field in BASELINE_FIELDS}) == json.dumps(case['record'])
+
+
+def test_zero_denominator_is_int_zero():
+    ratios, undefined = ratio_engine.compute_ratio_frame(
+        pd.DataFrame({'a': [1.0, 0.0], 'b': [0.0, 4.0]}, index=['current_assets', 'current_liabilities']),
+        ratio_engine.select_ratios(['currentRatio']))
+    assert ratios.tolist() == [[0.0, 0.0]]
+    assert undefined.tolist() == [[True, False]]
+
+
+def test_malformed_ticker_does_not_empty_the_batch():
+    sectors = {'AAAA.JK': 'Energy', 'BBBB.JK': 'Banking', 'CCCC.JK': 'Energy'}
+    statements = {ticker: synthetic_statements(ticker, sector) for ticker, sector in sectors.items()}
+    # A duplicated period column makes the statement impossible to align
+    balance_sheet = statements['CCCC.JK']['balance_sheet']
+    statements['CCCC.JK']['balance_sheet'] = pd.concat([balance_sheet, balance_sheet.iloc[:, :1]], axis=1)
+
+    series = ratio_engine.calculate_series(statements, sectors)
+
+    assert series['CCCC.JK']['all_periods'] == {}
+    assert series['CCCC.JK']['quarterly_periods']  # Its quarterly statements are fine
+    for ticker in ('AAAA.JK', 'BBBB.JK'):
+        expected = ratio_engine.calculate_series({ticker: statements[ticker]}, sectors)[ticker]
+        assert series[ticker] == expected
+        assert len(series[ticker]['all_periods']) == 4
@@ -0,0 +1,73 @@
+import math
+
+import pytest
+
+from ratio_store import RatioStore, parse_filter
+
+
+def company(sector, latest, periods):
+    return {'name': f"{sector} company", 'sector': sector, 'latest_period': latest,
+            'all_periods': {period: {'profitability': {'roe': roe, 'npm': npm}, 'leverage': {'der': der}}
+                            for period, (roe, npm, der) in periods.items()}}
+
+
+DATA = {
+    'AAAA.JK': company('Energy', '2024', {'2024': (20.0, 10.0, 0.5), '2023': (12.0, 8.0, 0.7)}),
+    'BBBB.JK': company('Energy', '2024', {'2024': (8.0, 4.0, 1.5)}),
+    'CCCC.JK': company('Banking', '2023', {'2023': (15.0, 30.0, 6.0)}),
+    'DDDD.JK': company('Retail', '2024', {'2024': (None, 2.0, 0.9)}),
+}
+
+
+@pytest.fixture
+def store():
+    return RatioStore.from_snapshot(DATA)
+
+
+def test_parse_filter():
+    assert parse_filter('roe>15') == ('roe', '>', 15.0)
+    assert parse_filter(' leverage.der <= -0.5 ') == ('leverage.der', '<=', -0.5)
+    assert parse_filter('roe=>15') is None
+    assert parse_filter('sector=Mining') is None
+
+
+def test_layout(store):
+    assert store.ratio_keys == ['profitability.roe', 'profitability.npm', 'leverage.der']
+    assert store.periods == ['2023', '2024']
+    assert store.values.shape == (4, 3, 2)
+    assert store.ratio_position('der') == store.ratio_position('leverage.der') == 2
+    with pytest.raises(KeyError):
+        store.ratio_position('pbv')
+    # Each company's own latest period, and NaN where a ratio is missing
+    assert store.latest[store.ticker_index['CCCC.JK']].tolist() == [15.0, 30.0, 6.0]
+    assert math.isnan(store.latest[store.ticker_index['DDDD.JK'], 0])
+
+
+def test_screen_filters_sectors_and_sorts(store):
+    tickers = lambda rows: [store.tickers[row] for row in rows]
+
+    assert tickers(store.screen([('roe', '>', 10)])) == ['AAAA.JK', 'CCCC.JK']
+    assert tickers(store.screen([('der', '<', 1)], sectors=['energy'])) == ['AAAA.JK']
+    assert tickers(store.screen(sort='roe', descending=True)) == ['AAAA.JK', 'CCCC.JK', 'BBBB.JK', 'DDDD.JK']
+    assert tickers(store.screen(sort='roe')) == ['BBBB.JK', 'CCCC.JK', 'AAAA.JK', 'DDDD.JK']  # NaN sorts last
+    assert tickers(store.screen(sort='npm', descending=True, limit=2)) == ['CCCC.JK', 'AAAA.JK']
+    assert tickers(store.screen([('roe', '>=', 12)], period='2023')) == ['AAAA.JK', 'CCCC.JK']
+    with pytest.raises(KeyError):
+        store.screen(period='2019')
+
+
+def test_row_ratios_skip_missing_values(store):
+    assert store.row_ratios(store.ticker_index['DDDD.JK']) == {'profitability': {'npm': 2.0}, 'leverage': {'der': 0.9}}
+    assert store.row_ratios(store.ticker_index['BBBB.JK'], '2023') == {}
+
+
+def test_screen_endpoint(api_server):
+    api_server.publish_snapshot(DATA)
+    client = api_server.app.test_client()
+
+    response = client.get('/api/screen?roe>5&sector=Energy&sort=-roe&limit=1')
+    assert response.status_code == 200
+    assert [row['ticker'] for row in response.get_json()['data']] == ['AAAA.JK']
+    assert client.get('/api/screen?where=npm>5,der<1').get_json()['count'] == 1
+    assert client.get('/api/screen?roe>>5').status_code == 400
+    assert client.get('/api/screen?pbv>1').status_code == 400
@@ -0,0 +1,110 @@
+import threading
+
+import pytest
+
+from refresh_jobs import RefreshJobManager
+
+
+class BlockingRun:
+    """
+    A refresh body that records the options it ran with and holds every job until released
+    """
+    def __init__(self):
+        self.ran = []
+        self.release = threading.Event()
+
+    def __call__(self, options, job):
+        self.ran.append(options)
+        if not self.release.wait(5):
+            raise TimeoutError("Job was never released")
+        if options.get('fail'):
+            raise RuntimeError("Scrape failed")
+        return {'tickers': options.get('tickers')}
+
+
+@pytest.fixture
+def run():
+    run = BlockingRun()
+    yield run
+    run.release.set()
+
+
+def test_same_work_joins_the_running_job(run):
+    jobs = RefreshJobManager(run)
+    first, created = jobs.submit({'full': True, 'trigger': 'manual'})
+    joined, joined_created = jobs.submit({'full': True, 'trigger': 'schedule'})
+
+    assert created and not joined_created
+    assert joined is first
+    run.release.set()
+    assert first.wait(5)
+    assert first.status == 'succeeded'
+    assert len(run.ran) == 1
+
+
+def test_other_work_is_queued_and_runs_in_order(run):
+    jobs = RefreshJobManager(run)
+    first, _ = jobs.submit({})
+    second, created = jobs.submit({'tickers': ['BBBB.JK', 'AAAA.JK']})
+    joined, joined_created = jobs.submit({'tickers': ['AAAA.JK', 'BBBB.JK']})
+
+    assert created and second.status == 'queued'
+    assert joined is second and not joined_created  # Ticker order does not change the work
+    assert jobs.queued() == [second]
+    run.release.set()
+    assert second.wait(5)
+    assert [options.get('tickers') for options in run.ran] == [None, ['BBBB.JK', 'AAAA.JK']]
+    assert first.finished_at <= second.finished_at
+    assert second.result == {'tickers': ['BBBB.JK', 'AAAA.JK']}
+    assert jobs.current() is None
+
+
+def test_failed_job_reports_error_and_next_job_still_runs(run):
+    jobs = RefreshJobManager(run)
+    failing, _ = jobs.submit({'fail': True})
+    following, _ = jobs.submit({'full': True})
+    run.release.set()
+
+    assert following.wait(5)
+    assert failing.status == 'failed'
+    assert failing.error == "Scrape failed"
+    assert following.status == 'succeeded'
+
+
+def test_history_keeps_unfinished_jobs(run):
+    jobs = RefreshJobManager(run, history=1)
+    first, _ = jobs.submit({})
+    second, _ = jobs.submit({'full': True})
+
+    assert jobs.get(first.id) is first and jobs.get(second.id) is second
+    run.release.set()
+    assert second.wait(5)
+    third, _ = jobs.submit({'cache_only': True})
+    assert third.wait(5)
+    assert jobs.get(first.id) is None
+    assert jobs.get(third.id) is third
+
+
+def test_refresh_endpoint_answers_202_and_reports_status(api_server, run, monkeypatch):
+    monkeypatch.setattr(api_server, 'refresh_jobs', RefreshJobManager(run))
+    client = api_server.app.test_client()
+
+    response = client.post('/api/refresh', json={'tickers': ['bbca']})
+    assert response.status_code == 202
+    job = response.get_json()['data']
+    assert response.headers['Location'] == f"/api/refresh/{job['job_id']}"
+    assert job['status'] == 'running'
+    assert job['options']['tickers'] == ['BBCA.JK']
+
+    joined = client.post('/api/refresh', json={'tickers': ['BBCA.JK']})
+    assert joined.status_code == 202
+    assert joined.get_json()['data']['job_id'] == job['job_id']
+    assert joined.get_json()['message'] == 'An identical refresh is already in progress'
+
+    assert client.get(response.headers['Location']).get_json()['data']['status'] == 'running'
+    run.release.set()
+    api_server.refresh_jobs.get(job['job_id']).wait(5)
+    status = client.get(response.headers['Location']).get_json()['data']
+    assert status['status'] == 'succeeded'
+    assert status['result'] == {'tickers': ['BBCA.JK']}
+    assert client.get('/api/refresh/unknown').status_code == 404
@@ -0,0 +1,71 @@
+from datetime import datetime
+
+import pandas as pd
+
+from refresh_planner import RefreshPlanner, fingerprint_statements
+
+DAY = 86400
+
+
+def statements(annual_end='2024-12-31', quarter_end='2025-06-30', scale=1.0):
+    annual = pd.DataFrame([[1.0 * scale, 2.0]], index=['Total Assets'],
+                          columns=pd.DatetimeIndex([annual_end, '2023-12-31']))
+    quarterly = pd.DataFrame([[3.0, 4.0]], index=['Total Assets'],
+                             columns=pd.DatetimeIndex([quarter_end, '2025-03-31']))
+    return {'balance_sheet': annual, 'quarterly_balance_sheet': quarterly}
+
+
+def at(date: str) -> float:
+    return datetime.fromisoformat(date).timestamp()
+
+
+def planner_with_fetch(tmp_path, fetched_at, data=None, **kwargs):
+    kwargs.setdefault('max_age', 30 * DAY)
+    planner = RefreshPlanner(str(tmp_path / 'refresh_state.json'), **kwargs)
+    changed, entry = planner.check_fetch('AAAA.JK', data or statements(), now=at(fetched_at))
+    assert changed
+    planner.commit({'AAAA.JK': entry})
+    return planner
+
+
+def test_never_fetched_is_due(tmp_path):
+    planner = RefreshPlanner(str(tmp_path / 'refresh_state.json'))
+    assert planner.due_tickers(['AAAA.JK']) == ['AAAA.JK']
+
+
+def test_max_age(tmp_path):
+    planner = planner_with_fetch(tmp_path, '2025-07-01')
+    assert not planner.is_due('AAAA.JK', now=at('2025-07-20'))
+    assert planner.is_due('AAAA.JK', now=at('2025-08-01'))
+
+
+def test_quarterly_filing_window(tmp_path):
+    # Latest quarter 2025-06-30: the Q3 report is expected 45 days after 2025-09-30
+    planner = planner_with_fetch(tmp_path, '2025-10-20', max_age=365 * DAY)
+    assert not planner.is_due('AAAA.JK', now=at('2025-11-13'))
+    assert planner.is_due('AAAA.JK', now=at('2025-11-15'))
+
+
+def test_annual_filing_window_polls_daily(tmp_path):
+    planner = planner_with_fetch(tmp_path, '2025-12-31T12:00', statements(quarter_end='2025-12-31'),
+                                 max_age=365 * DAY)
+    assert not planner.is_due('AAAA.JK', now=at('2025-12-31T18:00'))  # Polled at most once a day
+    assert planner.is_due('AAAA.JK', now=at('2026-01-01T13:00'))
+
+
+def test_fingerprint_and_commit(tmp_path):
+    planner = planner_with_fetch(tmp_path, '2025-07-01')
+    changed, entry = planner.check_fetch('AAAA.JK', statements(), now=at('2025-07-02'))
+    assert not changed
+    assert entry['latest_quarter_end'] == '2025-06-30T00:00:00'
+    changed, _ = planner.check_fetch('AAAA.JK', statements(scale=2.0))
+    assert changed
+    # Nothing is recorded until commit, and committed state survives a restart
+    assert planner.state['AAAA.JK']['last_fetch'] == at('2025-07-01')
+    assert RefreshPlanner(planner.state_file).state == planner.state
+
+
+def test_fingerprint_ignores_statements_not_fetched():
+    data = statements()
+    assert fingerprint_statements(data) == fingerprint_statements(dict(data))
+    assert fingerprint_statements(data) != fingerprint_statements(dict(data, cashflow=pd.DataFrame()))
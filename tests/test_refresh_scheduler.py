@@ -0,0 +1,69 @@
+import threading
+
+from refresh_scheduler import ShardedRefreshScheduler
+from universe import shard_of
+
+TICKERS = [f"T{i:03d}.JK" for i in range(60)]
+
+
+def scheduler(**kwargs):
+    kwargs.setdefault('run_batch', lambda tickers, options: None)
+    return ShardedRefreshScheduler(lambda: list(TICKERS), **kwargs)
+
+
+def test_shards_partition_the_universe():
+    shards = scheduler(shards=4)
+    tickers = [shards.shard_tickers(shard) for shard in range(4)]
+
+    assert sorted(t for shard in tickers for t in shard) == TICKERS
+    assert all(tickers)
+    assert shards.slot == 900
+    # A ticker keeps its shard however the universe changes
+    assert all(shard_of(t, 4) == shard for shard, members in enumerate(tickers) for t in members)
+
+
+def test_most_requested_tickers_go_first_within_a_shard():
+    shards = scheduler(shards=1)
+    shards.prioritize(['T010.JK', 'T020.JK', 'T020.JK'])
+    assert shards.shard_tickers(0)[:2] == ['T020.JK', 'T010.JK']
+
+
+def test_prioritize_queues_only_stale_members_once():
+    shards = scheduler(is_stale=lambda ticker: ticker != 'T001.JK')
+
+    assert shards.prioritize(['T000.JK', 'T001.JK', 'NOPE.JK']) == ['T000.JK']
+    assert shards.prioritize(['T000.JK']) == []  # Already queued
+    assert shards.demand['T000.JK'] == 2 and shards.demand['T001.JK'] == 1
+    assert 'NOPE.JK' not in shards.demand
+    assert shards.status()['priority_queued'] == 1
+
+
+def test_priority_batch_waits_for_delay_and_is_capped():
+    shards = scheduler(priority_delay=5.0, max_priority_batch=2)
+    shards.prioritize(['T000.JK', 'T001.JK'])
+    shards.prioritize(['T002.JK', 'T002.JK'])
+    queued_at = min(shards._priority.values())
+
+    assert shards._take_priority_batch(queued_at + 1) == []
+    assert shards._take_priority_batch(queued_at + 5) == ['T002.JK', 'T000.JK']
+    assert shards._take_priority_batch(queued_at + 5) == ['T001.JK']
+
+
+def test_requested_tickers_are_refreshed_ahead_of_the_shards():
+    ran = []
+    done = threading.Event()
+
+    def run_batch(tickers, options):
+        ran.append((tickers, options))
+        done.set()
+
+    shards = scheduler(run_batch=run_batch, interval=3600, priority_delay=0)
+    thread = shards.start()
+    try:
+        shards.prioritize(['T005.JK'])
+        assert done.wait(5)
+    finally:
+        shards.stop()
+        thread.join(5)
+    assert ran == [(['T005.JK'], {'trigger': 'priority'})]
+    assert shards.status()['last_run']['trigger'] == 'priority'
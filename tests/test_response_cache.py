@@ -0,0 +1,119 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import response_cache
+from response_cache import MIN_COMPRESS_BYTES, ResponseCache, negotiate_encoding
+
+
+def test_hits_and_misses_are_not_lost_under_concurrency():
+    cache = ResponseCache()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: cache.get_or_build(1, f"key-{i % 10}", lambda: b'{}'), range(2000)))
+    assert cache.hits + cache.misses == 2000
+    assert cache.misses >= 10
+
+
+def test_body_is_built_once_per_version():
+    cache = ResponseCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return b'{"version": %d}' % len(builds)
+
+    body, etag, encoding = cache.get_or_build(1, '/api/companies', build)
+    assert cache.get_or_build(1, '/api/companies', build) == (body, etag, 'identity')
+    assert encoding == 'identity' and len(builds) == 1
+
+    newer, newer_etag, _ = cache.get_or_build(2, '/api/companies', build)
+    assert newer != body and newer_etag != etag
+    assert len(builds) == 2
+
+
+def test_etag_depends_on_version_key_and_encoding():
+    etag = ResponseCache.make_etag(7, '/api/companies')
+    assert etag.startswith('7-')
+    assert ResponseCache.make_etag(7, '/api/companies') == etag
+    assert ResponseCache.make_etag(8, '/api/companies') != etag
+    assert ResponseCache.make_etag(7, '/api/sectors') != etag
+    assert ResponseCache.make_etag(7, '/api/companies', 'gzip') == etag + '-gzip'
+
+
+def test_least_recently_used_bodies_are_evicted():
+    cache = ResponseCache(max_bytes=250)
+    for key in ('a', 'b', 'c'):
+        cache.get_or_build(1, key, lambda: b'x' * 100)
+    assert cache.size_bytes == 200
+
+    cache.get_or_build(1, 'b', lambda: b'rebuilt')
+    assert cache.hits == 1  # 'a' was evicted, 'b' and 'c' remain
+    cache.get_or_build(1, 'a', lambda: b'y' * 100)
+    assert cache.misses == 4
+
+
+def test_unchanged_snapshot_answers_304(api_server, company_records):
+    api_server.publish_snapshot(company_records)
+    client = api_server.app.test_client()
+
+    response = client.get('/api/companies')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'public, no-cache'
+
+    revalidated = client.get('/api/companies', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+    api_server.publish_snapshot(company_records)
+    assert client.get('/api/companies', headers={'If-None-Match': etag}).status_code == 200
+
+
+@pytest.mark.parametrize('accept_encoding, expected', [
+    ('', 'identity'),
+    ('gzip', 'gzip'),
+    ('GZIP;q=0.5, identity', 'gzip'),
+    ('gzip;q=0', 'identity'),
+    ('gzip;q=bogus', 'identity'),
+    ('deflate, *;q=0.1', response_cache.ENCODINGS[0]),
+    ('compress', 'identity'),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_gzip_variant_is_compressed_once_and_cached():
+    cache = ResponseCache()
+    payload = b'{"ratio": 1.5}' * 200
+    body, etag, encoding = cache.get_or_build(1, 'key', lambda: payload, 'gzip')
+
+    assert encoding == 'gzip'
+    assert gzip.decompress(body) == payload
+    assert etag == ResponseCache.make_etag(1, 'key', 'gzip')
+    assert cache.get_or_build(1, 'key', lambda: b'unused', 'gzip') == (body, etag, 'gzip')
+    assert cache.get_or_build(1, 'key', lambda: b'unused') == (payload, ResponseCache.make_etag(1, 'key'), 'identity')
+    assert cache.misses == 1 and cache.hits == 2
+
+
+def test_small_bodies_are_not_compressed():
+    cache = ResponseCache()
+    body, etag, encoding = cache.get_or_build(1, 'key', lambda: b'x' * (MIN_COMPRESS_BYTES - 1), 'gzip')
+    assert encoding == 'identity'
+    assert body == b'x' * (MIN_COMPRESS_BYTES - 1)
+    assert etag == ResponseCache.make_etag(1, 'key')
+
+
+def test_endpoint_serves_gzip_when_accepted(api_server, company_records):
+    api_server.publish_snapshot(company_records)
+    client = api_server.app.test_client()
+
+    plain = client.get('/api/company/AAAA.JK')
+    compressed = client.get('/api/company/AAAA.JK', headers={'Accept-Encoding': 'gzip'})
+    assert plain.headers.get('Content-Encoding') is None
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert client.get('/api/company/AAAA.JK', headers={'Accept-Encoding': 'gzip',
+                                                       'If-None-Match': compressed.headers['ETag']}).status_code == 304
@@ -0,0 +1,127 @@
+import json
+import threading
+
+import pytest
+
+from snapshot_events import SnapshotEvents, format_event
+
+
+def test_format_event():
+    assert format_event('snapshot', {'version': 3, 'changed': ['AAAA.JK']}, 3) == \
+        'id: 3\nevent: snapshot\ndata: {"version":3,"changed":["AAAA.JK"]}\n\n'
+    assert format_event('hello', {}) == 'event: hello\ndata: {}\n\n'
+
+
+def test_since_returns_missed_events_or_none_when_unknown():
+    events = SnapshotEvents(backlog=3)
+    assert events.since(0) == []
+    for version in range(1, 6):
+        events.publish(version, {'version': version})
+    events.publish(4, {'version': 4})  # Not newer than the last event, ignored
+
+    assert events.since(2) == [(3, {'version': 3}), (4, {'version': 4}), (5, {'version': 5})]
+    assert events.since(4) == [(5, {'version': 5})]
+    assert events.since(5) == []
+    assert events.since(1) is None  # Event 2 was dropped from the backlog
+    assert events.published == 5
+
+
+def test_events_before_the_first_publication_are_unknown():
+    events = SnapshotEvents()
+    events.publish(100, {})
+    assert events.since(99) is None
+    assert events.since(100) == []
+
+
+def test_wait_wakes_up_on_publish():
+    events = SnapshotEvents()
+    events.publish(1, {})
+    assert events.wait(1, timeout=0.01) == []
+
+    timer = threading.Timer(0.05, events.publish, args=(2, {'version': 2}))
+    timer.start()
+    assert events.wait(1, timeout=5) == [(2, {'version': 2})]
+    timer.join()
+
+
+def test_subscriber_cap():
+    events = SnapshotEvents(max_subscribers=2)
+    assert events.subscribe() and events.subscribe()
+    assert not events.subscribe()
+    events.unsubscribe()
+    assert events.subscribe()
+    assert events.subscribers == 2
+
+
+@pytest.fixture
+def stream(api_server, monkeypatch):
+    """
+    Opens /api/stream and returns its first two messages: the retry hint and the opening events
+    """
+    monkeypatch.setattr(api_server, 'snapshot_events', SnapshotEvents(max_subscribers=1))
+    client = api_server.app.test_client()
+    opened = []
+
+    def open_stream(last_event_id=None):
+        headers = {'Last-Event-ID': str(last_event_id)} if last_event_id is not None else {}
+        response = client.get('/api/stream', headers=headers, buffered=False)
+        opened.append(response)
+        if response.status_code != 200:
+            return response, []
+        chunks = iter(response.response)
+        return response, [next(chunks).decode('utf-8') for _ in range(2)]
+
+    yield open_stream
+    for response in opened:
+        response.close()
+
+
+def messages(chunk):
+    parsed = []
+    for message in chunk.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in message.split('\n'))
+        parsed.append((int(fields['id']), fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def test_stream_opens_with_hello(api_server, company_records, stream):
+    published = api_server.publish_snapshot(company_records)
+    response, (retry, hello) = stream()
+
+    assert response.mimetype == 'text/event-stream'
+    assert retry == f"retry: {api_server.STREAM_RETRY_MS}\n\n"
+    assert messages(hello) == [(published.version, 'hello', {
+        'version': published.version, 'last_updated': published.last_updated, 'companies': len(company_records)})]
+
+
+def test_stream_resumes_from_last_event_id(api_server, company_records, stream):
+    first = api_server.publish_snapshot(company_records)
+    second = api_server.publish_snapshot(company_records, changed=['AAAA.JK'])
+    third = api_server.publish_snapshot(company_records, changed=['BBBB.JK', 'CCCC.JK'])
+
+    _, (_, missed) = stream(first.version)
+    assert [(version, event, data['changed']) for version, event, data in messages(missed)] == [
+        (second.version, 'snapshot', ['AAAA.JK']), (third.version, 'snapshot', ['BBBB.JK', 'CCCC.JK'])]
+
+
+def test_stream_resumed_from_unknown_version_reports_everything_changed(api_server, company_records, stream):
+    api_server.publish_snapshot(company_records)
+    latest = api_server.publish_snapshot(company_records, changed=['AAAA.JK'])
+
+    _, (_, catch_all) = stream(1)
+    assert messages(catch_all) == [(latest.version, 'snapshot', {
+        'version': latest.version, 'last_updated': latest.last_updated,
+        'companies': len(company_records), 'changed': None})]
+
+
+def test_stream_over_the_subscriber_cap_gets_503(api_server, company_records, stream):
+    api_server.publish_snapshot(company_records)
+    first, _ = stream()
+    assert first.status_code == 200
+
+    rejected, _ = stream()
+    assert rejected.status_code == 503
+    assert rejected.headers['Retry-After'] == str(api_server.STREAM_RETRY_MS // 1000)
+
+    first.close()
+    assert api_server.snapshot_events.subscribers == 0
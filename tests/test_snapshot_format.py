@@ -0,0 +1,77 @@
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from snapshot_format import (LazyCompanies, SnapshotFormatError, encode_snapshot, load_snapshot,
+                             restore_derived, save_snapshot)
+
+
+@pytest.fixture
+def records(company_records):
+    # A deep copy with one zero-denominator ratio, which the engine reports as the int 0
+    records = json.loads(json.dumps(company_records))
+    company = records['AAAA.JK']
+    latest = company['all_periods'][company['latest_period']]
+    category = next(iter(latest))
+    latest[category][next(iter(latest[category]))] = 0
+    records['AAAA.JK'] = restore_derived(company)
+    return records
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_round_trip_matches_the_records(records, tmp_path, mmap):
+    path = str(tmp_path / 'data.snap')
+    updated_at = datetime(2025, 7, 1, 12, 30)
+    save_snapshot(records, path, version=42, updated_at=updated_at, changed=['BBBB.JK'])
+
+    snapshot_file = load_snapshot(path, mmap=mmap)
+    assert snapshot_file.version == 42
+    assert snapshot_file.updated_at == updated_at
+    assert snapshot_file.changed == ['BBBB.JK']
+    assert snapshot_file.tickers == list(records)
+    for ticker, record in records.items():
+        # Compared as JSON so that key order and int/float types count too
+        assert json.dumps(snapshot_file.company(ticker)) == json.dumps(record)
+
+
+def test_ratio_store_reads_the_mapped_matrix(records, tmp_path):
+    path = str(tmp_path / 'data.snap')
+    save_snapshot(records, path)
+    snapshot_file = load_snapshot(path)
+    store = snapshot_file.ratio_store()
+
+    assert isinstance(snapshot_file.values(), np.memmap)
+    assert store.tickers == list(records)
+    assert store.values.shape == (len(records), len(snapshot_file.ratio_keys),
+                                  len(snapshot_file.series_periods()))
+
+
+def test_lazy_companies_decode_on_first_access(records, tmp_path):
+    path = str(tmp_path / 'data.snap')
+    save_snapshot(records, path)
+    companies = LazyCompanies(load_snapshot(path))
+
+    assert len(companies) == len(records)
+    assert list(companies) == list(records)
+    assert 'AAAA.JK' in companies and 'ZZZZ.JK' not in companies
+    assert companies._decoded == {}
+    assert companies['BBBB.JK'] is companies['BBBB.JK']
+    assert list(companies._decoded) == ['BBBB.JK']
+    assert companies.get('ZZZZ.JK') is None
+    with pytest.raises(KeyError):
+        companies['ZZZZ.JK']
+
+
+def test_rejects_files_that_are_not_snapshots(tmp_path):
+    path = tmp_path / 'data.snap'
+    path.write_bytes(b'{"AAAA.JK": {}}')
+    with pytest.raises(SnapshotFormatError):
+        load_snapshot(str(path))
+
+    payload = bytearray(encode_snapshot({}))
+    payload[8] = 99  # Format version from the future
+    path.write_bytes(bytes(payload))
+    with pytest.raises(SnapshotFormatError):
+        load_snapshot(str(path))
@@ -0,0 +1,103 @@
+import os
+from datetime import datetime, timedelta
+
+from snapshot_history import INDEX_FILE, SEGMENT_SUFFIX, SnapshotHistory
+
+START = datetime(2024, 1, 1, 12, 0)
+
+
+def company(ticker, roe):
+    return {
+        'ticker': ticker,
+        'name': ticker,
+        'sector': 'Unknown',
+        'latest_period': '2023',
+        'all_periods': {'2023': {'profitability': {'roe': roe}}},
+    }
+
+
+def roe(record):
+    return record['ratios']['profitability']['roe']
+
+
+def record_days(history, days):
+    """
+    Records one version a day: day n publishes AAAA with roe n, and BBBB until day 2.
+    """
+    for day in days:
+        data = {'AAAA.JK': company('AAAA.JK', day)}
+        if day < 2:
+            data['BBBB.JK'] = company('BBBB.JK', 10 + day)
+        history.record(data, version=day + 1, updated_at=START + timedelta(days=day))
+
+
+def test_as_of_between_versions(tmp_path):
+    history = SnapshotHistory(str(tmp_path))
+    record_days(history, range(3))
+
+    assert roe(history.company('AAAA.JK', START + timedelta(days=1, hours=6))) == 1
+    assert roe(history.company('AAAA.JK', START + timedelta(days=2))) == 2
+    assert roe(history.company('BBBB.JK', START + timedelta(days=1, hours=6))) == 11
+    # Removed on day 2
+    assert history.company('BBBB.JK', START + timedelta(days=5)) is None
+    assert sorted(history.view(START + timedelta(days=1))) == ['AAAA.JK', 'BBBB.JK']
+    assert sorted(history.view(START + timedelta(days=2))) == ['AAAA.JK']
+
+
+def test_as_of_before_first_version(tmp_path):
+    history = SnapshotHistory(str(tmp_path))
+    record_days(history, range(2))
+
+    assert history.company('AAAA.JK', START - timedelta(seconds=1)) is None
+    assert len(history.view(START - timedelta(days=1))) == 0
+
+
+def test_unchanged_records_are_skipped(tmp_path):
+    history = SnapshotHistory(str(tmp_path))
+    data = {'AAAA.JK': company('AAAA.JK', 1)}
+    assert history.record(data, version=1, updated_at=START) == 1
+    assert history.record(data, version=2, updated_at=START + timedelta(days=1)) == 0
+    assert [v['version'] for v in history.history('AAAA.JK')] == [1]
+
+
+def test_compaction_folds_expired_versions(tmp_path):
+    history = SnapshotHistory(str(tmp_path), retention_days=10)
+    record_days(history, range(6))
+    segments_before = {name for name in os.listdir(tmp_path) if name.endswith(SEGMENT_SUFFIX)}
+
+    # Days 0-3 are past retention on day 14 and fold into one base version at day 3
+    assert history.compact(now=START + timedelta(days=14))
+    assert history.status()['versions'] == 3
+    assert history.retained_from() == (START + timedelta(days=3)).isoformat()
+    assert [v['version'] for v in history.history('AAAA.JK')] == [4, 5, 6]
+    assert not segments_before & set(os.listdir(tmp_path))
+
+    assert roe(history.company('AAAA.JK', START + timedelta(days=3, hours=1))) == 3
+    assert roe(history.company('AAAA.JK', START + timedelta(days=5))) == 5
+    assert history.company('AAAA.JK', START + timedelta(days=2)) is None  # Folded away
+    assert history.company('BBBB.JK', START + timedelta(days=4)) is None
+
+    reopened = SnapshotHistory(str(tmp_path))
+    assert [roe(v['company']) for v in reopened.history('AAAA.JK')] == [3, 4, 5]
+
+
+def test_compaction_keeps_everything_within_retention(tmp_path):
+    history = SnapshotHistory(str(tmp_path), retention_days=10)
+    record_days(history, range(3))
+    assert not history.compact(now=START + timedelta(days=5))
+    assert history.status()['versions'] == 3
+
+
+def test_recovers_from_truncated_index_line(tmp_path):
+    history = SnapshotHistory(str(tmp_path))
+    record_days(history, range(2))
+    # A recorder that died while appending leaves half an index line behind
+    with open(tmp_path / INDEX_FILE, 'a', encoding='utf-8') as f:
+        f.write('{"version":3,"updated_at":"2024-01-03T12:')
+
+    reopened = SnapshotHistory(str(tmp_path))
+    assert reopened.status()['versions'] == 2
+    assert roe(reopened.company('AAAA.JK', START + timedelta(days=1))) == 1
+
+    reopened.record({'AAAA.JK': company('AAAA.JK', 7)}, version=3, updated_at=START + timedelta(days=2))
+    assert [roe(v['company']) for v in SnapshotHistory(str(tmp_path)).history('AAAA.JK')] == [0, 1, 7]
@@ -0,0 +1,93 @@
+import os
+
+import pandas as pd
+import pytest
+
+import statement_cache
+from benchmarks.fixtures import synthetic_statements
+from statement_cache import StatementCache
+
+
+class FakeClock:
+    """
+    Stands in for the time module inside statement_cache, advanced by hand
+    """
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(statement_cache, 'time', clock)
+    return clock
+
+
+def test_round_trip(tmp_path):
+    cache = StatementCache(str(tmp_path))
+    balance_sheet = synthetic_statements('AAAA.JK')['balance_sheet']
+    cache.put('AAAA.JK', 'balance_sheet', balance_sheet)
+    cache.put('AAAA.JK', 'info', {'longName': 'Alpha', 'sector': 'Energy'})
+
+    pd.testing.assert_frame_equal(cache.get('AAAA.JK', 'balance_sheet'), balance_sheet, check_freq=False)
+    assert cache.get_many('AAAA.JK', ['info', 'cashflow']) == {'info': {'longName': 'Alpha', 'sector': 'Energy'}}
+    assert cache.tickers() == ['AAAA.JK']
+    assert cache.hits == 2 and cache.misses == 1
+
+
+def test_expired_entries_are_only_served_when_allowed(tmp_path, clock):
+    cache = StatementCache(str(tmp_path), ttl=3600)
+    cache.put('AAAA.JK', 'info', {'sector': 'Energy'})
+    cache.put('AAAA.JK', 'financials_note', {'pages': 3}, ttl=60)
+
+    clock.now += 120
+    assert cache.get('AAAA.JK', 'financials_note') is None
+    assert cache.get('AAAA.JK', 'financials_note', allow_expired=True) == {'pages': 3}
+    assert cache.get('AAAA.JK', 'info') == {'sector': 'Energy'}
+
+    clock.now += 3600
+    assert cache.get('AAAA.JK', 'info') is None
+    assert cache.get_many('AAAA.JK', ['info'], allow_expired=True) == {'info': {'sector': 'Energy'}}
+
+
+def test_evicts_least_recently_used_down_to_evict_to(tmp_path, clock):
+    value = {'payload': 'x' * 100}
+    cache = StatementCache(str(tmp_path / 'sizing'))
+    cache.put('SIZE.JK', 'info', value)
+    size = cache.total_bytes()
+
+    cache = StatementCache(str(tmp_path / 'lru'), max_bytes=10 * size)
+    for i in range(10):
+        clock.now += 1
+        cache.put(f"T{i}.JK", 'info', value)
+    clock.now += 1
+    assert cache.get('T0.JK', 'info') == value  # Now the most recently used
+    clock.now += 1
+    cache.put('T10.JK', 'info', value)
+
+    # 11 entries exceed max_bytes; the two least recently used go, leaving 9 = EVICT_TO of it
+    assert statement_cache.EVICT_TO == 0.9
+    assert cache.total_bytes() == 9 * size
+    assert cache.tickers() == ['T0.JK', 'T10.JK'] + [f"T{i}.JK" for i in range(3, 10)]
+    assert not os.path.exists(tmp_path / 'lru' / 'T1.JK' / 'info.json')
+
+
+def test_index_is_saved_on_flush(tmp_path, clock):
+    cache = StatementCache(str(tmp_path))
+    cache.put('AAAA.JK', 'info', {'sector': 'Energy'})
+    assert StatementCache(str(tmp_path)).tickers() == []  # Within INDEX_SAVE_INTERVAL of the last save
+
+    cache.flush()
+    reopened = StatementCache(str(tmp_path))
+    assert reopened.get('AAAA.JK', 'info') == {'sector': 'Energy'}
+    assert reopened.total_bytes() == cache.total_bytes()
+
+    clock.now += statement_cache.INDEX_SAVE_INTERVAL
+    cache.invalidate('AAAA.JK')
+    assert StatementCache(str(tmp_path)).tickers() == []
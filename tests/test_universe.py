@@ -0,0 +1,43 @@
+import ratio_engine
+from benchmarks.fixtures import synthetic_statements
+from universe import canonical_sector, load_universe
+
+IDX_LISTING = (
+    "Kode Saham,Nama Perusahaan,Sektor,Sub Industri\n"
+    "BBCA,Bank Central Asia Tbk.,Financials,Banks\n"
+    "LPGI,Lippo General Insurance Tbk.,Financials,General Insurance\n"
+    "UNVR,Unilever Indonesia Tbk.,Consumer Non-Cyclicals,Household Products\n"
+)
+
+
+def test_canonical_sector():
+    assert canonical_sector('Financials', 'Banks') == 'Banking'
+    assert canonical_sector('Perbankan') == 'Banking'
+    assert canonical_sector('Financials', 'General Insurance') == 'Financials'
+    assert canonical_sector('', 'Household Products') == 'Household Products'
+    assert canonical_sector('') == 'Unknown'
+
+
+def test_idx_listing_sectors(tmp_path):
+    path = tmp_path / 'listing.csv'
+    path.write_text(IDX_LISTING)
+    companies = load_universe(str(path))
+    assert companies['BBCA.JK'] == {'name': 'Bank Central Asia Tbk.', 'sector': 'Banking'}
+    assert companies['LPGI.JK']['sector'] == 'Financials'
+    assert companies['UNVR.JK']['sector'] == 'Consumer Non-Cyclicals'
+
+
+def test_listed_bank_gets_bank_ratios(tmp_path):
+    path = tmp_path / 'listing.csv'
+    path.write_text(IDX_LISTING)
+    info = load_universe(str(path))['BBCA.JK']
+    statements = {'BBCA.JK': synthetic_statements('BBCA.JK', info['sector'])}
+    series = ratio_engine.calculate_series(statements, {'BBCA.JK': info['sector']})['BBCA.JK']
+    record = ratio_engine.build_company_record('BBCA.JK', info, series)
+
+    ratios = record['ratios']
+    assert record['sector'] == 'Banking'
+    assert 'loanToDepositRatio' in ratios['liquidity']
+    assert 'nim' in ratios['profitability']
+    assert 'currentRatio' not in ratios['liquidity']
+    assert 'npm' not in ratios['profitability']
@@ -0,0 +1,168 @@
+import csv
+import json
+import logging
+import os
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Accepted header names (lower-cased) for each field, including IDX's own listing export
+TICKER_COLUMNS = ('ticker', 'symbol', 'code', 'kode', 'kode saham')
+NAME_COLUMNS = ('name', 'company', 'company name', 'nama', 'nama perusahaan')
+SECTOR_COLUMNS = ('sector', 'sektor')
+SUB_SECTOR_COLUMNS = ('sub-industry', 'sub industry', 'subindustry', 'industry', 'sub-sector', 'sub sector',
+                      'subsector', 'sub industri', 'industri', 'sub sektor', 'subsektor')
+# IDX-IC sector, sub-sector, industry and sub-industry names (lower-cased) that mean a sector the
+# ratio engine treats differently; it selects the bank ratio set for 'Banking' (ratio_engine.BANK_SECTORS).
+# Other names are kept as listed.
+SECTOR_ALIASES = {
+    'banks': 'Banking',
+    'bank': 'Banking',
+    'banking': 'Banking',
+    'perbankan': 'Banking',
+    'diversified banks': 'Banking',
+    'regional banks': 'Banking',
+    'islamic banks': 'Banking',
+    'bank syariah': 'Banking',
+}
+EXCHANGE_SUFFIX = '.JK'
+
+# Built-in universe, used when no listing file is configured
+DEFAULT_COMPANIES = {
+    "BBCA.JK": {"name": "Bank Central Asia Tbk", "sector": "Banking"},
+    "BMRI.JK": {"name": "Bank Mandiri Tbk", "sector": "Banking"},
+    "BBRI.JK": {"name": "Bank Rakyat Indonesia Tbk", "sector": "Banking"},
+    "BBNI.JK": {"name": "Bank Negara Indonesia Tbk", "sector": "Banking"},
+    "TLKM.JK": {"name": "Telkom Indonesia Tbk", "sector": "Telecommunications"},
+    "UNVR.JK": {"name": "Unilever Indonesia Tbk", "sector": "Consumer Goods"},
+    "ASII.JK": {"name": "Astra International Tbk", "sector": "Conglomerate"},
+    "INDF.JK": {"name": "Indofood Sukses Makmur Tbk", "sector": "Food & Beverages"},
+    "KLBF.JK": {"name": "Kalbe Farma Tbk", "sector": "Pharmaceuticals"},
+    "ICBP.JK": {"name": "Indofood CBP Sukses Makmur Tbk", "sector": "Food & Beverages"},
+    "GGRM.JK": {"name": "Gudang Garam Tbk", "sector": "Tobacco"},
+    "ADRO.JK": {"name": "Adaro Energy Tbk", "sector": "Mining"},
+    "ANTM.JK": {"name": "Aneka Tambang Tbk", "sector": "Mining"},
+    "INCO.JK": {"name": "Vale Indonesia Tbk", "sector": "Mining"},
+    "SMGR.JK": {"name": "Semen Indonesia Tbk", "sector": "Cement"}
+}
+
+
+def normalize_ticker(ticker: str) -> str:
+    """
+    'bbca' -> 'BBCA.JK'; tickers that already carry a suffix are only upper-cased.
+    """
+    ticker = ticker.strip().upper()
+    return ticker if '.' in ticker else ticker + EXCHANGE_SUFFIX
+
+
+def _pick(row: Dict[str, str], columns) -> str:
+    for column in columns:
+        value = row.get(column)
+        if value:
+            return value.strip()
+    return ''
+
+
+def canonical_sector(sector: str, sub_sector: str = '') -> str:
+    """
+    The sector a listed company is filed under: 'Financials' with sub-industry 'Banks' becomes
+    'Banking'. The more specific sub-sector wins; names without an alias are kept as they are.
+    """
+    for name in (sub_sector, sector):
+        alias = SECTOR_ALIASES.get(name.strip().lower())
+        if alias:
+            return alias
+    return sector or sub_sector or 'Unknown'
+
+
+def load_universe(path: str) -> Dict[str, Dict]:
+    """
+    Loads {ticker: {"name", "sector"}} from a listing file.
+    CSV files need a header with a ticker column (ticker/symbol/code/kode) and optionally
+    name, sector and sub-sector/industry columns. JSON files hold either that mapping or a
+    list of objects. Sectors go through canonical_sector, so listed banks get bank ratios.
+    """
+    companies = {}
+    if path.lower().endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+        rows = [dict(info, ticker=ticker) for ticker, info in raw.items()] if isinstance(raw, dict) else raw
+        rows = [{key.lower(): str(value) for key, value in row.items()} for row in rows]
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = [{(key or '').strip().lower(): value for key, value in row.items()} for row in csv.DictReader(f)]
+
+    for row in rows:
+        ticker = _pick(row, TICKER_COLUMNS)
+        if not ticker:
+            continue
+        ticker = normalize_ticker(ticker)
+        companies[ticker] = {
+            'name': _pick(row, NAME_COLUMNS) or ticker,
+            'sector': canonical_sector(_pick(row, SECTOR_COLUMNS), _pick(row, SUB_SECTOR_COLUMNS)),
+        }
+    return companies
+
+
+class UniverseRegistry:
+    """
+    The set of tickers to track. Read from a listing file when one is configured and
+    re-read whenever the file changes, so issuers can be added or delisted without a
+    restart; otherwise the built-in `default` companies are used.
+    """
+    def __init__(self, path: Optional[str] = None, default: Optional[Dict[str, Dict]] = None):
+        self.path = path
+        self.default = dict(default or {})
+        self._companies = dict(self.default)
+        self._mtime = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-reads the listing file if it changed. Returns True when the universe changed.
+        A file that cannot be parsed leaves the current universe in place.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime and not force:
+            return False
+        try:
+            companies = load_universe(self.path)
+        except Exception as e:
+            logger.error(f"Could not load ticker universe from {self.path}: {e}")
+            return False
+        if not companies:
+            logger.error(f"Ticker universe {self.path} lists no companies, keeping the current one")
+            return False
+        with self._lock:
+            self._mtime = mtime
+            changed = companies != self._companies
+            self._companies = companies
+        if changed:
+            logger.info(f"Loaded {len(companies)} tickers from {self.path}")
+        return changed
+
+    @property
+    def companies(self) -> Dict[str, Dict]:
+        return self._companies
+
+    def tickers(self) -> List[str]:
+        return list(self._companies)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._companies
+
+    def __len__(self) -> int:
+        return len(self._companies)
+
+
+def shard_of(ticker: str, shards: int) -> int:
+    """
+    Stable shard for a ticker: a hash of the symbol, so adding or removing issuers never
+    moves the others to a different shard.
+    """
+    return zlib.crc32(ticker.encode('utf-8')) % max(1, shards)